@@ -0,0 +1,28 @@
+"""Shared helpers for the JSON Wizard benchmarks
+
+The benchmarks are plain scripts, run them from the repository root:
+
+    python benchmarks/bench_rows.py
+"""
+import os
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+def timed(label, function, *args, **kwargs):
+    """Run `function` once, print and return its wall time"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print("%-44s %10.3f s" % (label, elapsed))
+    return result, elapsed
+
+
+def coreApplication():
+    """Qt wants an application instance before models are used"""
+    from PySide2.QtCore import QCoreApplication
+    return QCoreApplication.instance() or QCoreApplication([])
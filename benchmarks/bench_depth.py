@@ -0,0 +1,108 @@
+"""Load and serialisation benchmark on deep, wide and mixed documents
+
+Times QJsonTreeItem.load() and QJsonModel.json() against the recursive
+implementations they replaced. The recursive versions give up with a
+RecursionError past a few hundred levels, the "very deep" document
+shows the iterative ones going on regardless.
+"""
+import gc
+import sys
+
+import _common
+import QJSONModel
+from QJSONModel import QJsonTreeItem
+
+
+def recursiveLoad(value, parent=None):
+    """QJsonTreeItem.load() before it was made iterative, for reference"""
+    item = QJsonTreeItem(parent)
+    if isinstance(value, dict):
+        for key, childValue in value.items():
+            child = recursiveLoad(childValue, item)
+            child.key = key
+            child.type = type(childValue)
+            item.appendChild(child)
+    elif isinstance(value, list):
+        for childValue in value:
+            child = recursiveLoad(childValue, item)
+            child.type = type(childValue)
+            item.appendChild(child)
+            child.key = child._row
+    else:
+        item.value = value
+        item.type = type(value)
+    return item
+
+
+def recursiveJson(item):
+    """QJsonModel.genJson() before it was made iterative, for reference"""
+    if item.type is dict:
+        return {child.key: recursiveJson(child) for child in item._children}
+    if item.type == list:
+        return [recursiveJson(child) for child in item._children]
+    return item.value
+
+
+def deepDocument(levels):
+    # A chain of objects and arrays, with one scalar per level
+    node = {"leaf": True}
+    for level in range(levels):
+        node = {"level": level, "next": node} if level % 2 else [level, node]
+    return node
+
+
+def wideDocument():
+    return {"key%d" % n: n for n in range(500000)}
+
+
+def mixedDocument():
+    return [
+        {
+            "id": n,
+            "tags": ["a", "b", "c"],
+            "owner": {"name": "user%d" % n, "groups": [[n, n + 1], {"admin": False}]},
+        }
+        for n in range(50000)
+    ]
+
+
+def timed(label, function, *args):
+    # Start every run from a clean heap, collections triggered by the
+    # previous tree would be charged to the next run otherwise
+    gc.collect()
+    return _common.timed(label, function, *args)
+
+
+def compare(label, document):
+    model = QJSONModel.QJsonModel()
+
+    rootItem, loadTime = timed("%s: load()" % label, QJsonTreeItem.load, document)
+    rootItem.type = type(document)
+    _, jsonTime = timed("%s: json()" % label, model.genJson, rootItem)
+    del rootItem
+
+    try:
+        baseItem, baseLoad = timed("%s: recursive load" % label, recursiveLoad, document)
+        baseItem.type = type(document)
+        _, baseJson = timed("%s: recursive json" % label, recursiveJson, baseItem)
+    except RecursionError:
+        print("%-44s %12s" % ("%s: recursive" % label, "RecursionError"))
+        return
+    print("%-44s %10.2f x" % ("  load speedup", baseLoad / loadTime))
+    print("%-44s %10.2f x" % ("  json speedup", baseJson / jsonTime))
+
+
+def main():
+    _common.coreApplication()
+
+    # As deep as the recursive versions go, repeated to get measurable
+    # times
+    levels = sys.getrecursionlimit() // 2 - 50
+    compare("deep (1000 x %d levels)" % levels, [deepDocument(levels) for _ in range(1000)])
+    compare("very deep (100000 levels)", deepDocument(100000))
+    compare("wide (500000 keys)", wideDocument())
+    compare("mixed (50000 records)", mixedDocument())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Document comparison benchmark on 200k records
+
+Hashes two documents that differ in a handful of records, compares
+them, then edits one record and compares again. Subtrees with equal
+hashes are skipped, so the comparison only walks down to the records
+that differ. Compared against Python's own equality of the documents,
+which can only tell that they differ.
+"""
+import _common
+import QJSONModel
+from JSONDiff import Comparison, ContentHashes
+from JSONSearch import SearchIndex
+from PySide2 import QtCore
+
+RECORDS = 200000
+CHANGED = 10
+
+
+def document():
+    return [{"id": n, "name": "user-%d" % n, "tags": ["t%d" % (n % 97), "group-%d" % (n % 13)]} for n in range(RECORDS)]
+
+
+def otherDocument():
+    other = document()
+    for n in range(0, RECORDS, RECORDS // CHANGED):
+        other[n]["name"] = "renamed-%d" % n
+    other.append({"id": RECORDS, "name": "added"})
+    return other
+
+
+def hashTree(root):
+    searchIndex = SearchIndex.fromTree(root)
+    return searchIndex, ContentHashes.fromTree(searchIndex, root)
+
+
+def edit(model, comparison):
+    # A record that differs becomes equal again
+    item = model.rootItem().child(0).child(1)
+    model.setData(model.indexForItem(item, 1), "renamed-0", QtCore.Qt.EditRole)
+    return comparison.refresh()
+
+
+def equal(document, other):
+    return document == other
+
+
+def main():
+    _common.coreApplication()
+    model = QJSONModel.QJsonModel()
+    model.load(document())
+    other = otherDocument()
+
+    (searchIndex, hashes), _ = _common.timed("hash the open document", hashTree, model.rootItem())
+    model.setSearchIndex(searchIndex, hashes)
+    (otherIndex, otherHashes), _ = _common.timed("hash the other document", hashTree, other)
+    comparison = Comparison(hashes, otherHashes, other, "other.json")
+    _common.timed("compare them", comparison.compare)
+    model.setComparison(comparison)
+    print("%d differences" % len(comparison))
+    _common.timed("edit a record and compare again", edit, model, comparison)
+    print("%d differences" % len(comparison))
+    _common.timed("reference: Python equality", equal, document(), other)
+
+
+if __name__ == "__main__":
+    main()
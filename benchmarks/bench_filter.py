@@ -0,0 +1,69 @@
+"""Filter-as-you-type benchmark on 200k records
+
+Types a filter text one character at a time into a JsonProxyModel, as
+the filter field does, then deletes it again. Every character typed
+after the first only looks at the matches of the text before it, every
+character deleted gets back the rows of a text already filtered by. An
+edit afterwards only checks the rows on its path. Compared against
+searching the whole index again for every text.
+"""
+import _common
+import JSONProxy
+import QJSONModel
+from JSONSearch import SearchIndex
+from PySide2 import QtCore
+
+RECORDS = 200000
+TEXT = "user-1234"
+
+
+def document():
+    return [{"id": n, "name": "user-%d" % n, "tags": ["t%d" % (n % 97), "group-%d" % (n % 13)]} for n in range(RECORDS)]
+
+
+def typeText(proxy, text):
+    for end in range(1, len(text) + 1):
+        proxy.setFilterText(text[:end])
+        # The view asks for the rows of the root first
+        proxy.rowCount()
+
+
+def deleteText(proxy, text):
+    for end in range(len(text) - 1, -1, -1):
+        proxy.setFilterText(text[:end])
+        proxy.rowCount()
+
+
+def edit(model, proxy):
+    # A hidden record that starts to match, then stops again
+    item = model.rootItem().child(0).child(1)
+    for value in (TEXT + "0", "user-0"):
+        model.setData(model.indexForItem(item, 1), value, QtCore.Qt.EditRole)
+        proxy.rowCount()
+
+
+def searchAll(searchIndex, text):
+    for end in range(1, len(text) + 1):
+        searchIndex.findAll(text[:end])
+
+
+def main():
+    _common.coreApplication()
+    model = QJSONModel.QJsonModel()
+    model.load(document())
+    searchIndex = SearchIndex.fromTree(model.rootItem())
+    model.setSearchIndex(searchIndex)
+    proxy = JSONProxy.JsonProxyModel()
+    proxy.setSourceModel(model)
+    proxy.rowCount()
+
+    _common.timed("type '%s' into the filter" % TEXT, typeText, proxy, TEXT)
+    print("%d records shown" % proxy.rowCount())
+    _common.timed("delete it one character at a time", deleteText, proxy, TEXT)
+    proxy.setFilterText(TEXT)
+    _common.timed("edit a record in and out of the filter", edit, model, proxy)
+    _common.timed("reference: find all for every prefix", searchAll, searchIndex, TEXT)
+
+
+if __name__ == "__main__":
+    main()
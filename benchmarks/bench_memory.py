@@ -0,0 +1,99 @@
+"""Tree memory benchmark
+
+Builds the full QJsonTreeItem tree for a few representative documents
+and reports the bytes allocated per node. The document itself is kept
+alive while measuring, so only the tree structure is counted. The cut is
+relative to the dict-based layout the items had before.
+"""
+import gc
+import tracemalloc
+
+import _common  # noqa: F401  (adds src/ to sys.path)
+import JSONTree
+
+
+class DictItem(object):
+    """Layout of the items before they were slotted, for reference"""
+
+    def __init__(self, parent=None):
+        self._parent = parent
+        self._key = ""
+        self._value = ""
+        self._type = None
+        self._children = list()
+
+    @classmethod
+    def load(cls, value, parent=None):
+        item = cls(parent)
+        if isinstance(value, dict):
+            entries = value.items()
+        elif isinstance(value, list):
+            entries = enumerate(value)
+        else:
+            item._value = value
+            return item
+        for key, child in entries:
+            childItem = cls.load(child, item)
+            childItem._key = key
+            childItem._type = type(child)
+            item._children.append(childItem)
+        return item
+
+
+def numberArray():
+    return list(range(200000))
+
+
+def records():
+    return [
+        {"id": n, "name": "user%d" % n, "active": n % 2 == 0, "manager": None}
+        for n in range(50000)
+    ]
+
+
+def config():
+    return {
+        "service%d" % n: {
+            "image": "registry/service%d:latest" % n,
+            "ports": [8000 + n, 9000 + n],
+            "env": {"PORT": str(8000 + n), "DEBUG": "false"},
+            "replicas": n % 5,
+        }
+        for n in range(20000)
+    }
+
+
+def countNodes(value):
+    if isinstance(value, dict):
+        return 1 + sum(countNodes(child) for child in value.values())
+    if isinstance(value, list):
+        return 1 + sum(countNodes(child) for child in value)
+    return 1
+
+
+def measure(load, document):
+    gc.collect()
+    tracemalloc.start()
+    tree = load(document)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return size
+
+
+def main():
+    print("%-16s %10s %14s %14s %6s" % ("document", "nodes", "dict items", "slotted items", "cut"))
+    for name, factory in (
+        ("number array", numberArray),
+        ("records", records),
+        ("config", config),
+    ):
+        document = factory()
+        nodes = countNodes(document)
+        before = measure(DictItem.load, document)
+        after = measure(JSONTree.QJsonTreeItem.load, document)
+        print("%-16s %10d %11.1f B %11.1f B %5.0f%%" % (name, nodes, before / nodes, after / nodes, 100 - 100.0 * after / before))
+
+
+if __name__ == "__main__":
+    main()
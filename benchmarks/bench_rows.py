@@ -0,0 +1,70 @@
+"""Row lookup benchmark
+
+Sweeps QJsonModel.index()/parent() over every row of a large array of
+expanded objects and walks a deeply nested document bottom-up, the
+access pattern of a QTreeView scrolling through the model.
+"""
+import _common
+import QJSONModel
+
+# Array entries, each with one child: 2M nodes in total
+FLAT_SIZE = 1000000
+DEEP_LEVELS = 200
+DEEP_WIDTH = 50
+
+
+def flatDocument():
+    return [{"id": n} for n in range(FLAT_SIZE)]
+
+
+def deepDocument():
+    node = {"leaf": True}
+    for level in range(DEEP_LEVELS):
+        node = [level] * (DEEP_WIDTH - 1) + [node]
+    return node
+
+
+def scrollFlat(model):
+    root = model.index(0, 0).parent()
+    calls = 0
+    for row in range(model.rowCount(root)):
+        entry = model.index(row, 0, root)
+        # parent() of the visible child resolves the row of the entry
+        model.parent(model.index(0, 0, entry))
+        calls += 3
+    return calls
+
+
+def walkDeep(model):
+    index = model.index(0, 0).parent()
+    # Follow the last entry of every array down to the innermost object
+    while model.rowCount(index):
+        index = model.index(model.rowCount(index) - 1, 0, index)
+
+    calls = 0
+    while index.isValid():
+        # Touch every sibling on the way up, like a view repainting
+        parent = model.parent(index)
+        for row in range(model.rowCount(parent)):
+            model.parent(model.index(row, 0, parent))
+            calls += 2
+        index = parent
+    return calls
+
+
+def main():
+    _common.coreApplication()
+
+    model = QJSONModel.QJsonModel()
+    _common.timed("load flat array (%d entries)" % FLAT_SIZE, model.load, flatDocument())
+    calls, elapsed = _common.timed("index()+parent() over every entry", scrollFlat, model)
+    print("%-44s %10.0f /s" % ("  calls", calls / elapsed))
+
+    model = QJSONModel.QJsonModel()
+    _common.timed("load deep tree (%d levels)" % DEEP_LEVELS, model.load, deepDocument())
+    calls, elapsed = _common.timed("index()+parent() bottom-up", walkDeep, model)
+    print("%-44s %10.0f /s" % ("  calls", calls / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Scrolling benchmark on a fully expanded tree of 1M rows
+
+Replays the model calls a QTreeView with uniform row heights makes to
+paint a screen of rows, page after page: index() for both columns,
+data() for every role the item delegate asks for, flags() and parent().
+QJsonModel is compared against the data(), index() and flags() it had
+before, which went through hasIndex() and returned whole strings.
+"""
+import gc
+
+import _common
+import QJSONModel
+from PySide2 import QtCore
+
+# Array of objects, each with 9 members: 1M rows in total
+ENTRIES = 100000
+# Rows on screen, and screens painted per run
+VISIBLE_ROWS = 40
+FRAMES = 5000
+# Roles QStyledItemDelegate asks for to paint a cell
+PAINT_ROLES = (
+    QtCore.Qt.FontRole,
+    QtCore.Qt.TextAlignmentRole,
+    QtCore.Qt.ForegroundRole,
+    QtCore.Qt.CheckStateRole,
+    QtCore.Qt.DecorationRole,
+    QtCore.Qt.DisplayRole,
+    QtCore.Qt.BackgroundRole,
+)
+
+
+class ReferenceModel(QJSONModel.QJsonModel):
+    """QJsonModel before the rendering fast path, for reference"""
+
+    def data(self, index, role):
+        if not index.isValid():
+            return None
+
+        item = index.internalPointer()
+
+        if role == QtCore.Qt.DisplayRole:
+            if index.column() == 0:
+                if item._parent is not None and item._parent.type is list:
+                    return index.row()
+                return item.key
+
+            if index.column() == 1:
+                return item.value
+
+        elif role == QtCore.Qt.EditRole:
+            return item
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+
+        if not parent.isValid():
+            parentItem = self._rootItem
+        else:
+            parentItem = parent.internalPointer()
+
+        childItem = parentItem.child(row)
+        if childItem:
+            return self.createIndex(row, column, childItem)
+        else:
+            return QtCore.QModelIndex()
+
+    def flags(self, index):
+        flags = super(QJSONModel.QJsonModel, self).flags(index)
+        if not self.isEditable():
+            return flags
+
+        return QtCore.Qt.ItemIsEditable | flags
+
+
+def document():
+    return [
+        {
+            "id": n,
+            "name": "user%d" % n,
+            "email": "user%d@example.com" % n,
+            "active": n % 3 != 0,
+            "score": n * 0.5,
+            "manager": None,
+            "team": "team%d" % (n % 50),
+            "created": "2020-01-01T00:00:00Z",
+            # Long enough to be cut for display
+            "notes": "lorem ipsum dolor sit amet " * 40,
+        }
+        for n in range(ENTRIES)
+    ]
+
+
+def visibleRows(model):
+    """(parent, row) of the rows of the expanded tree, in display order"""
+    rows = []
+    root = QtCore.QModelIndex()
+    for row in range(model.rowCount(root)):
+        rows.append((root, row))
+        entry = model.index(row, 0, root)
+        for child in range(model.rowCount(entry)):
+            rows.append((entry, child))
+        if len(rows) >= VISIBLE_ROWS * FRAMES:
+            break
+    return rows
+
+
+def scroll(model, rows):
+    calls = 0
+    for first in range(0, len(rows), VISIBLE_ROWS):
+        for parent, row in rows[first:first + VISIBLE_ROWS]:
+            for column in (0, 1):
+                index = model.index(row, column, parent)
+                for role in PAINT_ROLES:
+                    model.data(index, role)
+                model.flags(index)
+                model.parent(index)
+                calls += len(PAINT_ROLES) + 3
+    return calls
+
+
+def run(label, model, value):
+    model.load(value)
+    rows = visibleRows(model)
+    gc.collect()
+    calls, elapsed = _common.timed("%s: %d screens" % (label, FRAMES), scroll, model, rows)
+    frames = len(rows) / VISIBLE_ROWS
+    print("%-44s %10.0f /s" % ("  data()/index()/parent() calls", calls / elapsed))
+    print("%-44s %10.3f ms" % ("  per screen of %d rows" % VISIBLE_ROWS, elapsed * 1000 / frames))
+    return elapsed
+
+
+def main():
+    _common.coreApplication()
+    value = document()
+
+    elapsed = run("QJsonModel", QJSONModel.QJsonModel(), value)
+    baseElapsed = run("reference", ReferenceModel(), value)
+    print("%-44s %10.2f x" % ("  speedup", baseElapsed / elapsed))
+
+
+if __name__ == "__main__":
+    main()
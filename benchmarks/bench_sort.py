@@ -0,0 +1,58 @@
+"""Sorting benchmark on an object of 100k members
+
+Sorts the rows of a JsonProxyModel by key and by value, both ways, then
+once more by key: the sort keys are computed on the first sort by a
+column only. Compared against rebuilding the tree with its members in
+order, the only way to sort before, with QJsonTreeItem.load(sort=True).
+"""
+import _common
+import JSONProxy
+import QJSONModel
+from JSONTree import QJsonTreeItem
+from PySide2 import QtCore
+
+MEMBERS = 100000
+
+
+def document():
+    # Keys and values out of order
+    return {"key%06d" % (n * 7919 % MEMBERS): "value%d" % (n % 977) for n in range(MEMBERS)}
+
+
+def sortRows(proxy, column, order):
+    proxy.sort(column, order)
+    # The view asks for the rows of the root first
+    proxy.rowCount()
+
+
+def reload(model, value):
+    rootItem = QJsonTreeItem.load(value, sort=True)
+    rootItem.type = dict
+    model.setRootItem(rootItem)
+    model.rowCount()
+
+
+def main():
+    _common.coreApplication()
+    value = document()
+
+    model = QJSONModel.QJsonModel()
+    model.load(value)
+    proxy = JSONProxy.JsonProxyModel()
+    proxy.setSourceModel(model)
+    proxy.rowCount()
+
+    runs = (
+        ("by key", 0, QtCore.Qt.AscendingOrder),
+        ("by key, descending", 0, QtCore.Qt.DescendingOrder),
+        ("by value", 1, QtCore.Qt.AscendingOrder),
+        ("by value, descending", 1, QtCore.Qt.DescendingOrder),
+        ("by key again", 0, QtCore.Qt.AscendingOrder),
+    )
+    for label, column, order in runs:
+        _common.timed("sort %d members %s" % (MEMBERS, label), sortRows, proxy, column, order)
+    _common.timed("reference: reload sorted by key", reload, model, value)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Startup benchmark of the JSON Wizard window
+
+Every run starts the application in a new process, on the offscreen
+platform unless QT_QPA_PLATFORM says otherwise, and times from the
+launch of the process:
+
+    imports             JSONWizard and PySide2 imported
+    window shown        first paint of the main window
+    first row visible   first paint of the tree view with rows in it,
+                        the file given on the command line
+
+Run from the repository root, the window loads its icons and style
+sheet from there.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import _common  # noqa: F401  (adds src/ to sys.path)
+
+RUNS = 10
+# Entries of the documents opened on the command line
+SMALL_ENTRIES = 100
+LARGE_ENTRIES = 200000
+
+
+def child(launched, fileName):
+    """Run the application, print the times as JSON once a row is shown"""
+    import JSONWizard
+    from PySide2.QtCore import QEvent, QObject, QTimer
+    times = {"imports": time.time() - launched}
+
+    class PaintProbe(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint:
+                now = time.time() - launched
+                if watched is window and "window shown" not in times:
+                    times["window shown"] = now
+                elif watched is window.treeView.viewport() and window.model.rowCount() > 0:
+                    times["first row visible"] = now
+                if "window shown" in times and ("first row visible" in times or not fileName):
+                    print(json.dumps(times))
+                    sys.stdout.flush()
+                    # Without waiting for the loader thread
+                    os._exit(0)
+            return False
+
+    app = JSONWizard.createApplication([sys.argv[0]])
+    window = JSONWizard.JSONWizard()
+    probe = PaintProbe()
+    window.installEventFilter(probe)
+    window.treeView.viewport().installEventFilter(probe)
+    window.show()
+    if fileName:
+        # As main() does with the file given on the command line
+        QTimer.singleShot(0, lambda: window.openNewFile(fileName))
+    app.exec_()
+
+
+def document(entries):
+    return [
+        {"id": n, "name": "user%d" % n, "tags": ["a", "b", "c"], "active": n % 2 == 0}
+        for n in range(entries)
+    ]
+
+
+def measure(label, fileName=None):
+    environment = dict(os.environ)
+    environment.setdefault("QT_QPA_PLATFORM", "offscreen")
+    runs = []
+    for _ in range(RUNS):
+        arguments = [sys.executable, os.path.abspath(__file__), "--child", str(time.time())]
+        if fileName:
+            arguments.append(fileName)
+        output = subprocess.run(
+            arguments, env=environment, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ).stdout
+        runs.append(json.loads(output.decode().splitlines()[-1]))
+
+    print(label)
+    for key in runs[0]:
+        print("%-44s %10.3f s" % ("  " + key + " (median)", statistics.median(run[key] for run in runs)))
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        child(float(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else None)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        small = os.path.join(directory, "small.json")
+        large = os.path.join(directory, "large.json")
+        with open(small, "w") as file:
+            json.dump(document(SMALL_ENTRIES), file, indent=4)
+        with open(large, "w") as file:
+            json.dump(document(LARGE_ENTRIES), file, indent=4)
+
+        measure("no file")
+        measure("small file, %d entries" % SMALL_ENTRIES, small)
+        measure("large file, %.0f MB" % (os.path.getsize(large) / 1e6), large)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Headless batch mode of JSON Wizard
+
+Loads JSON files, applies edits, validates, queries and saves them again
+without Qt, with many files processed at once on a pool of processes:
+
+    python JSONBatch.py config/*.json --set $.logging.level debug --write
+    python JSONBatch.py services.json --query "$.services[*].name"
+    python JSONBatch.py data/*.json --validate
+    python JSONBatch.py data/*.json --schema data.schema.json
+
+Edits are applied in the order given, to every item matched by their
+JSONPath or JSON Pointer (see JSONQuery). Values are typed like the ones
+entered in the editor, see JSONTree.parseValue(). --set with a pointer
+to a missing member of an object adds the member.
+
+Files are mapped and indexed rather than parsed (see JSONIndex), and
+whatever the edits did not touch is copied byte for byte when they are
+saved, formatting included. Files are only written with --write.
+--validate parses the whole file with the strict StreamParser and
+reports duplicate keys, in the file and after the edits. --schema checks
+the files against a JSON Schema after the edits (see JSONSchema), files
+with errors are not saved.
+
+JSON Lines files (.jsonl, .ndjson) are the array of their records, e.g.
+/0 is the first line, and are saved as JSON Lines again.
+
+The exit status is 0 if every file went through, 1 otherwise.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from JSONIndex import IndexedDocument, LinesDocument, isLinesFile
+from JSONQuery import QueryError, compileQuery, pointer
+from JSONSchema import SchemaValidator, compileSchema
+from JSONStream import StreamParser, saveTree
+from JSONTree import QJsonTreeItem, findDuplicateKeys, parseValue, toPython
+import argparse
+import codecs
+import json
+import os
+import sys
+
+# Files handed to a worker process at once, at most
+CHUNK_SIZE = 64
+# Bytes read and parsed at once by --validate
+READ_CHUNK_SIZE = 1 << 20
+
+class FileResult(object):
+    """Outcome of processFile(), sent back from the worker processes
+
+    `matches` are the (pointer, JSON text) pairs of the queries,
+    `changes` counts the items the edits changed.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.matches = []
+        self.changes = 0
+        self.saved = False
+        self.warnings = []
+        self.errors = []
+
+def processFile(fileName, options):
+    """Edit, validate, query and save one file as `options` say
+
+    Arguments:
+        fileName (str): JSON file
+        options (argparse.Namespace): Parsed by parseArguments()
+
+    Returns:
+        FileResult
+
+    """
+
+    result = FileResult(fileName)
+    lines = isLinesFile(fileName)
+    try:
+        document = LinesDocument(fileName) if lines else IndexedDocument(fileName)
+    except Exception as error:
+        # Any error is this file's, the other files are still processed
+        result.errors.append(str(error) or type(error).__name__)
+        return result
+
+    try:
+        if options.validate:
+            result.errors.extend(validateFile(fileName, lines))
+        rootItem = document.rootItem()
+        for edit in options.edits:
+            result.changes += applyEdit(rootItem, edit, result)
+        if options.validate:
+            for item, key in findDuplicateKeys(rootItem):
+                message = _duplicateMessage(pointer(item), key)
+                if message not in result.errors:
+                    result.errors.append(message)
+        if options.schema is not None:
+            # Compiled here, compiled schemas do not pickle
+            validator = SchemaValidator(compileSchema(options.schema))
+            for item, path, message in validator.validate(rootItem):
+                result.errors.append("%s: %s" % (pointer(item) + path or "/", message))
+        for expression in options.queries:
+            for item in compileQuery(expression).evaluate(rootItem):
+                result.matches.append((pointer(item), json.dumps(toPython(item), ensure_ascii=False)))
+
+        if result.changes and options.write and not result.errors:
+            saveTree(fileName, rootItem, document, options.indent, options.compact, options.backups, lines=lines)
+            result.saved = True
+    except Exception as error:
+        result.errors.append(str(error) or type(error).__name__)
+    finally:
+        document.close()
+    return result
+
+def validateFile(fileName, lines=False):
+    """Parse `fileName` strictly, as it would be loaded in the editor
+
+    Raises ValueError if it is not valid JSON, or with `lines` if a line
+    that is not blank is not.
+
+    Returns:
+        list of error messages about duplicate keys
+
+    """
+
+    checker = _KeyChecker()
+    if lines:
+        # The records are the entries of the root array
+        checker.startArray()
+        with open(fileName, encoding="utf-8-sig", newline="\n") as file:
+            for number, line in enumerate(file, 1):
+                if line.strip():
+                    parser = StreamParser(checker)
+                    try:
+                        parser.feed(line)
+                        parser.close()
+                    except ValueError as error:
+                        raise ValueError("Line %d: %s" % (number, error))
+        checker.endContainer()
+        return [_duplicateMessage(path, key) for path, key in checker.duplicates]
+
+    parser = StreamParser(checker)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    with open(fileName, "rb") as file:
+        while True:
+            chunk = file.read(READ_CHUNK_SIZE)
+            parser.feed(decoder.decode(chunk, not chunk))
+            if not chunk:
+                break
+    parser.close()
+    return [_duplicateMessage(path, key) for path, key in checker.duplicates]
+
+def _duplicateMessage(path, key):
+    return "Duplicate key %s in %s" % (json.dumps(key, ensure_ascii=False), path or "/")
+
+class _KeyChecker(object):
+    """StreamParser handler that finds the duplicate keys of a document
+
+    `duplicates` gets the (JSON Pointer of the object, key) pairs.
+    """
+
+    def __init__(self):
+        self.duplicates = []
+        # Pointer tokens of the open containers, the root first
+        self._tokens = []
+        # Keys seen in every open container, or the next row of arrays
+        self._seen = []
+        self._key = None
+
+    def _token(self):
+        """Pointer token of the value being parsed"""
+        if not self._seen:
+            return None
+        seen = self._seen[-1]
+        if isinstance(seen, set):
+            return self._key.replace("~", "~0").replace("/", "~1")
+        self._seen[-1] = seen + 1
+        return str(seen)
+
+    def _open(self, seen):
+        self._tokens.append(self._token())
+        self._seen.append(seen)
+
+    def startObject(self):
+        self._open(set())
+
+    def startArray(self):
+        self._open(0)
+
+    def endContainer(self):
+        self._tokens.pop()
+        self._seen.pop()
+
+    def key(self, key):
+        seen = self._seen[-1]
+        if key in seen:
+            path = "".join("/" + token for token in self._tokens[1:])
+            self.duplicates.append((path, key))
+        seen.add(key)
+        self._key = key
+
+    def value(self, value):
+        self._token()
+
+def applyEdit(rootItem, edit, result):
+    """Apply an edit of the command line to the tree under `rootItem`
+
+    Arguments:
+        edit (tuple): ("set", expression, value), ("rename", expression,
+            key) or ("delete", expression)
+        result (FileResult): Gets the warnings and errors
+
+    Returns:
+        number of items changed
+
+    """
+
+    action, expression = edit[0], edit[1]
+    items = compileQuery(expression).evaluate(rootItem)
+    if not items:
+        if action == "set" and expression.startswith("/"):
+            return _addMember(rootItem, expression, edit[2], result)
+        result.warnings.append("Nothing matches %s" % expression)
+        return 0
+
+    changes = 0
+    if action == "set":
+        value, itemType = parseValue(edit[2])
+        for item in items:
+            if item.type is dict or item.type is list:
+                result.errors.append("Cannot set the value of container %s" % (pointer(item) or "/"))
+            elif item.value != value or item.type is not itemType:
+                item.value = value
+                item.type = itemType
+                item.parent().markDirty()
+                changes += 1
+
+    elif action == "rename":
+        for item in items:
+            if item.parent() is None or item.parent().type is not dict:
+                result.errors.append("Cannot rename %s, it is not a member of an object" % (pointer(item) or "/"))
+            elif item.key != edit[2]:
+                item.setKey(edit[2])
+                item.parent().markDirty()
+                changes += 1
+
+    elif action == "delete":
+        byParent = {}
+        for item in items:
+            if item.parent() is None:
+                result.errors.append("Cannot delete the root")
+            else:
+                byParent.setdefault(id(item.parent()), (item.parent(), []))[1].append(item.row())
+        for parentItem, rows in byParent.values():
+            # Last row first, so that the rows before it stay valid
+            for row in sorted(rows, reverse=True):
+                parentItem.removeChildren(row, 1)
+            parentItem.markDirty()
+            changes += len(rows)
+
+    return changes
+
+def _addMember(rootItem, expression, text, result):
+    """Add the member a JSON Pointer to a missing key points to"""
+    parentExpression, _, token = expression.rpartition("/")
+    parents = compileQuery(parentExpression).evaluate(rootItem)
+    if len(parents) != 1 or parents[0].type is not dict:
+        result.warnings.append("Nothing matches %s" % expression)
+        return 0
+
+    parentItem = parents[0]
+    parentItem.fetchMore(parentItem.pendingCount())
+    item = QJsonTreeItem(parentItem)
+    item.key = token.replace("~1", "/").replace("~0", "~")
+    item.value, item.type = parseValue(text)
+    parentItem.insertChildren(parentItem.childCount(), [item])
+    parentItem.markDirty()
+    return 1
+
+def processFiles(fileNames, options):
+    """processFile() on every file, on `options.jobs` processes
+
+    Yields the FileResult of every file, in the order of `fileNames`.
+    """
+    jobs = min(options.jobs, len(fileNames))
+    if jobs <= 1:
+        for fileName in fileNames:
+            yield processFile(fileName, options)
+        return
+
+    chunkSize = max(1, min(CHUNK_SIZE, len(fileNames) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(processFile, fileNames, repeat(options), chunksize=chunkSize)
+
+class _EditAction(argparse.Action):
+    """Collects --set, --rename and --delete in the order given"""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        if isinstance(values, str):
+            values = [values]
+        try:
+            compileQuery(values[0])
+        except QueryError as error:
+            parser.error(str(error))
+        if self.const == "set" and values[1] == "":
+            parser.error("%s needs a value, the editor does not take empty ones either" % option_string)
+        namespace.edits.append((self.const,) + tuple(values))
+
+def _schemaFile(fileName):
+    """The schema in `fileName`, as loaded by json.load(), once it compiled"""
+    try:
+        with open(fileName, encoding="utf-8-sig") as file:
+            schema = json.load(file)
+        compileSchema(schema)
+    except (OSError, ValueError) as error:
+        raise argparse.ArgumentTypeError("%s: %s" % (fileName, error))
+    return schema
+
+def parseArguments(argv=None):
+    """Options of the command line, queries and edits are checked here"""
+    parser = argparse.ArgumentParser(
+        prog="JSONBatch",
+        description="Query, edit, validate and save JSON files without the GUI.",
+    )
+    parser.add_argument("files", nargs="+", metavar="FILE", help="JSON files to process")
+    parser.add_argument(
+        "--set", action=_EditAction, const="set", nargs=2, metavar=("EXPR", "VALUE"),
+        help="set the value of the matching items, typed as in the editor",
+    )
+    parser.add_argument(
+        "--rename", action=_EditAction, const="rename", nargs=2, metavar=("EXPR", "KEY"),
+        help="set the key of the matching object members",
+    )
+    parser.add_argument(
+        "--delete", action=_EditAction, const="delete", metavar="EXPR",
+        help="remove the matching items",
+    )
+    parser.add_argument(
+        "--query", action="append", dest="queries", default=[], metavar="EXPR",
+        help="print the pointer and value of the matching items",
+    )
+    parser.add_argument("--validate", action="store_true", help="check the syntax strictly and report duplicate keys")
+    parser.add_argument(
+        "--schema", type=_schemaFile, metavar="SCHEMA",
+        help="check the files against the JSON Schema in SCHEMA, after the edits",
+    )
+    parser.add_argument("--write", action="store_true", help="save the edited files in place")
+    parser.add_argument("--indent", type=int, default=4, help="indentation of the edited containers")
+    parser.add_argument("--compact", action="store_true", help="write edited containers without whitespace")
+    parser.add_argument("--backups", type=int, default=0, metavar="N", help="keep N previous versions as FILE.bakN")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=os.cpu_count() or 1, metavar="N",
+        help="files processed in parallel (default: number of CPUs)",
+    )
+    parser.set_defaults(edits=[])
+    options = parser.parse_args(argv)
+
+    for expression in options.queries:
+        try:
+            compileQuery(expression)
+        except QueryError as error:
+            parser.error(str(error))
+    return options
+
+def main(argv=None):
+    options = parseArguments(argv)
+    showNames = len(options.files) > 1
+    failed = 0
+    for result in processFiles(options.files, options):
+        for path, text in result.matches:
+            if showNames:
+                print("%s:%s\t%s" % (result.fileName, path or "/", text))
+            else:
+                print("%s\t%s" % (path or "/", text))
+        for message in result.warnings:
+            print("%s: warning: %s" % (result.fileName, message), file=sys.stderr)
+        for message in result.errors:
+            print("%s: error: %s" % (result.fileName, message), file=sys.stderr)
+        if result.changes:
+            print(
+                "%s: %d changed, %s" % (
+                    result.fileName,
+                    result.changes,
+                    "saved" if result.saved else "not saved",
+                ),
+                file=sys.stderr,
+            )
+        if result.errors:
+            failed += 1
+
+    if failed:
+        print("%d of %d files failed" % (failed, len(options.files)), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Memory budget of the documents open in JSON Wizard
+
+Every open document holds its item tree, and possibly the StructuralIndex
+of its file and a search index with its content hashes. DocumentCache
+keeps the documents in least recently used order and picks the ones
+whose trees to drop once their estimated sizes add up to more than the
+budget. A dropped tree is loaded
+again when its document is shown, from the file if it did not change
+since, from a compressed snapshot of the tree otherwise.
+
+Sizes are estimates from the number of items built, see documentSize().
+"""
+from collections import OrderedDict
+from JSONIndex import IndexedDocument, LinesDocument
+from JSONStream import ItemWriter
+from JSONTree import countItems
+import io
+import os
+import zlib
+
+# Default budget of all open documents (bytes)
+MEMORY_BUDGET = 1 << 30
+# Bytes per built QJsonTreeItem, its key and value included
+ITEM_SIZE = 160
+# Bytes per value of the StructuralIndex of an IndexedDocument
+INDEX_ENTRY_SIZE = 40
+# Bytes per record of a LinesDocument
+LINE_ENTRY_SIZE = 16
+# zlib level of the snapshots, they are taken on the GUI thread
+SNAPSHOT_LEVEL = 1
+
+def documentSize(rootItem, backing=None, searchIndex=None, contentHashes=None):
+    """Estimated bytes held by a document
+
+    Arguments:
+        rootItem (QJsonTreeItem): Root of its tree
+        backing: File the tree is backed by, see QJsonModel.backing()
+        searchIndex (SearchIndex): Its search index, if built
+        contentHashes (JSONDiff.ContentHashes): Hashes built with it
+
+    Returns:
+        int
+
+    """
+
+    size = countItems(rootItem) * ITEM_SIZE
+    if isinstance(backing, IndexedDocument):
+        size += len(backing.index) * INDEX_ENTRY_SIZE
+    elif isinstance(backing, LinesDocument):
+        size += len(backing) * LINE_ENTRY_SIZE
+    if searchIndex is not None:
+        size += searchIndex.memorySize()
+    if contentHashes is not None:
+        size += contentHashes.memorySize()
+    return size
+
+def fileStamp(fileName):
+    """(size, modification time) of a file, None if it is gone
+
+    A tree is only loaded again from its file if the stamp did not change.
+    """
+    try:
+        status = os.stat(fileName)
+    except OSError:
+        return None
+    return (status.st_size, status.st_mtime_ns)
+
+def takeSnapshot(rootItem):
+    """Compact JSON text of the tree under `rootItem`, compressed with zlib"""
+    buffer = io.BytesIO()
+    ItemWriter(buffer, compact=True).write(rootItem)
+    return zlib.compress(buffer.getvalue(), SNAPSHOT_LEVEL)
+
+class DocumentCache(object):
+    """Open documents in least recently used order, under a memory budget
+
+    Documents can be any object with a `size` attribute, the estimated
+    bytes it holds, kept up to date by its owner, and a canEvict()
+    method saying whether its tree can be dropped now.
+    """
+
+    def __init__(self, budget=MEMORY_BUDGET):
+        self.budget = budget
+        self._documents = OrderedDict()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, document):
+        """Add a document as the most recently used one"""
+        self._documents[id(document)] = document
+
+    def touch(self, document):
+        """Mark a document as the most recently used one"""
+        self._documents.move_to_end(id(document))
+
+    def remove(self, document):
+        self._documents.pop(id(document), None)
+
+    def totalSize(self):
+        return sum(document.size for document in self._documents.values())
+
+    def evictions(self):
+        """Documents to drop the trees of, least recently used first
+
+        As many as it takes to get under the budget, if there are enough
+        that can be evicted. The most recently used document is never one
+        of them.
+
+        Returns:
+            list of documents
+
+        """
+
+        total = self.totalSize()
+        evicted = []
+        for document in list(self._documents.values())[:-1]:
+            if total <= self.budget:
+                break
+            if document.size and document.canEvict():
+                evicted.append(document)
+                total -= document.size
+        return evicted
@@ -0,0 +1,600 @@
+"""
+Structural diff of JSON documents for JSON Wizard
+
+ContentHashes holds a hash of every subtree of a document, Merkle style:
+a scalar is hashed with its type, a container from the hashes of its
+children. Objects combine their (key, child) pairs in any order, arrays
+their children in order. Two subtrees with the same hash are taken as
+equal without looking into them, so comparing two documents only walks
+down the paths that lead to their differences.
+
+The hashes are those of the nodes of the document's SearchIndex. They
+are computed along with it, see JSONWorkers.SearchIndexWorker, then
+follow its changes: an edit marks the path from the changed node up to
+the root, which is hashed again when the hashes are next asked for.
+They are 64-bit BLAKE2 digests of the type and JSON text of scalars,
+and of the hashes of the children of containers. Python's hash() would
+not do, small numbers such as -1 and -2 hash alike.
+
+Comparison holds the differences between a tree and another document,
+and finds them again once the tree changed.
+"""
+from array import array
+from hashlib import blake2b
+from itertools import compress, count, islice
+from JSONIndex import IndexedDocument
+from JSONSearch import valueText
+from JSONTree import childEntries, isContainer, isItem
+from operator import ne
+import json
+import re
+import struct
+
+# Differences found before a comparison stops looking for more
+DIFFERENCES_LIMIT = 10000
+
+# How a node of the tree differs from the other document: its value or
+# type is not the same, it is not in there, or some of the children in
+# there are missing from it
+CHANGED = "changed"
+ADDED = "added"
+REMOVED = "removed"
+
+# Missing keys listed by Comparison.describe()
+KEYS_SHOWN = 10
+# Longer values are cut to this many characters by Comparison.describe()
+TEXT_LENGTH = 80
+
+# Kinds of node
+_SCALAR = 0
+_OBJECT = 1
+_ARRAY = 2
+
+_MASK = (1 << 64) - 1
+_SIGN = 1 << 63
+# Type of a scalar in its digest, integers and floats are numbers alike.
+# Containers are tagged with their opening bracket
+_STRING_TAG = b"s"
+_NUMBER_TAG = b"2"
+_SCALAR_TAGS = {True: b"t", False: b"f", None: b"n"}
+_MEMBER = struct.Struct("<qq")
+_LITERALS = {b"true": True, b"false": False, b"null": None}
+_OPEN_OBJECT = ord("{")
+# A JSON string, as in JSONIndex
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+
+# Nodes processed between two progress reports
+_PROGRESS_NODES = 1 << 16
+
+class ContentHashes(object):
+    """Hash of the subtree of every node of a SearchIndex
+
+    Build it with fromTree() or fromDocument() right after the index,
+    before the tree changes. It registers itself with the index, which
+    tells it about every change.
+    """
+
+    def __init__(self, searchIndex):
+        self.searchIndex = searchIndex
+        # By node: hash of the subtree, hash of the key in an object
+        # and kind of node
+        self._hashes = array("q")
+        self._keys = array("q")
+        self._kinds = bytearray()
+        # Containers whose hash is out of date, with all their ancestors
+        self._dirty = set()
+        searchIndex._listeners.append(self)
+
+    def close(self):
+        """Stop following the changes of the index"""
+        if self in self.searchIndex._listeners:
+            self.searchIndex._listeners.remove(self)
+
+    def memorySize(self):
+        """Approximate bytes held by the hashes"""
+        return len(self._hashes) * self._hashes.itemsize + len(self._keys) * self._keys.itemsize + len(self._kinds)
+
+    # Building
+
+    @classmethod
+    def fromTree(cls, searchIndex, rootItem, progress=None, checkCancelled=None):
+        """Hash the document of `rootItem`, built or not
+
+        `rootItem` may be a plain value as well. `searchIndex` is its
+        index, the tree must not have changed since it was built.
+        """
+
+        hashes = cls(searchIndex)
+        hashes._grow()
+        hashes._hashEntries([(0, None, rootItem)], progress, checkCancelled)
+        return hashes
+
+    @classmethod
+    def fromDocument(cls, searchIndex, document, progress=None, checkCancelled=None):
+        """Hash a JSONIndex.IndexedDocument from its StructuralIndex
+
+        `searchIndex` must have been built from the document, see
+        SearchIndex.fromDocument(), and nothing changed since.
+        """
+
+        structure = document.index
+        data = document.data
+        starts = structure.starts
+        ends = structure.ends
+        rawKeys = structure.keys
+        counts = structure.counts
+
+        hashes = cls(searchIndex)
+        hashes._grow()
+        keys = hashes._keys
+        values = hashes._hashes
+        kinds = hashes._kinds
+        # Raw key -> hash, keys repeat a lot
+        keyHashes = {}
+        size = len(structure)
+        # Children before their parents
+        for node in range(size - 1, -1, -1):
+            if node % _PROGRESS_NODES == 0:
+                _report(size - node, progress, checkCancelled)
+            if rawKeys[node] >= 0:
+                rawKey = _STRING.match(data, rawKeys[node]).group()
+                keyHash = keyHashes.get(rawKey)
+                if keyHash is None:
+                    keyHash = keyHashes[rawKey] = _scalarHash(_decodeScalar(rawKey))
+                keys[node] = keyHash
+            if counts[node] >= 0:
+                kinds[node] = _OBJECT if data[starts[node]] == _OPEN_OBJECT else _ARRAY
+                values[node] = hashes._combine(node)
+            else:
+                values[node] = _scalarHash(_decodeScalar(data[starts[node]:ends[node]]))
+        return hashes
+
+    def _grow(self):
+        """Make room for the nodes added to the index"""
+        missing = len(self.searchIndex) - len(self._kinds)
+        self._hashes.frombytes(bytes(8 * missing))
+        self._keys.frombytes(bytes(8 * missing))
+        self._kinds.extend(bytes(missing))
+
+    def _hashEntries(self, stack, progress=None, checkCancelled=None):
+        """Hash the subtrees of the (node, key, item or plain value) on `stack`"""
+        children = self.searchIndex._children
+        hashes = self._hashes
+        keys = self._keys
+        kinds = self._kinds
+        containers = []
+        done = 0
+        while stack:
+            node, key, entry = stack.pop()
+            done += 1
+            if done % _PROGRESS_NODES == 0:
+                _report(done, progress, checkCancelled)
+            if key is not None:
+                keys[node] = _scalarHash(key)
+            if isContainer(entry):
+                isObject = entry.type is dict if isItem(entry) else isinstance(entry, dict)
+                kinds[node] = _OBJECT if isObject else _ARRAY
+                containers.append(node)
+                # The index has the children in the same order
+                for child, (childKey, value) in zip(children(node), childEntries(entry)):
+                    stack.append((child, childKey, value))
+            else:
+                hashes[node] = _scalarHash(entry.value if isItem(entry) else entry)
+
+        # Children are numbered after their parents
+        containers.sort(reverse=True)
+        for node in containers:
+            hashes[node] = self._combine(node)
+
+    def _combine(self, node):
+        """Hash of container `node` from those of its children"""
+        children = self.searchIndex._children(node)
+        childHashes = map(self._hashes.__getitem__, children)
+        if self._kinds[node] == _OBJECT:
+            # In any order: the sum of the digests of the members
+            members = map(_MEMBER.pack, map(self._keys.__getitem__, children), childHashes)
+            total = sum(map(_digest, members)) & _MASK
+            return _digest(b"{" + total.to_bytes(8, "little"))
+        return _digest(b"[" + array("q", childHashes).tobytes())
+
+    # Hashes
+
+    def hashOf(self, node):
+        """Hash of the subtree of `node`"""
+        if self._dirty:
+            self.update()
+        return self._hashes[node]
+
+    def update(self):
+        """Hash the paths changed since the last call again"""
+        for node in sorted(self._dirty, reverse=True):
+            self._hashes[node] = self._combine(node)
+        self._dirty.clear()
+
+    def _markDirty(self, node):
+        parents = self.searchIndex._parents
+        dirty = self._dirty
+        while node >= 0 and node not in dirty:
+            dirty.add(node)
+            node = parents[node]
+
+    # Changes of the index
+
+    def _nodeChanged(self, node, item):
+        self._keys[node] = _scalarHash(item.key) if item.parent().type is dict else 0
+        if self._kinds[node] == _SCALAR:
+            self._hashes[node] = _scalarHash(item.value)
+        self._markDirty(self.searchIndex._parents[node])
+
+    def _nodesAdded(self, first, last, nodes, items):
+        if not nodes:
+            return
+        self._grow()
+        parent = self.searchIndex._parents[nodes[0]]
+        isObject = self._kinds[parent] == _OBJECT
+        self._hashEntries([(node, item.key if isObject else None, item) for node, item in zip(nodes, items)])
+        self._markDirty(parent)
+
+    def _nodesRemoved(self, parent):
+        # The hashes of the removed subtrees stay, for _nodesRestored()
+        self._markDirty(parent)
+
+    def _nodesRestored(self, nodes):
+        if nodes:
+            self._markDirty(self.searchIndex._parents[nodes[0]])
+
+class Comparison(object):
+    """Differences between a tree and another document
+
+    Both are given by their ContentHashes, `other` is the other document
+    itself, an IndexedDocument, a tree or a plain value, for describe().
+    Call compare() once, e.g. on a worker thread. Once either document
+    changed, refresh() compares them again, which is quick as long as
+    they do not differ in many places.
+
+    Differences are kept by node of the tree. Object members are matched
+    by key, array entries by position once the entries both arrays start
+    and end with are set aside, so that an entry inserted into an array
+    is not taken as a change of all the following ones. At most
+    DIFFERENCES_LIMIT differences are kept, `truncated` is set then.
+    """
+
+    def __init__(self, hashes, otherHashes, other, otherName=""):
+        self.hashes = hashes
+        self.otherHashes = otherHashes
+        self.otherName = otherName
+        if isinstance(other, IndexedDocument):
+            self._other = _DocumentEntries(other)
+        else:
+            self._other = _TreeEntries(other, otherHashes.searchIndex)
+        # node: (kind, other node of a change, other nodes of the
+        # missing children)
+        self._differences = {}
+        # Ancestors of the differences
+        self._holding = set()
+        # Row paths of the differences in document order, once asked for
+        self._rowPaths = None
+        # Revisions of both indexes when last compared
+        self._revisions = None
+        self.truncated = False
+
+    def close(self):
+        """Release the other document, if the comparison opened it"""
+        self._other.close()
+
+    def __len__(self):
+        return len(self._differences)
+
+    def compare(self, checkCancelled=None):
+        """Find the differences between the documents"""
+        index = self.hashes.searchIndex
+        otherIndex = self.otherHashes.searchIndex
+        self._revisions = (index.revision, otherIndex.revision)
+        self.hashes.update()
+        self.otherHashes.update()
+        hashes = self.hashes._hashes
+        otherHashes = self.otherHashes._hashes
+        kinds = self.hashes._kinds
+        otherKinds = self.otherHashes._kinds
+
+        differences = {}
+        self.truncated = False
+        # Pairs of nodes to compare, next one last
+        stack = [(0, 0)]
+        while stack:
+            node, otherNode = stack.pop()
+            if hashes[node] == otherHashes[otherNode]:
+                continue
+            if len(differences) >= DIFFERENCES_LIMIT:
+                self.truncated = True
+                break
+            if checkCancelled is not None:
+                checkCancelled()
+
+            kind = kinds[node]
+            if kind != otherKinds[otherNode] or kind == _SCALAR:
+                differences[node] = (CHANGED, otherNode)
+                continue
+            pairs, added, removed = self._match(node, otherNode)
+            if removed:
+                differences[node] = (REMOVED, removed)
+            for child in added:
+                differences[child] = (ADDED, None)
+            stack.extend(reversed(pairs))
+
+        self._differences = differences
+        self._rowPaths = None
+        parents = index._parents
+        holding = set()
+        for node in differences:
+            node = parents[node]
+            while node >= 0 and node not in holding:
+                holding.add(node)
+                node = parents[node]
+        self._holding = holding
+
+    def refresh(self):
+        """Compare again if either document changed since
+
+        Returns:
+            the nodes of the tree, still in it, whose kind() or
+            holdsDifferences() changed
+
+        """
+
+        index = self.hashes.searchIndex
+        if self._revisions == (index.revision, self.otherHashes.searchIndex.revision):
+            return []
+
+        differences = self._differences
+        holding = self._holding
+        self.compare()
+        changed = set(node for node in differences if differences[node] != self._differences.get(node))
+        changed.update(node for node in self._differences if node not in differences)
+        changed.update(holding.symmetric_difference(self._holding))
+        alive = index._alive
+        return [node for node in changed if alive[node]]
+
+    def _match(self, node, otherNode):
+        """Match the children of two containers of the same kind
+
+        Returns:
+            the (child, other child) pairs whose hashes differ, in row
+            order, the children that have no match and the other
+            children that have none
+
+        """
+
+        children = list(self.hashes.searchIndex._children(node))
+        otherChildren = list(self.otherHashes.searchIndex._children(otherNode))
+        hashes = list(map(self.hashes._hashes.__getitem__, children))
+        otherHashes = list(map(self.otherHashes._hashes.__getitem__, otherChildren))
+
+        if self.hashes._kinds[node] == _OBJECT:
+            keys = list(map(self.hashes._keys.__getitem__, children))
+            otherKeys = list(map(self.otherHashes._keys.__getitem__, otherChildren))
+            if keys == otherKeys:
+                rows = compress(count(), map(ne, hashes, otherHashes))
+                return [(children[row], otherChildren[row]) for row in rows], [], []
+
+            pairs = []
+            added = []
+            matched = bytearray(len(otherChildren))
+            for row, otherRow in enumerate(_matchKeys(keys, otherKeys)):
+                if otherRow is None:
+                    added.append(children[row])
+                    continue
+                matched[otherRow] = 1
+                if hashes[row] != otherHashes[otherRow]:
+                    pairs.append((children[row], otherChildren[otherRow]))
+            removed = [otherChildren[row] for row in range(len(otherChildren)) if not matched[row]]
+            return pairs, added, removed
+
+        # Entries in between the common start and end are matched by
+        # position, the rest of the longer array has no match
+        prefix, suffix = _commonEnds(hashes, otherHashes)
+        end = len(children) - suffix
+        otherEnd = len(otherChildren) - suffix
+        common = min(end, otherEnd)
+        rows = compress(count(prefix), map(ne, hashes[prefix:common], otherHashes[prefix:common]))
+        pairs = [(children[row], otherChildren[row]) for row in rows]
+        return pairs, children[common:end], otherChildren[common:otherEnd]
+
+    # Differences
+
+    def kind(self, node):
+        """CHANGED, ADDED, REMOVED or None if `node` does not differ"""
+        difference = self._differences.get(node)
+        return None if difference is None else difference[0]
+
+    def holdsDifferences(self, node):
+        """Whether some node under `node` differs"""
+        return node in self._holding
+
+    def rowPaths(self):
+        """Row paths of the differing nodes in document order
+
+        See SearchIndex.rowPath(). The root has no row, it is left out,
+        see describe(0).
+        """
+
+        if self._rowPaths is None:
+            index = self.hashes.searchIndex
+            parents = index._parents
+            # Row of every child of the containers that changed since the
+            # index was built, looking them up one by one is slow
+            rows = {}
+
+            def rowOf(node):
+                parent = parents[node]
+                order = index._order.get(parent)
+                if order is None:
+                    return index._rowOf(node)
+                if parent not in rows:
+                    rows[parent] = {child: row for row, child in enumerate(order)}
+                return rows[parent][node]
+
+            paths = []
+            for node in self._differences:
+                if node == 0:
+                    continue
+                path = []
+                while parents[node] >= 0:
+                    path.append(rowOf(node))
+                    node = parents[node]
+                path.reverse()
+                paths.append(path)
+            paths.sort()
+            self._rowPaths = paths
+        return self._rowPaths
+
+    def describe(self, node):
+        """How `node` differs from the other document, "" if it does not"""
+        difference = self._differences.get(node)
+        if difference is None:
+            return ""
+        kind, other = difference
+        if kind == CHANGED:
+            return "In %s: %s" % (self.otherName, self._valueText(other))
+        if kind == ADDED:
+            return "Not in %s" % self.otherName
+        if self.hashes._kinds[node] != _OBJECT:
+            return "%d more %s in %s" % (len(other), "entry" if len(other) == 1 else "entries", self.otherName)
+        keys = [_cut(json.dumps(self._other.key(child), ensure_ascii=False)) for child in other[:KEYS_SHOWN]]
+        if len(other) > KEYS_SHOWN:
+            keys.append("and %d more" % (len(other) - KEYS_SHOWN))
+        return "Only in %s: %s" % (self.otherName, ", ".join(keys))
+
+    def _valueText(self, otherNode):
+        value = self._other.value(otherNode)
+        if value is dict:
+            return "an object"
+        if value is list:
+            return "an array"
+        if isinstance(value, str):
+            return _cut(json.dumps(value, ensure_ascii=False))
+        return _cut(valueText(value))
+
+class _DocumentEntries(object):
+    """Keys and scalars of an IndexedDocument by node, from its StructuralIndex"""
+
+    def __init__(self, document):
+        self.document = document
+
+    def close(self):
+        self.document.close()
+
+    def key(self, node):
+        return self.document.decodeString(self.document.index.keys[node])
+
+    def value(self, node):
+        """Scalar value of `node`, dict or list for a container"""
+        structure = self.document.index
+        start = structure.starts[node]
+        if structure.counts[node] >= 0:
+            return dict if self.document.data[start] == _OPEN_OBJECT else list
+        return self.document.decode(start, structure.ends[node])
+
+class _TreeEntries(object):
+    """Keys and scalars of a tree or plain value by node, through the rows of its SearchIndex"""
+
+    def __init__(self, root, searchIndex):
+        self.root = root
+        self.searchIndex = searchIndex
+
+    def close(self):
+        pass
+
+    def _entry(self, node):
+        key = None
+        entry = self.root
+        for row in self.searchIndex.rowPath(node):
+            key, entry = _entryAt(entry, row)
+        return key, entry
+
+    def key(self, node):
+        return self._entry(node)[0]
+
+    def value(self, node):
+        """Scalar value of `node`, dict or list for a container"""
+        entry = self._entry(node)[1]
+        if isItem(entry):
+            return entry.type if isContainer(entry) else entry.value
+        return type(entry) if isContainer(entry) else entry
+
+def _entryAt(entry, row):
+    """(key, child) of a QJsonTreeItem or plain value at `row`, built or not"""
+    if isItem(entry):
+        children = entry._children
+        if row < len(children):
+            child = children[row]
+            return (child.key if entry.type is dict else None), child
+        return next(islice(entry.pendingEntries(), row - len(children), None))
+    if isinstance(entry, dict):
+        return next(islice(entry.items(), row, None))
+    return None, entry[row]
+
+def _matchKeys(keys, otherKeys):
+    """Row in `otherKeys` of each of `keys`, None if it has no match
+
+    Keys repeated in an object are matched in order.
+    """
+    rows = dict(zip(otherKeys, count()))
+    if len(rows) == len(otherKeys) and len(set(keys)) == len(keys):
+        return list(map(rows.get, keys))
+
+    rows = {}
+    for row in range(len(otherKeys) - 1, -1, -1):
+        rows.setdefault(otherKeys[row], []).append(row)
+    matches = []
+    for key in keys:
+        found = rows.get(key)
+        matches.append(found.pop() if found else None)
+    return matches
+
+def _commonEnds(hashes, otherHashes):
+    """Number of entries two arrays start with and end with alike"""
+    length = min(len(hashes), len(otherHashes))
+    prefix = next(compress(count(), map(ne, hashes, otherHashes)), length)
+    suffix = next(compress(count(), map(ne, reversed(hashes), reversed(otherHashes))), length)
+    return prefix, min(suffix, length - prefix)
+
+def _digest(data):
+    """64-bit BLAKE2 digest of `data`, as a signed integer for array("q")"""
+    value = int.from_bytes(blake2b(data, digest_size=8).digest(), "little")
+    return value - (value & _SIGN) * 2
+
+def _scalarHash(value):
+    """Digest of a scalar or a key, from its type and canonical text"""
+    if value.__class__ is str:
+        return _digest(_STRING_TAG + value.encode("utf-8", "surrogatepass"))
+    if value is None or value is True or value is False:
+        return _digest(_SCALAR_TAGS[value])
+    if value.__class__ is float and value.is_integer():
+        # 1.0 is the same number as 1
+        value = int(value)
+    # repr() of NaN and of the infinities is canonical too
+    return _digest(_NUMBER_TAG + repr(value).encode("ascii"))
+
+def _decodeScalar(raw):
+    """The JSON scalar `raw`, as bytes from the file"""
+    if raw[:1] == b'"':
+        if b"\\" in raw:
+            return json.loads(raw)
+        return raw[1:-1].decode("utf-8")
+    if raw in _LITERALS:
+        return _LITERALS[raw]
+    try:
+        return int(raw)
+    except ValueError:
+        # Fractions and exponents, NaN and Infinity
+        return float(raw)
+
+def _cut(text):
+    return text if len(text) <= TEXT_LENGTH else text[:TEXT_LENGTH] + "…"
+
+def _report(done, progress, checkCancelled):
+    if checkCancelled is not None:
+        checkCancelled()
+    if progress is not None:
+        progress(done)
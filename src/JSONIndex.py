@@ -0,0 +1,561 @@
+"""
+Memory-mapped, read-mostly file backend for JSON Wizard
+
+Huge files are browsed without decoding them up front. The file is
+mapped with mmap and scanned once into a StructuralIndex, a few flat
+integer arrays holding the byte offsets of every value. Containers of
+the tree are then built lazily by IndexedSource, which only decodes the
+keys and scalars of the rows a view asks for.
+
+Items that were built are the in-memory overlay of the document and can
+be edited as usual. When the document is saved, everything that was
+never built or did not change since is copied byte for byte from the old
+file (see JSONStream.ItemWriter), so saving is mostly a file copy.
+
+MappedFile is the same without the index, it backs trees that were
+loaded some other way once they were saved.
+
+LinesDocument does the same for JSON Lines (NDJSON) files, one JSON
+value per line. Its index is the byte range of every line, the lines
+are the rows of a root array and each one is only parsed once its row
+is expanded.
+"""
+from array import array
+from itertools import accumulate, compress, count
+from JSONTree import LazySource, PythonSource, QJsonTreeItem
+from operator import add
+import json
+import mmap
+import os
+import re
+
+# Strings, structural characters and bare words (numbers and literals),
+# a lone quote starts a string that is unterminated or invalid
+_TOKEN = re.compile(
+    rb'"[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*"'
+    rb'|[{}\[\]:,]|[^\s{}\[\]:,"]+|"'
+)
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+_NUMBER = re.compile(rb"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+_LITERALS = frozenset((b"true", b"false", b"null", b"NaN", b"Infinity", b"-Infinity"))
+
+_OPEN_OBJECT = ord("{")
+_OPEN_ARRAY = ord("[")
+_CLOSE_OBJECT = ord("}")
+_CLOSE_ARRAY = ord("]")
+_QUOTE = ord('"')
+_COLON = ord(":")
+_COMMA = ord(",")
+_SPACE = re.compile(rb"[ \t\r]*")
+
+# Scanner states, i.e. what the next token may be, as for
+# JSONStream.StreamParser
+_VALUE = 0          # any value
+_FIRST_VALUE = 1    # any value or "]"
+_FIRST_KEY = 2      # an object key or "}"
+_KEY = 3            # an object key
+_AFTER_KEY = 4      # ":"
+_NEXT = 5           # "," or the end of the current container
+_DONE = 6           # nothing but whitespace
+
+# Tokens scanned between two progress reports
+_PROGRESS_TOKENS = 1 << 20
+# Bytes of a JSON Lines file split into lines at once
+_LINES_CHUNK_SIZE = 1 << 22
+# Pending items of an array decoded at once
+_DECODE_BATCH = 1 << 10
+
+# File name extensions of JSON Lines files
+LINES_EXTENSIONS = (".jsonl", ".ndjson")
+
+class StructuralIndex(object):
+    """Byte offsets of every value of a JSON file, in document order
+
+    Values are numbered in the order they appear, the root is 0. For
+    value n:
+
+        starts[n], ends[n]  byte range of the value
+        keys[n]             start of its key if it is in an object, or -1
+        counts[n]           number of children of a container, -1 for
+                            scalars
+        nexts[n]            number of the value after its subtree, i.e.
+                            its next sibling
+    """
+
+    def __init__(self):
+        self.starts = array("q")
+        self.ends = array("q")
+        self.keys = array("q")
+        self.counts = array("q")
+        self.nexts = array("q")
+
+    def __len__(self):
+        return len(self.starts)
+
+def buildIndex(data, progress=None, checkCancelled=None):
+    """Scan `data` (bytes or mmap) into a StructuralIndex
+
+    Arguments:
+        data: Content of the file
+        progress (callable, optional): Called with the number of bytes
+            scanned so far
+        checkCancelled (callable, optional): Called regularly, raises to
+            abort the scan
+
+    Raises ValueError when the structure of the document is invalid.
+    """
+
+    index = StructuralIndex()
+    starts = index.starts
+    ends = index.ends
+    keys = index.keys
+    counts = index.counts
+    nexts = index.nexts
+
+    # Open containers and whether they are objects
+    stack = []
+    objects = []
+    state = _VALUE
+    key = -1
+    tokens = 0
+
+    # Skip a UTF-8 byte order mark
+    begin = 3 if data[:3] == b"\xef\xbb\xbf" else 0
+
+    for match in _TOKEN.finditer(data, begin):
+        start = match.start()
+        first = data[start]
+
+        tokens += 1
+        if tokens % _PROGRESS_TOKENS == 0:
+            if checkCancelled is not None:
+                checkCancelled()
+            if progress is not None:
+                progress(start)
+
+        if first == _QUOTE and match.end() == start + 1:
+            raise ValueError("Unterminated string or invalid escape: byte %d" % start)
+
+        if first == _CLOSE_OBJECT or first == _CLOSE_ARRAY:
+            isObject = first == _CLOSE_OBJECT
+            if not (
+                state == _NEXT and objects[-1] == isObject
+                or state == (_FIRST_KEY if isObject else _FIRST_VALUE)
+            ):
+                raise ValueError("Unexpected '%s': byte %d" % (chr(first), start))
+            node = stack.pop()
+            objects.pop()
+            ends[node] = match.end()
+            nexts[node] = len(starts)
+            state = _NEXT if stack else _DONE
+            continue
+        if state == _NEXT:
+            if first != _COMMA:
+                raise ValueError("Expecting ',' delimiter: byte %d" % start)
+            state = _KEY if objects[-1] else _VALUE
+            continue
+        if state == _KEY or state == _FIRST_KEY:
+            if first != _QUOTE:
+                raise ValueError("Expecting property name enclosed in double quotes: byte %d" % start)
+            key = start
+            state = _AFTER_KEY
+            continue
+        if state == _AFTER_KEY:
+            if first != _COLON:
+                raise ValueError("Expecting ':' delimiter: byte %d" % start)
+            state = _VALUE
+            continue
+        if state == _DONE:
+            raise ValueError("Extra data: byte %d" % start)
+        if first == _COMMA or first == _COLON:
+            raise ValueError("Expecting value: byte %d" % start)
+
+        # A value, which becomes node number `node`
+        if stack:
+            counts[stack[-1]] += 1
+        node = len(starts)
+        starts.append(start)
+        keys.append(key)
+        key = -1
+
+        if first == _OPEN_OBJECT or first == _OPEN_ARRAY:
+            ends.append(0)
+            counts.append(0)
+            nexts.append(0)
+            stack.append(node)
+            objects.append(first == _OPEN_OBJECT)
+            state = _FIRST_KEY if first == _OPEN_OBJECT else _FIRST_VALUE
+        else:
+            end = match.end()
+            if first != _QUOTE and not (
+                data[start:end] in _LITERALS
+                or _NUMBER.fullmatch(data, start, end)
+            ):
+                raise ValueError("Expecting value: byte %d" % start)
+            ends.append(end)
+            counts.append(-1)
+            nexts.append(node + 1)
+            state = _NEXT if stack else _DONE
+
+    if stack or not starts:
+        raise ValueError("Unexpected end of document")
+    if counts[0] < 0:
+        raise ValueError("The root of a JSON document must be an object or an array")
+
+    return index
+
+def isLinesFile(fileName):
+    """Whether `fileName` is a JSON Lines file, going by its extension"""
+    return os.path.splitext(fileName)[1].lower() in LINES_EXTENSIONS
+
+def buildLineIndex(data, progress=None, checkCancelled=None):
+    """Byte range of every line of `data` (bytes or mmap) that is not blank
+
+    Arguments: as for buildIndex()
+
+    Returns:
+        (starts, ends) arrays, the line breaks are not in the ranges
+
+    """
+
+    starts = array("q")
+    ends = array("q")
+    size = len(data)
+    # Skip a UTF-8 byte order mark
+    position = 3 if data[:3] == b"\xef\xbb\xbf" else 0
+    while position < size:
+        if checkCancelled is not None:
+            checkCancelled()
+        end = size
+        if position + _LINES_CHUNK_SIZE < size:
+            end = data.rfind(b"\n", position, position + _LINES_CHUNK_SIZE)
+            if end < 0:
+                # A line longer than a chunk
+                end = data.find(b"\n", position + _LINES_CHUNK_SIZE)
+                if end < 0:
+                    end = size
+
+        # Without a loop over the lines in Python: line n starts after
+        # the n previous ones and their line breaks
+        lines = data[position:end].split(b"\n")
+        lengths = list(map(len, lines))
+        lineStarts = list(map(add, accumulate(lengths[:-1], initial=position), count()))
+        notBlank = list(map(bytes.strip, lines))
+        starts.extend(compress(lineStarts, notBlank))
+        ends.extend(compress(map(add, lineStarts, lengths), notBlank))
+
+        position = end + 1
+        if progress is not None:
+            progress(min(position, size))
+    return starts, ends
+
+class MappedFile(object):
+    """A JSON file mapped into memory, read-only
+
+    The file is the `backing` of a QJsonModel, see
+    QJsonModel.setRootItem(). `layout` is the one of the ItemWriter
+    that wrote the file, None if it was written elsewhere.
+    """
+
+    def __init__(self, fileName, layout=None):
+        self.fileName = fileName
+        self.layout = layout
+        self._file = None
+        self.data = None
+        self.open(fileName)
+
+    def open(self, fileName):
+        """(Re)map `fileName`, e.g. after the document was saved there"""
+        self.close()
+        self.fileName = fileName
+        self._file = open(fileName, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # Empty files cannot be mapped
+            self.data = b""
+
+    def close(self):
+        if self.data is not None:
+            if isinstance(self.data, mmap.mmap):
+                self.data.close()
+            self.data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, start, end):
+        return self.data[start:end]
+
+class IndexedDocument(MappedFile):
+    """A JSON file mapped into memory together with its StructuralIndex"""
+
+    def __init__(self, fileName, index=None, progress=None, checkCancelled=None):
+        super(IndexedDocument, self).__init__(fileName)
+        if index is None:
+            try:
+                index = buildIndex(self.data, progress, checkCancelled)
+            except BaseException:
+                self.close()
+                raise
+        self.index = index
+
+    def decode(self, start, end):
+        return json.loads(self.data[start:end])
+
+    def decodeString(self, start):
+        match = _STRING.match(self.data, start)
+        return json.loads(self.data[start:match.end()])
+
+    def rootItem(self):
+        """Build the root item, its children are built on demand"""
+        index = self.index
+        rootItem = QJsonTreeItem()
+        rootItem.key = "root"
+        rootItem.type = dict if self.data[index.starts[0]] == _OPEN_OBJECT else list
+        rootItem.setSpan(index.starts[0], index.ends[0] - index.starts[0])
+        rootItem.setLazySource(IndexedSource(self, 0))
+        return rootItem
+
+class LinesDocument(MappedFile):
+    """A JSON Lines file mapped into memory with the range of every line
+
+    The lines that are not blank are the records of the document, see
+    buildLineIndex().
+    """
+
+    def __init__(self, fileName, progress=None, checkCancelled=None):
+        super(LinesDocument, self).__init__(fileName)
+        try:
+            self.starts, self.ends = buildLineIndex(self.data, progress, checkCancelled)
+        except BaseException:
+            self.close()
+            raise
+
+    def __len__(self):
+        return len(self.starts)
+
+    def decode(self, start, end):
+        return json.loads(self.data[start:end])
+
+    def rootItem(self):
+        """Build the root array, its records are built on demand"""
+        rootItem = QJsonTreeItem()
+        rootItem.key = "root"
+        rootItem.type = list
+        rootItem.setSpan(0, len(self.data))
+        rootItem.setLazySource(LineSource(self))
+        return rootItem
+
+class IndexedSource(LazySource):
+    """Entries of a container of an IndexedDocument
+
+    `cursor` is the number of the first value that has no item yet.
+    Offsets are taken relative to the start of the container, since the
+    container may have moved when the document was saved. `shift` is
+    how far the remaining entries moved within the container on top of
+    that, as they are copied in one block.
+    """
+    __slots__ = ("document", "node", "cursor", "shift")
+
+    def __init__(self, document, node):
+        super(IndexedSource, self).__init__()
+        self.document = document
+        self.node = node
+        self.cursor = node + 1
+        self.shift = 0
+
+    def __len__(self):
+        return self.document.index.counts[self.node]
+
+    def fetch(self, item, count):
+        document = self.document
+        data = document.data
+        index = document.index
+        starts = index.starts
+        ends = index.ends
+        counts = index.counts
+        nexts = index.nexts
+        isObject = item.type is dict
+
+        # Entry n starts at `offset + starts[n]` within the container,
+        # which starts at `containerStart` in the file
+        containerStart = item.fileOffset()
+        offset = self.shift - starts[self.node]
+        base = containerStart + offset
+
+        node = self.cursor
+        for _ in range(count):
+            start = starts[node]
+            length = ends[node] - start
+            child = QJsonTreeItem(item)
+            if counts[node] < 0:
+                child.value = document.decode(base + start, base + start + length)
+                child.type = type(child.value)
+            else:
+                child.type = dict if data[base + start] == _OPEN_OBJECT else list
+                if counts[node]:
+                    child.setSpan(offset + start, length)
+                    child.setLazySource(IndexedSource(document, node))
+            if isObject:
+                child.key = document.decodeString(base + index.keys[node])
+            else:
+                child.key = None
+            item.appendChild(child)
+            node = nexts[node]
+
+        self.cursor = node
+        return count
+
+    def pendingEntries(self, item):
+        document = self.document
+        index = self.document.index
+        isObject = item.type is dict
+        base = item.fileOffset() - index.starts[self.node] + self.shift
+
+        node = self.cursor
+        remaining = len(self) - self.fetched
+        if isObject:
+            for _ in range(remaining):
+                start = base + index.starts[node]
+                key = document.decodeString(base + index.keys[node])
+                yield key, document.decode(start, start + index.ends[node] - index.starts[node])
+                node = index.nexts[node]
+            return
+
+        # Items of an array are decoded a batch at a time, as an array
+        nexts = index.nexts
+        while remaining:
+            count = min(remaining, _DECODE_BATCH)
+            first = node
+            for _ in range(count - 1):
+                node = nexts[node]
+            values = json.loads(b"[" + document.data[base + index.starts[first]:base + index.ends[node]] + b"]")
+            node = nexts[node]
+            remaining -= count
+            for value in values:
+                yield None, value
+
+    def pendingRegion(self, item):
+        """Byte range of the remaining entries in the backing file
+
+        The range goes from the key or value of the first remaining
+        entry to the end of the last one, separators included.
+        """
+        index = self.document.index
+        base = item.fileOffset() - index.starts[self.node] + self.shift
+
+        first = self.cursor
+        last = first
+        node = first
+        for _ in range(len(self) - self.fetched):
+            last = node
+            node = index.nexts[node]
+
+        start = index.keys[first] if item.type is dict else index.starts[first]
+        return base + start, base + index.ends[last]
+
+    def regionShift(self, item, newStart, containerStart):
+        """`shift` once the remaining entries are copied to `newStart`
+
+        Arguments:
+            newStart (int): New absolute offset of the remaining entries
+            containerStart (int): New absolute offset of the container
+        """
+        index = self.document.index
+        first = self.cursor
+        start = index.keys[first] if item.type is dict else index.starts[first]
+        return newStart - containerStart - (start - index.starts[self.node])
+
+class LineSource(LazySource):
+    """Records of a LinesDocument, the entries of its root array
+
+    Scalars are decoded when their row is built, objects and arrays only
+    when it is expanded, see RecordSource. `shift` is how far the
+    remaining records moved in the file since it was indexed, they are
+    copied in one block when the document is saved.
+    """
+    __slots__ = ("document", "shift")
+
+    def __init__(self, document):
+        super(LineSource, self).__init__()
+        self.document = document
+        self.shift = 0
+
+    def __len__(self):
+        return len(self.document)
+
+    def fetch(self, item, count):
+        document = self.document
+        data = document.data
+        shift = self.shift
+
+        for record in range(self.fetched, self.fetched + count):
+            start = document.starts[record] + shift
+            end = document.ends[record] + shift
+            child = QJsonTreeItem(item)
+            child.key = None
+            first = _SPACE.match(data, start).end()
+            if data[first] == _OPEN_OBJECT or data[first] == _OPEN_ARRAY:
+                child.type = dict if data[first] == _OPEN_OBJECT else list
+                second = _SPACE.match(data, first + 1).end()
+                if data[second:second + 1] not in (b"}", b"]"):
+                    # Relative to the root, which starts the file
+                    child.setSpan(start, end - start)
+                    child.setLazySource(RecordSource(document, child))
+            else:
+                child.value = document.decode(start, end)
+                child.type = type(child.value)
+            item.appendChild(child)
+        return count
+
+    def pendingEntries(self, item):
+        document = self.document
+        for record in range(self.fetched, len(self)):
+            yield None, document.decode(document.starts[record] + self.shift, document.ends[record] + self.shift)
+
+    def pendingRegion(self, item):
+        """Byte range of the remaining records, line breaks included"""
+        document = self.document
+        return document.starts[self.fetched] + self.shift, document.ends[-1] + self.shift
+
+    def regionShift(self, item, newStart, containerStart):
+        """`shift` once the remaining records are copied to `newStart`"""
+        return newStart - containerStart - self.document.starts[self.fetched]
+
+class RecordSource(PythonSource):
+    """Entries of an object or array record of a LinesDocument
+
+    Its line is parsed on the first fetch, the record `item` was
+    built by LineSource and is not empty.
+    """
+    __slots__ = ("document", "item")
+
+    def __init__(self, document, item):
+        super(RecordSource, self).__init__(None)
+        self.document = document
+        self.item = item
+
+    def __bool__(self):
+        return True
+
+    def __len__(self):
+        return len(self._parsed())
+
+    def _parsed(self):
+        if self.source is None:
+            start = self.item.fileOffset()
+            self.source = self.document.decode(start, start + self.item.span()[1])
+            self.item = None
+        return self.source
+
+    def fetch(self, item, count):
+        self._parsed()
+        return super(RecordSource, self).fetch(item, count)
+
+    def pendingEntries(self, item):
+        self._parsed()
+        return super(RecordSource, self).pendingEntries(item)
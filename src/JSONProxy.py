@@ -0,0 +1,685 @@
+"""
+Sorted and filtered view of a QJsonModel, without reordering its tree
+
+JsonProxyModel sits between a QJSONModel.QJsonModel and its view and
+shows the children of every container in the order of a column, keys or
+values, while the tree and the saved file keep their own order. Each
+container the view looked into gets a _Mapping, the permutation of its
+rows, and the sort keys of its children per column. Keys are computed
+and sorted once per column, sorting again in the other direction or by
+a column sorted before only copies the order, until the children change.
+
+A filter text hides the rows whose subtree holds no match, as told by a
+JSONSearch.SearchFilter on the search index of the model. Mappings then
+leave out the hidden rows. After an edit only the rows on the path to
+the changed item are shown or hidden again.
+
+Indexes of the proxy point to the same QJsonTreeItem as the indexes of
+the model, only their rows differ. Lazy containers are built in full
+once sorted, sorting needs every key. Filtered, they are built up to the
+rows shown.
+"""
+from bisect import bisect_left
+from itertools import compress
+from PySide2 import QtCore
+from JSONSearch import SearchFilter
+from JSONTree import FETCH_BATCH_SIZE
+
+# Order of the types when sorting by value, numbers compare together
+_VALUE_RANKS = {type(None): 0, bool: 1, int: 2, float: 2, str: 3, list: 4, dict: 5}
+_STRING_RANK = 3
+_CONTAINER_RANK = 4
+
+_DISPLAY_ROLE = QtCore.Qt.DisplayRole
+_EDIT_ROLE = QtCore.Qt.EditRole
+
+def sortKey(item, column):
+    """Key of `item` among its siblings when sorting by `column`
+
+    Object members sort by key in column 0, array entries keep their
+    position. In column 1 values sort by type first: null, booleans,
+    numbers, strings, then arrays and objects, which keep their order.
+    Keys and strings ignore case.
+    """
+    if column == 0:
+        if item._parent is not None and item._parent.type is list:
+            return item.row()
+        return item.key.lower()
+    rank = _VALUE_RANKS.get(item.type, len(_VALUE_RANKS))
+    if rank == _STRING_RANK:
+        return rank, item.value.lower()
+    if rank > 0 and rank < _CONTAINER_RANK:
+        return rank, item.value
+    return rank, 0
+
+class _Mapping(object):
+    """Rows of the children of a container as the proxy shows them
+
+    `order` holds the model row of each proxy row, rows() the other way
+    round. `keys` holds the sort keys of the children by column, in
+    model order, and `ascending` their model rows in ascending order.
+    `pending` holds the rows shown once built of a lazy container, out
+    of the `total` children in the search index.
+    """
+    __slots__ = ("order", "count", "keys", "ascending", "pending", "total", "_rows")
+
+    def __init__(self, count):
+        self.keys = {}
+        self.ascending = {}
+        self.pending = []
+        self.total = count
+        self.setOrder(list(range(count)))
+
+    def setOrder(self, order, count=None):
+        """Show the children in `order`, `count` of them in the model"""
+        self.order = order
+        self.count = len(order) if count is None else count
+        self._rows = None
+
+    def rows(self):
+        """Proxy row of each model row, -1 if hidden, built on first use"""
+        rows = self._rows
+        if rows is None:
+            rows = self._rows = [-1] * self.count
+            for row, sourceRow in enumerate(self.order):
+                rows[sourceRow] = row
+        return rows
+
+    def childrenChanged(self):
+        # Children were added or removed, or keys changed
+        self.ascending.clear()
+
+class JsonProxyModel(QtCore.QAbstractProxyModel):
+    def __init__(self, parent=None):
+        super(JsonProxyModel, self).__init__(parent)
+
+        self._source = None
+        self._sourceData = None
+        self._sourceFlags = None
+        self._sortColumn = -1
+        self._sortOrder = QtCore.Qt.AscendingOrder
+        # SearchFilter of the search index of the model, and its text
+        self._filter = None
+        self._filterText = ""
+        # Whether rows are sorted or filtered, through _mappings
+        self._mapped = False
+        # _Mapping of the containers shown, by item, while mapped
+        self._mappings = {}
+        # Sorted lazy containers to build in full
+        self._unfetched = []
+        # Whether the rows being removed from the model are removed
+        # from the proxy once they are gone, see _sourceRowsRemoved()
+        self._removing = False
+        # Rows being inserted into the model that are shown, see
+        # _sourceRowsInserted(), None if the proxy does not insert any
+        self._inserting = None
+
+    def setSourceModel(self, model):
+        """Show `model`, a QJsonModel, it must not have another proxy"""
+        self.beginResetModel()
+        super(JsonProxyModel, self).setSourceModel(model)
+        self._source = model
+        # Looked up once, they are called for every cell painted
+        self._sourceData = model.data
+        self._sourceFlags = model.flags
+        self._mappings.clear()
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._sourceReset)
+        model.rowsAboutToBeInserted.connect(self._sourceRowsAboutToBeInserted)
+        model.rowsInserted.connect(self._sourceRowsInserted)
+        model.rowsAboutToBeRemoved.connect(self._sourceRowsAboutToBeRemoved)
+        model.rowsRemoved.connect(self._sourceRowsRemoved)
+        model.dataChanged.connect(self._sourceDataChanged)
+        self.endResetModel()
+
+    def sortColumn(self):
+        return self._sortColumn
+
+    def sortOrder(self):
+        return self._sortOrder
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        """Show the children of every container sorted by `column`
+
+        Arguments:
+            column (int): 0 for keys, 1 for values, -1 for the order of
+                the model
+            order (Qt.SortOrder): Qt.AscendingOrder or Qt.DescendingOrder
+
+        """
+
+        if column == self._sortColumn and (column < 0 or order == self._sortOrder):
+            return
+
+        def sortAll():
+            self._sortColumn = column
+            self._sortOrder = order
+            self._updateMapped()
+            if not self._mapped:
+                self._mappings.clear()
+                return
+            for parentItem, mapping in self._mappings.items():
+                self._orderMapping(parentItem, mapping)
+
+        self._changeLayout(sortAll)
+
+    def filterText(self):
+        return self._filterText
+
+    def setFilterText(self, text):
+        """Hide the rows whose key, value and children do not contain `text`
+
+        Rows are matched as by find next, through the search index of the
+        model. Until it has one, e.g. while it is being built, nothing is
+        hidden; call this again once it is set.
+
+        Arguments:
+            text (str): Text to match, an empty text shows every row
+
+        Returns:
+            True if rows are filtered by `text`
+
+        """
+
+        searchIndex = self._source.searchIndex()
+        if self._filter is not None and self._filter.searchIndex is not searchIndex:
+            self._filter.close()
+            self._filter = None
+        elif self._filter is not None and text == self._filterText:
+            return self._isFiltered()
+        self._filterText = text
+
+        def filterAll():
+            if self._filter is None and searchIndex is not None:
+                self._filter = SearchFilter(searchIndex)
+            if self._filter is not None:
+                self._filter.setText(text)
+            self._updateMapped()
+            # Built again as the view asks for them
+            self._mappings.clear()
+            self._unfetched = []
+
+        self._changeLayout(filterAll)
+        return self._isFiltered()
+
+    def visibleCount(self):
+        """Number of rows shown by the filter, None without a filter"""
+        if not self._isFiltered():
+            return None
+        return self._filter.visibleCount()
+
+    def _isFiltered(self):
+        return self._filter is not None and self._filter.isActive()
+
+    def _updateMapped(self):
+        self._mapped = self._sortColumn >= 0 or self._isFiltered()
+
+    def _changeLayout(self, change):
+        # Persistent indexes, e.g. the expanded rows of the view, follow
+        # their items to their new rows, those hidden become invalid
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        items = [(index.internalPointer(), index.column()) for index in persistent]
+        change()
+        self.changePersistentIndexList(persistent, [self._proxyIndex(item, column) for item, column in items])
+        self.layoutChanged.emit()
+
+    def _mapping(self, parentItem, fetch=True):
+        """_Mapping of the children of `parentItem`, None if not mapped
+
+        Created on first use, after building the first batch of a lazy
+        container unless `fetch` is False, e.g. while the model is
+        changing its rows.
+        """
+        mapping = self._mappings.get(parentItem)
+        if mapping is not None or not self._mapped:
+            return mapping
+
+        if fetch:
+            # Without notifying the view, as QJsonModel.rowCount() does
+            self._source.rowCount(self._sourceParent(parentItem))
+        mapping = self._mappings[parentItem] = _Mapping(parentItem.childCount())
+        self._orderMapping(parentItem, mapping)
+        if self._sortColumn >= 0 and parentItem.canFetchMore():
+            if not self._unfetched:
+                # Not while the view is asking for rows
+                QtCore.QTimer.singleShot(0, self._fetchUnfetched)
+            self._unfetched.append(parentItem)
+        return mapping
+
+    def _orderMapping(self, parentItem, mapping):
+        # Sorts the rows, then leaves out those hidden
+        column = self._sortColumn
+        count = mapping.count
+        descending = self._sortOrder == QtCore.Qt.DescendingOrder
+        if column < 0 or (column == 0 and parentItem.type is list):
+            # Array entries are keyed by their position
+            order = list(range(count))
+            if column >= 0 and descending:
+                order.reverse()
+        else:
+            ascending = mapping.ascending.get(column)
+            if ascending is None:
+                keys = mapping.keys.get(column)
+                if keys is None:
+                    keys = mapping.keys[column] = [sortKey(child, column) for child in parentItem._children]
+                ascending = mapping.ascending[column] = sorted(range(count), key=keys.__getitem__)
+            order = ascending[::-1] if descending else list(ascending)
+
+        nodes = self._childNodes(parentItem)
+        if nodes is not None:
+            shown = self._filter.containsEach(nodes)
+            if column < 0:
+                order = list(compress(order, shown))
+            else:
+                order = [row for row in order if shown[row]]
+            mapping.pending = list(compress(range(count, len(nodes)), shown[count:]))
+            mapping.total = len(nodes)
+        mapping.setOrder(order, count)
+
+    def _childNodes(self, parentItem):
+        # Search index nodes of the children of `parentItem` while
+        # filtered, built or not, None if not filtered
+        if not self._isFiltered():
+            return None
+        return self._filter.searchIndex.childNodes(parentItem)
+
+    def _isSorted(self, parentItem, mapping, row):
+        # Whether the child at model `row` is still in place
+        keys = mapping.keys.get(self._sortColumn)
+        if keys is None:
+            return True
+        order = mapping.order
+        proxyRow = mapping.rows()[row]
+        if proxyRow < 0:
+            return True
+        key = keys[row]
+        if self._sortOrder == QtCore.Qt.DescendingOrder:
+            return (
+                (proxyRow == 0 or keys[order[proxyRow - 1]] >= key)
+                and (proxyRow + 1 == len(order) or key >= keys[order[proxyRow + 1]])
+            )
+        return (
+            (proxyRow == 0 or keys[order[proxyRow - 1]] <= key)
+            and (proxyRow + 1 == len(order) or key <= keys[order[proxyRow + 1]])
+        )
+
+    def _insertPosition(self, parentItem, mapping, row):
+        # Proxy row the hidden child at model `row` goes to once shown
+        order = mapping.order
+        keys = None
+        if self._sortColumn > 0 or (self._sortColumn == 0 and parentItem.type is dict):
+            keys = mapping.keys[self._sortColumn]
+        descending = self._sortColumn >= 0 and self._sortOrder == QtCore.Qt.DescendingOrder
+        if keys is None and not descending:
+            return bisect_left(order, row)
+
+        # Sorted by key, then by model row
+        key = row if keys is None else (keys[row], row)
+        low = 0
+        high = len(order)
+        while low < high:
+            middle = (low + high) // 2
+            other = order[middle] if keys is None else (keys[order[middle]], order[middle])
+            if (other > key) if descending else (other < key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _fetchUnfetched(self):
+        unfetched, self._unfetched = self._unfetched, []
+        for parentItem in unfetched:
+            if parentItem in self._mappings:
+                self._source.fetchAll(parentItem)
+
+    def _proxyRow(self, item):
+        # -1 if hidden by the filter
+        row = item.row()
+        if item._parent is None or (not self._mapped and not self._mappings):
+            return row
+        mapping = self._mapping(item._parent)
+        return mapping.rows()[row] if mapping is not None else row
+
+    def _proxyIndex(self, item, column=0):
+        # Invalid if `item` or one of its ancestors is hidden
+        if item._parent is None:
+            return QtCore.QModelIndex()
+        if self._isFiltered():
+            ancestors = []
+            ancestor = item._parent
+            while ancestor._parent is not None:
+                ancestors.append(ancestor)
+                ancestor = ancestor._parent
+            for ancestor in reversed(ancestors):
+                if self._proxyRow(ancestor) < 0:
+                    return QtCore.QModelIndex()
+        row = self._proxyRow(item)
+        if row < 0:
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, item)
+
+    def _sourceParent(self, parentItem):
+        return self._source.indexForItem(parentItem)
+
+    def _parentItem(self, parent):
+        return parent.internalPointer() if parent.isValid() else self._source.rootItem()
+
+    def mapToSource(self, proxyIndex):
+        if not proxyIndex.isValid():
+            return QtCore.QModelIndex()
+        return self._source.indexForItem(proxyIndex.internalPointer(), proxyIndex.column())
+
+    def mapFromSource(self, sourceIndex):
+        if not sourceIndex.isValid():
+            return QtCore.QModelIndex()
+        return self._proxyIndex(sourceIndex.internalPointer(), sourceIndex.column())
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if parent.column() > 0 or row < 0 or column < 0 or column > 1:
+            return QtCore.QModelIndex()
+        parentItem = self._parentItem(parent)
+        if self._mapped or self._mappings:
+            mapping = self._mapping(parentItem)
+            if mapping is not None:
+                if row >= len(mapping.order):
+                    return QtCore.QModelIndex()
+                return self.createIndex(row, column, parentItem._children[mapping.order[row]])
+
+        # As in QJsonModel.index(), rather than through it
+        if row >= len(parentItem._children):
+            self._source.rowCount(self._sourceParent(parentItem))
+            if row >= len(parentItem._children):
+                return QtCore.QModelIndex()
+        return self.createIndex(row, column, parentItem._children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        parentItem = index.internalPointer()._parent
+        if parentItem is None or parentItem is self._source.rootItem():
+            return QtCore.QModelIndex()
+        return self.createIndex(self._proxyRow(parentItem), 0, parentItem)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        parentItem = self._parentItem(parent)
+        mapping = self._mapping(parentItem)
+        if mapping is not None:
+            return len(mapping.order)
+        return self._source.rowCount(self._sourceParent(parentItem))
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return self._source.columnCount()
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return False
+        parentItem = self._parentItem(parent)
+        if self._isFiltered():
+            # Without building the rows
+            node = self._filter.searchIndex.nodeForItem(parentItem)
+            if node is not None:
+                return self._filter.containsChildren(node)
+        return parentItem.hasChildren()
+
+    def canFetchMore(self, parent):
+        if self._sortColumn < 0 and self._isFiltered():
+            mapping = self._mapping(self._parentItem(parent))
+            if not mapping.pending:
+                return False
+        return self._source.canFetchMore(self.mapToSource(parent))
+
+    def fetchMore(self, parent):
+        parentItem = self._parentItem(parent)
+        mapping = self._mapping(parentItem)
+        if mapping is None:
+            self._source.fetchMore(self.mapToSource(parent))
+        elif self._sortColumn >= 0:
+            # Sorted, the rows built next could go anywhere
+            self._source.fetchAll(parentItem)
+        elif mapping.pending:
+            # Up to the next batch of rows shown
+            last = mapping.pending[min(len(mapping.pending), FETCH_BATCH_SIZE) - 1]
+            self._source.fetchItems(parentItem, last + 1 - parentItem.childCount())
+
+    # QJsonModel only looks at the item and column of an index, but for
+    # the position of array entries shown as their key. Proxy indexes are
+    # passed on as they are otherwise, data() and flags() are called for
+    # every cell painted
+
+    def data(self, index, role):
+        if (
+            role == _DISPLAY_ROLE
+            and self._mappings
+            and index.column() == 0
+            and index.internalPointer()._parent.type is list
+        ):
+            index = self.mapToSource(index)
+        return self._sourceData(index, role)
+
+    def flags(self, index):
+        return self._sourceFlags(index)
+
+    def headerData(self, section, orientation, role=_DISPLAY_ROLE):
+        if role == QtCore.Qt.InitialSortOrderRole:
+            return int(QtCore.Qt.AscendingOrder)
+        return self._source.headerData(section, orientation, role)
+
+    def _sourceReset(self):
+        # A new tree comes without a search index, filtered again once
+        # setFilterText() is called with the next one
+        if self._filter is not None:
+            self._filter.close()
+            self._filter = None
+        self._updateMapped()
+        self._mappings.clear()
+        self._unfetched = []
+        self.endResetModel()
+
+    def _sourceRowsAboutToBeInserted(self, parent, first, last):
+        parentItem = self._parentItem(parent)
+        self._inserting = None
+        if self._isFiltered():
+            # Hidden or never looked into, nothing to tell the view
+            mapping = self._mappings.get(parentItem)
+            if mapping is None:
+                return
+        else:
+            mapping = self._mapping(parentItem, fetch=False)
+            if mapping is None:
+                self._inserting = list(range(first, last + 1))
+                self.beginInsertRows(self.mapFromSource(parent), first, last)
+                return
+
+        # The search index already holds the new rows
+        rows = range(first, last + 1)
+        nodes = self._childNodes(parentItem)
+        if nodes is not None:
+            rows = list(compress(rows, self._filter.containsEach(nodes[first:last + 1])))
+        self._inserting = list(rows)
+        if not rows:
+            return
+        if self._sortColumn >= 0:
+            # After the last row, until sorted again
+            position = len(mapping.order)
+        else:
+            position = bisect_left(mapping.order, first)
+        self.beginInsertRows(self.mapFromSource(parent), position, position + len(rows) - 1)
+
+    def _sourceRowsInserted(self, parent, first, last):
+        parentItem = self._parentItem(parent)
+        inserted, self._inserting = self._inserting, None
+        mapping = self._mappings.get(parentItem)
+        if mapping is None:
+            if inserted is not None:
+                self.endInsertRows()
+            self._refilterPath(parentItem)
+            return
+
+        count = last - first + 1
+        order = [row + count if row >= first else row for row in mapping.order]
+        if self._sortColumn >= 0:
+            order.extend(inserted)
+        else:
+            position = bisect_left(order, first)
+            order[position:position] = inserted
+        mapping.setOrder(order, mapping.count + count)
+        mapping.childrenChanged()
+        children = parentItem._children[first:last + 1]
+        for column, keys in mapping.keys.items():
+            keys[first:first] = [sortKey(child, column) for child in children]
+
+        nodes = self._childNodes(parentItem)
+        if nodes is not None:
+            if len(nodes) == mapping.total:
+                # Built from the rows still to build
+                mapping.pending = [row for row in mapping.pending if row > last]
+            else:
+                mapping.pending = [row + count for row in mapping.pending]
+                mapping.total += count
+
+        if inserted:
+            self.endInsertRows()
+        if self._sortColumn >= 0:
+            self._changeLayout(lambda: self._orderMapping(parentItem, mapping))
+        self._refilterPath(parentItem)
+
+    def _sourceRowsAboutToBeRemoved(self, parent, first, last):
+        parentItem = self._parentItem(parent)
+        if self._isFiltered():
+            mapping = self._mappings.get(parentItem)
+            if mapping is None:
+                return
+        else:
+            mapping = self._mapping(parentItem, fetch=False)
+            if mapping is None:
+                self.beginRemoveRows(self.mapFromSource(parent), first, last)
+                self._removing = True
+                return
+
+        # Their proxy rows may be anywhere, removed range by range from
+        # the last one
+        proxyParent = self.mapFromSource(parent)
+        proxyRows = mapping.rows()
+        rows = sorted((proxyRows[row] for row in range(first, last + 1) if proxyRows[row] >= 0), reverse=True)
+        n = 0
+        while n < len(rows):
+            end = start = rows[n]
+            n += 1
+            while n < len(rows) and rows[n] == start - 1:
+                start = rows[n]
+                n += 1
+            self.beginRemoveRows(proxyParent, start, end)
+            del mapping.order[start:end + 1]
+            # Model rows are renumbered once they are gone
+            mapping.setOrder(mapping.order, mapping.count)
+            self.endRemoveRows()
+
+        # Mapped removed subtrees are mapped again if they come back
+        self._dropMappings(parentItem, parentItem._children[first:last + 1])
+
+    def _sourceRowsRemoved(self, parent, first, last):
+        if self._removing:
+            self._removing = False
+            self.endRemoveRows()
+            return
+        # The proxy rows were removed before the model's
+        parentItem = self._parentItem(parent)
+        mapping = self._mappings.get(parentItem)
+        if mapping is not None:
+            count = last - first + 1
+            mapping.setOrder([row - count if row > last else row for row in mapping.order], mapping.count - count)
+            mapping.childrenChanged()
+            for keys in mapping.keys.values():
+                del keys[first:last + 1]
+            mapping.pending = [row - count for row in mapping.pending]
+            mapping.total -= count
+        self._refilterPath(parentItem)
+
+    def _sourceDataChanged(self, topLeft, bottomRight, roles=()):
+        parentItem = self._parentItem(topLeft.parent())
+        edited = not roles or _EDIT_ROLE in roles
+        mapping = self._mappings.get(parentItem)
+        if mapping is None:
+            if not self._isFiltered():
+                self.dataChanged.emit(self.mapFromSource(topLeft), self.mapFromSource(bottomRight), roles)
+        else:
+            moved = False
+            for row in range(topLeft.row(), bottomRight.row() + 1):
+                item = parentItem._children[row]
+                if edited:
+                    for column, keys in mapping.keys.items():
+                        keys[row] = sortKey(item, column)
+                    mapping.childrenChanged()
+                    moved = moved or not self._isSorted(parentItem, mapping, row)
+                proxyRow = mapping.rows()[row]
+                if proxyRow >= 0:
+                    self.dataChanged.emit(
+                        self.createIndex(proxyRow, topLeft.column(), item),
+                        self.createIndex(proxyRow, bottomRight.column(), item),
+                        roles,
+                    )
+            if moved:
+                self._changeLayout(lambda: self._orderMapping(parentItem, mapping))
+
+        if edited and self._isFiltered():
+            for row in range(topLeft.row(), bottomRight.row() + 1):
+                self._refilterPath(parentItem._children[row])
+
+    def _refilterPath(self, item):
+        """Show or hide the rows from the root down to `item` again
+
+        Called once the search index took over a change of `item` or of
+        its children. Only the rows on the path can change, the others
+        hold the same matches as before.
+        """
+
+        if not self._isFiltered():
+            return
+        path = []
+        while item._parent is not None:
+            path.append(item)
+            item = item._parent
+
+        for child in reversed(path):
+            parentItem = child._parent
+            mapping = self._mappings.get(parentItem)
+            if mapping is None:
+                # Not shown, or never looked into
+                return
+            row = child.row()
+            contained = self._filter.containsItem(child)
+            proxyRow = mapping.rows()[row]
+            if contained == (proxyRow >= 0):
+                if not contained:
+                    return
+                continue
+
+            proxyParent = self._proxyIndex(parentItem)
+            if contained:
+                position = self._insertPosition(parentItem, mapping, row)
+                self.beginInsertRows(proxyParent, position, position)
+                mapping.order.insert(position, row)
+                mapping.setOrder(mapping.order, mapping.count)
+                self.endInsertRows()
+            else:
+                self.beginRemoveRows(proxyParent, proxyRow, proxyRow)
+                del mapping.order[proxyRow]
+                mapping.setOrder(mapping.order, mapping.count)
+                self._dropMappings(parentItem, [child])
+                self.endRemoveRows()
+            # Rows under it were not mapped while hidden
+            return
+
+    def _dropMappings(self, parentItem, children):
+        # Mappings of the subtrees of `children` of `parentItem`
+        dropped = set(map(id, children))
+        for item in list(self._mappings):
+            ancestor = item
+            while ancestor is not None and ancestor is not parentItem:
+                if id(ancestor) in dropped:
+                    del self._mappings[item]
+                    break
+                ancestor = ancestor._parent
@@ -0,0 +1,290 @@
+"""
+JSONPath and JSON Pointer queries for JSON Wizard
+
+Queries are evaluated on a QJsonTreeItem tree, building the children of
+lazy containers as they are needed. Object members are looked up through
+QJsonTreeItem.childByKey() and array entries by row, so only wildcards,
+slices and recursive descent visit whole containers.
+
+Supported JSONPath syntax:
+
+    $               the root, may be left out
+    .name ['name']  member of an object, also ["name"]
+    [n]             entry of an array, negative from the end
+    [start:stop:step]
+                    entries of an array, as Python slices
+    .* [*]          every child
+    [a,'b',1]       several of the above
+    ..name ..*      the same on the item and all its descendants
+
+JSON Pointers (RFC 6901) start with "/", e.g. /services/3/name, and the
+empty pointer is the root.
+
+Expressions are compiled once into a Query by compileQuery(), which
+keeps the last QUERY_CACHE_SIZE of them.
+"""
+from functools import lru_cache
+import json
+import re
+
+# Compiled queries kept by compileQuery()
+QUERY_CACHE_SIZE = 256
+
+_NAME = re.compile(r"[\w$-]+")
+_INTEGER = re.compile(r"-?\d+")
+_SLICE = re.compile(r"(-?\d+)?\s*:\s*(-?\d+)?\s*(?::\s*(-?\d+)?)?")
+_DOUBLE_QUOTED = re.compile(r'"(?:[^"\\]|\\.)*"')
+_SINGLE_QUOTED = re.compile(r"'((?:[^'\\]|\\.)*)'")
+_SINGLE_QUOTED_ESCAPE = re.compile(r"\\(.)")
+_ARRAY_INDEX = re.compile(r"0|[1-9]\d*")
+
+# Steps of a query, as (kind, argument) pairs
+_MEMBER = "member"
+_INDEX = "index"
+_SLICE_STEP = "slice"
+_WILDCARD = "wildcard"
+_UNION = "union"
+_DESCENDANTS = "descendants"
+_POINTER = "pointer"
+
+class QueryError(ValueError):
+    pass
+
+def isQuery(text):
+    """Whether `text` is meant as a query rather than text to find"""
+    return text.startswith(("$", "/"))
+
+def pointer(item):
+    """JSON Pointer of `item` from the root of its tree"""
+    tokens = []
+    while item.parent() is not None:
+        if item.parent().type is dict:
+            tokens.append(str(item.key).replace("~", "~0").replace("/", "~1"))
+        else:
+            tokens.append(str(item.row()))
+        item = item.parent()
+    return "".join("/" + token for token in reversed(tokens))
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compileQuery(expression):
+    """Parse a JSONPath expression or a JSON Pointer into a Query
+
+    Raises QueryError if `expression` is not valid.
+    """
+    if expression == "" or expression.startswith("/"):
+        return Query(expression, _parsePointer(expression))
+    return Query(expression, _parsePath(expression))
+
+class Query(object):
+    """A compiled expression, see compileQuery()"""
+
+    def __init__(self, expression, steps):
+        self.expression = expression
+        self.steps = steps
+
+    def __repr__(self):
+        return "Query(%r)" % self.expression
+
+    def evaluate(self, rootItem, fetch=None):
+        """Items matching the query under `rootItem`
+
+        Arguments:
+            rootItem (QJsonTreeItem): Root of the tree
+            fetch (callable, optional): Called with a lazy container and
+                a number of children to build them, e.g. through
+                QJsonModel.fetchMore() so that the views are notified.
+                By default QJsonTreeItem.fetchMore() is used.
+
+        Returns:
+            list of QJsonTreeItem, each one once, in the order they were
+            matched
+
+        """
+
+        if fetch is None:
+            fetch = _fetch
+        items = [rootItem]
+        for kind, argument in self.steps:
+            found = []
+            if kind is _DESCENDANTS:
+                kind, argument = argument
+                items = _descendants(items, fetch)
+            for item in items:
+                if item.type is dict or item.type is list:
+                    _select(item, kind, argument, fetch, found)
+            items = found
+
+        seen = set()
+        result = []
+        for item in items:
+            if id(item) not in seen:
+                seen.add(id(item))
+                result.append(item)
+        return result
+
+def _fetch(item, count):
+    item.fetchMore(count)
+
+def _fetchUpTo(item, count, fetch):
+    """Build the first `count` children of `item`"""
+    missing = count - item.childCount()
+    if missing > 0 and item.canFetchMore():
+        fetch(item, missing)
+
+def _length(item):
+    return item.childCount() + item.pendingCount()
+
+def _select(item, kind, argument, fetch, found):
+    """Append the children of container `item` matching a step to `found`"""
+    if kind is _UNION:
+        for kind, argument in argument:
+            _select(item, kind, argument, fetch, found)
+
+    elif kind is _MEMBER:
+        if item.type is dict:
+            _appendMember(item, argument, fetch, found)
+
+    elif kind is _POINTER:
+        if item.type is dict:
+            _appendMember(item, argument, fetch, found)
+        elif _ARRAY_INDEX.fullmatch(argument):
+            _appendEntry(item, int(argument), fetch, found)
+
+    elif kind is _INDEX:
+        if item.type is list:
+            _appendEntry(item, argument, fetch, found)
+
+    elif kind is _SLICE_STEP:
+        if item.type is list:
+            rows = range(*argument.indices(_length(item)))
+            if rows:
+                _fetchUpTo(item, max(rows[0], rows[-1]) + 1, fetch)
+                found.extend(item.child(row) for row in rows)
+
+    elif kind is _WILDCARD:
+        _fetchUpTo(item, _length(item), fetch)
+        found.extend(item._children)
+
+def _appendMember(item, key, fetch, found):
+    child = item.childByKey(key)
+    if child is None and item.canFetchMore():
+        # Only the children built so far are in the key map
+        _fetchUpTo(item, _length(item), fetch)
+        child = item.childByKey(key)
+    if child is not None:
+        found.append(child)
+
+def _appendEntry(item, row, fetch, found):
+    length = _length(item)
+    if row < 0:
+        row += length
+    if 0 <= row < length:
+        _fetchUpTo(item, row + 1, fetch)
+        if row < item.childCount():
+            found.append(item.child(row))
+
+def _descendants(items, fetch):
+    """`items` and all the containers below them, in document order"""
+    result = []
+    stack = list(reversed(items))
+    while stack:
+        item = stack.pop()
+        if item.type is not dict and item.type is not list:
+            continue
+        result.append(item)
+        _fetchUpTo(item, _length(item), fetch)
+        stack.extend(reversed(item._children))
+    return result
+
+def _parsePointer(expression):
+    steps = []
+    for token in expression.split("/")[1:]:
+        if re.search("~[^01]|~$", token):
+            raise QueryError("Invalid escape in JSON Pointer: %r" % token)
+        steps.append((_POINTER, token.replace("~1", "/").replace("~0", "~")))
+    return tuple(steps)
+
+def _parsePath(path):
+    steps = []
+    position = 0
+    if path.startswith("$"):
+        position = 1
+    elif path and path[0] not in ".[":
+        # A name without the leading "$."
+        path = "." + path
+
+    while position < len(path):
+        descendants = path.startswith("..", position)
+        if descendants:
+            position += 2
+            if position < len(path) and path[position] == "[":
+                step, position = _parseBracket(path, position)
+            else:
+                step, position = _parseName(path, position)
+            step = (_DESCENDANTS, step)
+        elif path[position] == ".":
+            step, position = _parseName(path, position + 1)
+        elif path[position] == "[":
+            step, position = _parseBracket(path, position)
+        else:
+            raise QueryError("Unexpected %r at position %d of %s" % (path[position], position, path))
+        steps.append(step)
+    return tuple(steps)
+
+def _parseName(path, position):
+    if path.startswith("*", position):
+        return (_WILDCARD, None), position + 1
+    match = _NAME.match(path, position)
+    if match is None:
+        raise QueryError("Expecting a name at position %d of %s" % (position, path))
+    return (_MEMBER, match.group()), match.end()
+
+def _parseBracket(path, position):
+    """Parse [...] at `position`, returns the step and the position after it"""
+    selectors = []
+    position += 1
+    while True:
+        position = _skipSpaces(path, position)
+        selector, position = _parseSelector(path, position)
+        selectors.append(selector)
+        position = _skipSpaces(path, position)
+        if path.startswith("]", position):
+            position += 1
+            break
+        if not path.startswith(",", position):
+            raise QueryError("Expecting ',' or ']' at position %d of %s" % (position, path))
+        position += 1
+
+    if len(selectors) == 1:
+        return selectors[0], position
+    return (_UNION, tuple(selectors)), position
+
+def _parseSelector(path, position):
+    if path.startswith("*", position):
+        return (_WILDCARD, None), position + 1
+
+    match = _DOUBLE_QUOTED.match(path, position)
+    if match is not None:
+        return (_MEMBER, json.loads(match.group())), match.end()
+    match = _SINGLE_QUOTED.match(path, position)
+    if match is not None:
+        return (_MEMBER, _SINGLE_QUOTED_ESCAPE.sub(r"\1", match.group(1))), match.end()
+
+    match = _SLICE.match(path, position)
+    if match is not None and ":" in match.group():
+        start, stop, step = (
+            int(group) if group is not None else None for group in match.groups()
+        )
+        if step == 0:
+            raise QueryError("Slice step cannot be zero in %s" % path)
+        return (_SLICE_STEP, slice(start, stop, step)), match.end()
+    match = _INTEGER.match(path, position)
+    if match is not None:
+        return (_INDEX, int(match.group())), match.end()
+
+    raise QueryError("Invalid selector at position %d of %s" % (position, path))
+
+def _skipSpaces(path, position):
+    while position < len(path) and path[position] == " ":
+        position += 1
+    return position
@@ -0,0 +1,875 @@
+"""
+JSON Schema validation for JSON Wizard, without Qt
+
+compileSchema() turns a schema into a Schema once: its keywords become
+checker functions and the subschemas of a child are looked up by its key
+or position, so validating a document only runs what applies. Drafts 4
+to 2020-12 are understood, except for $dynamicRef, the unevaluated*
+keywords and format, which is not asserted. $ref may only point within
+the schema, e.g. "#/$defs/address".
+
+SchemaValidator validates the item tree of a document, built or not:
+entries that have no item yet are checked as the plain values their
+lazy source gives. Results are cached per container and subschema, and
+per lazy source for the entries without items, so that once the whole
+tree was validated (e.g. by JSONWorkers.ValidationWorker) only the
+containers on the way from an edit to the root are checked again. Tell
+the validator about edits with itemChanged(), itemsInserted() and
+itemsRemoved(), as QJsonModel does once given a validator.
+
+Errors are (item, pointer, message) triples. An error inside an entry
+that has no item is reported on its nearest built container, with the
+JSON Pointer from there, otherwise the pointer is empty.
+"""
+from JSONTree import QJsonTreeItem, toPython
+import json
+import math
+import operator
+import re
+
+# Values checked between two progress reports
+_PROGRESS_VALUES = 1 << 16
+
+# Classes of the plain values of each type of the "type" keyword,
+# integral floats are integers too
+_TYPE_CLASSES = {
+    "null": (type(None),),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+    "number": (int, float),
+    "string": (str,),
+    "integer": (int,),
+}
+
+# Returned by the checkers of the schemas that check nothing
+_NO_ERRORS = ()
+
+# Longest constant quoted in an error message
+_QUOTED_LENGTH = 40
+
+class SchemaError(ValueError):
+    """The schema itself is not valid"""
+
+def compileSchema(schema):
+    """Compile a JSON Schema, as loaded by json.load()
+
+    Arguments:
+        schema (dict or bool): The schema document
+
+    Returns:
+        Schema
+
+    Raises SchemaError if `schema` is not a valid schema.
+
+    """
+
+    compiler = _Compiler(schema)
+    compiled = compiler.compile(schema, "#")
+    compiler.finish()
+    return compiled
+
+def errorText(pointer, message):
+    """An error as shown to users"""
+    return "%s: %s" % (pointer, message) if pointer else message
+
+def _typeName(value):
+    if value is None:
+        return "null"
+    if value is True or value is False:
+        return "boolean"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "integer" if value.is_integer() else "number"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, list):
+        return "array"
+    return type(value).__name__
+
+def _canonical(value):
+    """Hashable form of a plain value, equal for equal JSON values
+
+    Booleans differ from 0 and 1 in JSON, integers and floats of the
+    same value do not.
+    """
+    if value is True or value is False:
+        return (bool, value)
+    if isinstance(value, (int, float)):
+        return (float, value)
+    if isinstance(value, dict):
+        return (dict, frozenset((key, _canonical(child)) for key, child in value.items()))
+    if isinstance(value, list):
+        return (list, tuple(_canonical(child) for child in value))
+    return (type(value), value)
+
+def _escape(token):
+    """`token` as it is written in a JSON Pointer"""
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+def _quote(value):
+    text = json.dumps(value)
+    return text if len(text) <= _QUOTED_LENGTH else text[:_QUOTED_LENGTH] + "…"
+
+class Schema(object):
+    """A compiled JSON Schema, see compileSchema()
+
+    `rejects` is set for the false schema, `empty` for the schemas that
+    check nothing. The other attributes hold the checker functions and
+    subschemas of the keywords, checkValue() puts them together for
+    plain values.
+    """
+    __slots__ = (
+        "rejects", "empty", "types", "classes", "integers", "anyChecks",
+        "stringChecks", "numberChecks", "valueChecks",
+        "objectChecks", "arrayChecks", "properties", "patternProperties",
+        "additionalProperties", "propertyNames", "dependentSchemas",
+        "prefixItems", "items", "contains", "minContains", "maxContains",
+        "allOf", "anyOf", "oneOf", "not_", "if_", "then", "else_",
+        "checksMembers", "checksItems", "applies", "checkValue",
+    )
+
+    def __init__(self):
+        self.rejects = False
+        self.empty = True
+        self.types = None
+        # Classes of the plain values of those types, and whether
+        # integral floats are allowed when int is but float is not
+        self.classes = None
+        self.integers = False
+        # f(value) -> message or None, on any scalar, strings and numbers
+        self.anyChecks = []
+        self.stringChecks = []
+        self.numberChecks = []
+        # f(value) -> message or None, on containers as plain values
+        self.valueChecks = []
+        # f(keys) -> message or None, on every key of an object
+        self.objectChecks = []
+        # f(count) -> message or None, on the length of an array
+        self.arrayChecks = []
+        self.properties = {}
+        self.patternProperties = []
+        self.additionalProperties = None
+        self.propertyNames = None
+        self.dependentSchemas = {}
+        self.prefixItems = []
+        self.items = None
+        self.contains = None
+        self.minContains = 1
+        self.maxContains = None
+        # Applied to the value itself, $ref included
+        self.allOf = []
+        self.anyOf = None
+        self.oneOf = None
+        self.not_ = None
+        self.if_ = None
+        self.then = None
+        self.else_ = None
+        # Whether the members of an object, or the items of an array,
+        # have subschemas
+        self.checksMembers = False
+        self.checksItems = False
+        # Whether there are subschemas for the value itself
+        self.applies = False
+        # f(value) -> errors of a plain value, see _valueChecker()
+        self.checkValue = None
+
+    def typeMessage(self, name):
+        """Message if a value of type `name` is not allowed, None if it is"""
+        types = self.types
+        if types is None or name in types or (name == "integer" and "number" in types):
+            return None
+        return "Expected %s, not %s" % (" or ".join(sorted(types)), name)
+
+    def memberSchemas(self, key):
+        """Subschemas of the member of an object at `key`"""
+        schemas = []
+        schema = self.properties.get(key)
+        if schema is not None:
+            schemas.append(schema)
+        for pattern, schema in self.patternProperties:
+            if pattern.search(key):
+                schemas.append(schema)
+        if not schemas and self.additionalProperties is not None:
+            schemas.append(self.additionalProperties)
+        return schemas
+
+    def itemSchema(self, index):
+        """Subschema of the item of an array at `index`, None if none"""
+        if index < len(self.prefixItems):
+            return self.prefixItems[index]
+        return self.items
+
+class _Compiler(object):
+    """Compiles the subschemas of a schema document, each once"""
+
+    def __init__(self, document):
+        self.document = document
+        # id() of a subschema -> (Schema, subschema), a $ref to a schema
+        # being compiled gets the Schema it is filling
+        self.compiled = {}
+
+    def compile(self, schema, location):
+        if schema is True or schema is False:
+            compiled = Schema()
+            compiled.rejects = not schema
+            compiled.empty = schema
+            compiled.checkValue = _valueChecker(compiled)
+            return compiled
+        if not isinstance(schema, dict):
+            raise SchemaError("%s: A schema must be an object or a boolean" % location)
+
+        known = self.compiled.get(id(schema))
+        if known is not None:
+            return known[0]
+        compiled = Schema()
+        self.compiled[id(schema)] = (compiled, schema)
+        self.fill(compiled, schema, location)
+
+        compiled.checksMembers = bool(
+            compiled.properties or compiled.patternProperties
+            or compiled.additionalProperties is not None or compiled.propertyNames is not None
+        )
+        compiled.checksItems = bool(compiled.prefixItems or compiled.items is not None or compiled.contains is not None)
+        compiled.applies = bool(
+            compiled.dependentSchemas or compiled.allOf or compiled.anyOf or compiled.oneOf
+            or compiled.not_ is not None or compiled.if_ is not None
+        )
+        # Subschemas reached through $ref may still be filled, they are
+        # in allOf and keep this one from being empty
+        compiled.empty = not (
+            compiled.types is not None or compiled.anyChecks or compiled.stringChecks
+            or compiled.numberChecks or compiled.valueChecks or compiled.objectChecks
+            or compiled.arrayChecks or compiled.checksMembers or compiled.checksItems
+            or compiled.applies
+        )
+        return compiled
+
+    def finish(self):
+        # Once every subschema is filled, the checkers look them up as they run
+        for compiled, _ in self.compiled.values():
+            compiled.checkValue = _valueChecker(compiled)
+
+    def fill(self, compiled, schema, location):
+        get = schema.get
+        if "$ref" in schema:
+            compiled.allOf.append(self.resolve(schema["$ref"], location + "/$ref"))
+
+        if "type" in schema:
+            types = schema["type"]
+            types = [types] if isinstance(types, str) else types
+            if not isinstance(types, list) or not all(name in _TYPE_CLASSES for name in types):
+                raise SchemaError("%s/type: Unknown type %s" % (location, _quote(schema["type"])))
+            compiled.types = frozenset(types)
+            compiled.classes = frozenset(cls for name in types for cls in _TYPE_CLASSES[name])
+            compiled.integers = "integer" in types and "number" not in types
+
+        if "enum" in schema:
+            if not isinstance(schema["enum"], list):
+                raise SchemaError("%s/enum: Expected an array" % location)
+            allowed = frozenset(_canonical(value) for value in schema["enum"])
+            check = lambda value: None if _canonical(value) in allowed else "Not one of the allowed values"
+            compiled.anyChecks.append(check)
+            compiled.valueChecks.append(check)
+        if "const" in schema:
+            const = _canonical(schema["const"])
+            message = "Not equal to %s" % _quote(schema["const"])
+            check = lambda value: None if _canonical(value) == const else message
+            compiled.anyChecks.append(check)
+            compiled.valueChecks.append(check)
+
+        # Numbers, draft 4 has booleans making minimum and maximum exclusive
+        minimum = get("minimum")
+        maximum = get("maximum")
+        exclusiveMinimum = get("exclusiveMinimum")
+        exclusiveMaximum = get("exclusiveMaximum")
+        if exclusiveMinimum is True or exclusiveMinimum is False:
+            minimum, exclusiveMinimum = (None, minimum) if exclusiveMinimum else (minimum, None)
+        if exclusiveMaximum is True or exclusiveMaximum is False:
+            maximum, exclusiveMaximum = (None, maximum) if exclusiveMaximum else (maximum, None)
+        limits = (
+            (minimum, "minimum", operator.lt, "Less than the minimum of %s"),
+            (maximum, "maximum", operator.gt, "Greater than the maximum of %s"),
+            (exclusiveMinimum, "exclusiveMinimum", operator.le, "Not greater than %s"),
+            (exclusiveMaximum, "exclusiveMaximum", operator.ge, "Not less than %s"),
+        )
+        for bound, keyword, exceeds, message in limits:
+            if bound is not None:
+                bound = self.number(bound, location + "/" + keyword)
+                compiled.numberChecks.append(_limit(exceeds, bound, message))
+        if "multipleOf" in schema:
+            divisor = self.number(schema["multipleOf"], location + "/multipleOf")
+            if divisor <= 0:
+                raise SchemaError("%s/multipleOf: Expected a number greater than 0" % location)
+            message = "Not a multiple of %s" % divisor
+            compiled.numberChecks.append(lambda value: None if _isMultiple(value, divisor) else message)
+
+        # Strings, lengths are in code points
+        if "minLength" in schema:
+            bound = self.number(schema["minLength"], location + "/minLength", count=True)
+            compiled.stringChecks.append(_limit(operator.lt, bound, "Shorter than %d characters", len))
+        if "maxLength" in schema:
+            bound = self.number(schema["maxLength"], location + "/maxLength", count=True)
+            compiled.stringChecks.append(_limit(operator.gt, bound, "Longer than %d characters", len))
+        if "pattern" in schema:
+            pattern = self.regex(schema["pattern"], location + "/pattern")
+            message = "Does not match %s" % pattern.pattern
+            compiled.stringChecks.append(lambda value: None if pattern.search(value) else message)
+
+        # Objects, dependencies was split in two by 2019-09
+        if "required" in schema:
+            required = schema["required"]
+            if not isinstance(required, list) or not all(isinstance(key, str) for key in required):
+                raise SchemaError("%s/required: Expected an array of strings" % location)
+            compiled.objectChecks.append(_requiredCheck(required))
+        if "minProperties" in schema:
+            bound = self.number(schema["minProperties"], location + "/minProperties", count=True)
+            compiled.objectChecks.append(_limit(operator.lt, bound, "Fewer than %d keys", len))
+        if "maxProperties" in schema:
+            bound = self.number(schema["maxProperties"], location + "/maxProperties", count=True)
+            compiled.objectChecks.append(_limit(operator.gt, bound, "More than %d keys", len))
+        dependencies = dict(get("dependencies", {}))
+        dependencies.update(get("dependentRequired", {}))
+        dependencies.update(get("dependentSchemas", {}))
+        for key, dependency in dependencies.items():
+            if isinstance(dependency, list):
+                compiled.objectChecks.append(_dependentCheck(key, dependency))
+            else:
+                compiled.dependentSchemas[key] = self.compile(dependency, "%s/dependentSchemas/%s" % (location, _escape(key)))
+        for key, child in get("properties", {}).items():
+            compiled.properties[key] = self.compile(child, "%s/properties/%s" % (location, _escape(key)))
+        for expression, child in get("patternProperties", {}).items():
+            compiled.patternProperties.append((
+                self.regex(expression, location + "/patternProperties"),
+                self.compile(child, "%s/patternProperties/%s" % (location, _escape(expression))),
+            ))
+        if "additionalProperties" in schema:
+            compiled.additionalProperties = self.compile(schema["additionalProperties"], location + "/additionalProperties")
+        if "propertyNames" in schema:
+            compiled.propertyNames = self.compile(schema["propertyNames"], location + "/propertyNames")
+
+        # Arrays, items was an array of schemas before prefixItems
+        if "prefixItems" in schema:
+            compiled.prefixItems = self.subschemas(schema, "prefixItems", location)
+        items = get("items")
+        if isinstance(items, list):
+            compiled.prefixItems = self.subschemas(schema, "items", location)
+            if "additionalItems" in schema:
+                compiled.items = self.compile(schema["additionalItems"], location + "/additionalItems")
+        elif items is not None:
+            compiled.items = self.compile(items, location + "/items")
+        if "minItems" in schema:
+            bound = self.number(schema["minItems"], location + "/minItems", count=True)
+            compiled.arrayChecks.append(_limit(operator.lt, bound, "Fewer than %d items"))
+        if "maxItems" in schema:
+            bound = self.number(schema["maxItems"], location + "/maxItems", count=True)
+            compiled.arrayChecks.append(_limit(operator.gt, bound, "More than %d items"))
+        if get("uniqueItems") is True:
+            compiled.valueChecks.append(_uniqueCheck)
+        if "contains" in schema:
+            compiled.contains = self.compile(schema["contains"], location + "/contains")
+            if "minContains" in schema:
+                compiled.minContains = self.number(schema["minContains"], location + "/minContains", count=True)
+            if "maxContains" in schema:
+                compiled.maxContains = self.number(schema["maxContains"], location + "/maxContains", count=True)
+
+        # Applicators
+        if "allOf" in schema:
+            compiled.allOf.extend(self.subschemas(schema, "allOf", location))
+        if "anyOf" in schema:
+            compiled.anyOf = self.subschemas(schema, "anyOf", location)
+        if "oneOf" in schema:
+            compiled.oneOf = self.subschemas(schema, "oneOf", location)
+        if "not" in schema:
+            compiled.not_ = self.compile(schema["not"], location + "/not")
+        if "if" in schema:
+            compiled.if_ = self.compile(schema["if"], location + "/if")
+            if "then" in schema:
+                compiled.then = self.compile(schema["then"], location + "/then")
+            if "else" in schema:
+                compiled.else_ = self.compile(schema["else"], location + "/else")
+
+    def resolve(self, reference, location):
+        if not isinstance(reference, str) or not reference.startswith("#"):
+            raise SchemaError("%s: Only references within the schema are supported, not %s" % (location, _quote(reference)))
+        target = self.document
+        for token in reference[1:].split("/")[1:]:
+            token = token.replace("~1", "/").replace("~0", "~")
+            try:
+                target = target[int(token)] if isinstance(target, list) else target[token]
+            except (KeyError, IndexError, ValueError, TypeError):
+                raise SchemaError("%s: Unresolved reference %s" % (location, _quote(reference)))
+        return self.compile(target, reference)
+
+    def subschemas(self, schema, keyword, location):
+        value = schema[keyword]
+        if not isinstance(value, list) or not value:
+            raise SchemaError("%s/%s: Expected a non-empty array of schemas" % (location, keyword))
+        return [self.compile(child, "%s/%s/%d" % (location, keyword, n)) for n, child in enumerate(value)]
+
+    def number(self, value, location, count=False):
+        if value is True or value is False or not isinstance(value, (int, float)):
+            raise SchemaError("%s: Expected a number" % location)
+        if count:
+            if value < 0 or value != int(value):
+                raise SchemaError("%s: Expected a non-negative integer" % location)
+            return int(value)
+        return value
+
+    def regex(self, expression, location):
+        try:
+            return re.compile(expression)
+        except (re.error, TypeError) as error:
+            raise SchemaError("%s: Invalid pattern %s: %s" % (location, _quote(expression), error))
+
+def _limit(exceeds, bound, message, measure=None):
+    """Check of a value, or of `measure` of it, against `bound`"""
+    message = message % bound
+    if measure is None:
+        return lambda value: message if exceeds(value, bound) else None
+    return lambda value: message if exceeds(measure(value), bound) else None
+
+def _isMultiple(value, divisor):
+    if isinstance(value, int) and isinstance(divisor, int):
+        return value % divisor == 0
+    quotient = value / divisor
+    return math.isfinite(quotient) and abs(quotient - round(quotient)) < 1e-9
+
+def _requiredCheck(required):
+    def check(keys):
+        present = set(keys)
+        missing = [key for key in required if key not in present]
+        if not missing:
+            return None
+        return "Missing %s %s" % ("keys" if len(missing) > 1 else "key", ", ".join(map(_quote, missing)))
+    return check
+
+def _dependentCheck(key, required):
+    def check(keys):
+        present = set(keys)
+        if key not in present:
+            return None
+        missing = [other for other in required if other not in present]
+        if not missing:
+            return None
+        return "Key %s requires %s" % (_quote(key), ", ".join(map(_quote, missing)))
+    return check
+
+def _uniqueCheck(value):
+    if not isinstance(value, list):
+        return None
+    seen = set()
+    for row, child in enumerate(value):
+        canonical = _canonical(child)
+        if canonical in seen:
+            return "Item %d is a duplicate" % row
+        seen.add(canonical)
+    return None
+
+def _valueChecker(schema):
+    """Checker function of plain values against `schema`
+
+    It returns the errors of a value and of its children as
+    (None, pointer, message) triples, the value has no item.
+    """
+    if schema.rejects:
+        return lambda value: [(None, "", "Not allowed by the schema")]
+    if schema.empty:
+        return lambda value: _NO_ERRORS
+
+    classes = schema.classes
+    integers = schema.integers
+    anyChecks = tuple(schema.anyChecks)
+    stringChecks = tuple(schema.stringChecks)
+    numberChecks = tuple(schema.numberChecks)
+    objects = bool(schema.checksMembers or schema.objectChecks or schema.valueChecks)
+    arrays = bool(schema.checksItems or schema.arrayChecks or schema.valueChecks)
+    applies = schema.applies
+
+    def check(value):
+        errors = []
+        cls = value.__class__
+        if classes is not None and cls not in classes and not (integers and cls is float and value.is_integer()):
+            errors.append((None, "", schema.typeMessage(_typeName(value))))
+        if cls is dict:
+            if objects:
+                _checkObject(schema, value, errors)
+        elif cls is list:
+            if arrays:
+                _checkArray(schema, value, errors)
+        else:
+            for scalarCheck in anyChecks:
+                message = scalarCheck(value)
+                if message is not None:
+                    errors.append((None, "", message))
+            if cls is str:
+                for scalarCheck in stringChecks:
+                    message = scalarCheck(value)
+                    if message is not None:
+                        errors.append((None, "", message))
+            elif cls is int or cls is float:
+                for scalarCheck in numberChecks:
+                    message = scalarCheck(value)
+                    if message is not None:
+                        errors.append((None, "", message))
+        if applies:
+            _checkApplicators(schema, value, _checkPlain, errors)
+        return errors
+
+    return check
+
+def _checkPlain(value, schema):
+    return schema.checkValue(value)
+
+def _checkObject(schema, value, errors):
+    """Keywords of an object on a plain dict"""
+    if schema.checksMembers:
+        if schema.propertyNames is None and not schema.patternProperties:
+            # One subschema per member at most, looked up inline
+            properties = schema.properties
+            additional = schema.additionalProperties
+            for key, child in value.items():
+                subschema = properties.get(key, additional)
+                if subschema is None or subschema.empty:
+                    continue
+                if subschema.rejects and subschema is additional:
+                    errors.append((None, "/" + _escape(key), "Key not allowed"))
+                    continue
+                childErrors = subschema.checkValue(child)
+                if childErrors:
+                    errors.extend(_relocate(childErrors, key))
+        else:
+            for key, child in value.items():
+                childErrors = _memberErrors(schema, key, child, _checkPlain)
+                if childErrors:
+                    errors.extend(_relocate(childErrors, key))
+    if schema.objectChecks or schema.valueChecks:
+        _checkOwn(schema, True, value, len(value), 0, lambda: value, errors)
+
+def _checkArray(schema, value, errors):
+    """Keywords of an array on a plain list"""
+    matches = 0
+    if schema.checksItems:
+        prefixItems = schema.prefixItems
+        items = schema.items
+        contains = schema.contains
+        for index, child in enumerate(value):
+            subschema = prefixItems[index] if index < len(prefixItems) else items
+            if subschema is not None:
+                childErrors = subschema.checkValue(child)
+                if childErrors:
+                    errors.extend(_relocate(childErrors, index))
+            if contains is not None and not contains.checkValue(child):
+                matches += 1
+    if schema.arrayChecks or schema.contains is not None or schema.valueChecks:
+        _checkOwn(schema, False, None, len(value), matches, lambda: value, errors)
+
+def _memberErrors(schema, key, child, check):
+    """Errors of the member of an object at `key`, checked with `check`"""
+    errors = []
+    if schema.propertyNames is not None and schema.propertyNames.checkValue(key):
+        errors.append((None, "", "Key not allowed by the propertyNames schema"))
+    for subschema in schema.memberSchemas(key):
+        if subschema.rejects and subschema is schema.additionalProperties:
+            errors.append((None, "", "Key not allowed"))
+        elif not subschema.empty:
+            errors.extend(check(child, subschema))
+    return errors
+
+def _checkOwn(schema, isObject, keys, count, matches, value, errors):
+    """Keywords on the keys or length of a container, and on its whole value
+
+    `matches` is the number of items valid against "contains", `value`
+    gives the plain value, only asked for if a keyword needs it.
+    """
+    if isObject:
+        for ownCheck in schema.objectChecks:
+            message = ownCheck(keys)
+            if message is not None:
+                errors.append((None, "", message))
+    else:
+        for ownCheck in schema.arrayChecks:
+            message = ownCheck(count)
+            if message is not None:
+                errors.append((None, "", message))
+        if schema.contains is not None:
+            if matches < schema.minContains:
+                errors.append((None, "", "Fewer than %d items valid against the contains schema" % schema.minContains))
+            elif schema.maxContains is not None and matches > schema.maxContains:
+                errors.append((None, "", "More than %d items valid against the contains schema" % schema.maxContains))
+    if schema.valueChecks:
+        plain = value()
+        for ownCheck in schema.valueChecks:
+            message = ownCheck(plain)
+            if message is not None:
+                errors.append((None, "", message))
+
+def _checkApplicators(schema, node, check, errors):
+    """allOf, anyOf, oneOf, not, if and dependentSchemas on `node` itself
+
+    Subschemas are applied with `check`, to an item or a plain value.
+    """
+    for subschema in schema.allOf:
+        errors.extend(check(node, subschema))
+    if schema.anyOf is not None:
+        if all(check(node, subschema) for subschema in schema.anyOf):
+            errors.append((None, "", "Not valid against any of the anyOf schemas"))
+    if schema.oneOf is not None:
+        valid = sum(1 for subschema in schema.oneOf if not check(node, subschema))
+        if valid != 1:
+            errors.append((None, "", "Valid against %d of the oneOf schemas, not exactly one" % valid))
+    if schema.not_ is not None and not check(node, schema.not_):
+        errors.append((None, "", "Valid against the not schema"))
+    if schema.if_ is not None:
+        branch = schema.else_ if check(node, schema.if_) else schema.then
+        if branch is not None:
+            errors.extend(check(node, branch))
+    if schema.dependentSchemas:
+        keys = _keysOf(node)
+        if keys is not None:
+            for key, subschema in schema.dependentSchemas.items():
+                if key in keys:
+                    errors.extend(check(node, subschema))
+
+def _keysOf(node):
+    """Keys of an object, item or plain value, None for other values"""
+    if isinstance(node, dict):
+        return node.keys()
+    if isinstance(node, QJsonTreeItem) and node.type is dict:
+        keys = {child.key for child in node._children}
+        keys.update(key for key, _ in node.pendingEntries())
+        return keys
+    return None
+
+def _relocate(errors, token):
+    """Errors of the child at `token` as seen from its parent
+
+    Errors without an item get the token in front of their pointer, the
+    others stay on their item.
+    """
+    prefix = "/" + _escape(token)
+    return [
+        (owner, pointer, message) if owner is not None else (None, prefix + pointer, message)
+        for owner, pointer, message in errors
+    ]
+
+class _Pending(object):
+    """Results of the entries of a lazy container that have no item yet
+
+    Entries are numbered by their position in the lazy source, from
+    what it had `fetched` when they were checked. Fetches only turn the
+    first of them into items, the rest stay as they were.
+    """
+    __slots__ = ("lazy", "fetched", "errors", "keys", "matches")
+
+    def __init__(self, lazy):
+        self.lazy = lazy
+        self.fetched = lazy.fetched
+        # (entry, pointer within the entry, message) triples
+        self.errors = []
+        # Keys of the entries of an object
+        self.keys = []
+        # Entries of an array valid against its "contains" schema
+        self.matches = []
+
+class SchemaValidator(object):
+    """Validates item trees against a compiled Schema, see the module
+
+    The tree must not change while validate() runs, and the validator
+    must be told about every edit made since its last run.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        # Container item -> {Schema: errors of its subtree}
+        self._results = {}
+        # Container item -> {Schema: _Pending}
+        self._pending = {}
+        self._checked = 0
+        self._progress = None
+        self._checkCancelled = None
+
+    def clear(self):
+        """Forget every result, e.g. once the tree was replaced"""
+        self._results.clear()
+        self._pending.clear()
+
+    def validate(self, rootItem, progress=None, checkCancelled=None):
+        """Errors of the document of `rootItem`, built or not
+
+        Only what changed since the last run is checked again. Very
+        deeply nested documents fail with a ValueError. Progress is
+        reported in containers and entries checked.
+
+        Returns:
+            list of (QJsonTreeItem, pointer, message) triples, in
+            document order
+
+        """
+
+        self._checked = 0
+        self._progress = progress
+        self._checkCancelled = checkCancelled
+        try:
+            return self._checkItem(rootItem, self.schema)
+        except RecursionError:
+            raise ValueError("The document is nested too deeply to be validated")
+        finally:
+            self._progress = self._checkCancelled = None
+
+    # Edits
+
+    def itemChanged(self, item):
+        """Take over a new key or value of `item`"""
+        self._invalidate(item)
+
+    def itemsInserted(self, parentItem):
+        """Take over new children of `parentItem`, built from its lazy source or not"""
+        self._invalidate(parentItem)
+
+    def itemsRemoved(self, parentItem, items):
+        """Take over the removal of `items`, children of `parentItem`
+
+        Their results are dropped, a subtree put back by undo is checked
+        again.
+        """
+        self._invalidate(parentItem)
+        stack = [item for item in items if item._children]
+        while stack:
+            item = stack.pop()
+            self._results.pop(item, None)
+            self._pending.pop(item, None)
+            stack.extend(child for child in item._children if child._children)
+
+    def _invalidate(self, item):
+        # The lazy entries stay as they are
+        results = self._results
+        while item is not None:
+            results.pop(item, None)
+            item = item._parent
+
+    # Checking
+
+    def _count(self):
+        self._checked += 1
+        if self._checked % _PROGRESS_VALUES == 0:
+            if self._checkCancelled is not None:
+                self._checkCancelled()
+            if self._progress is not None:
+                self._progress(self._checked)
+
+    def _check(self, node, schema):
+        """Errors of `node`, an item or a plain value, against `schema`"""
+        if isinstance(node, QJsonTreeItem):
+            return self._checkItem(node, schema)
+        return schema.checkValue(node)
+
+    def _checkItem(self, item, schema):
+        if schema.empty:
+            return _NO_ERRORS
+        if item.type is not dict and item.type is not list:
+            return [(item, pointer, message) for _, pointer, message in schema.checkValue(item.value)]
+
+        results = self._results.get(item)
+        if results is None:
+            results = self._results[item] = {}
+        else:
+            errors = results.get(schema)
+            if errors is not None:
+                return errors
+
+        self._count()
+        errors = []
+        if schema.rejects:
+            errors.append((None, "", "Not allowed by the schema"))
+        else:
+            isObject = item.type is dict
+            message = schema.typeMessage("object" if isObject else "array")
+            if message is not None:
+                errors.append((None, "", message))
+            self._checkContainer(item, schema, isObject, errors)
+            if schema.applies:
+                _checkApplicators(schema, item, self._check, errors)
+        errors = [(item if owner is None else owner, pointer, message) for owner, pointer, message in errors]
+        results[schema] = errors
+        return errors
+
+    def _checkContainer(self, item, schema, isObject, errors):
+        children = item._children
+        matches = 0
+        if schema.checksMembers if isObject else schema.checksItems:
+            for row, child in enumerate(children):
+                token = child.key if isObject else row
+                childErrors, matched = self._checkEntry(schema, isObject, token, child)
+                if childErrors:
+                    errors.extend(_relocate(childErrors, token))
+                matches += matched
+
+        keys = [child.key for child in children] if isObject else None
+        count = len(children)
+        lazy = item.lazySource()
+        if lazy is not None and lazy.fetched < len(lazy):
+            count += len(lazy) - lazy.fetched
+            # Arrays only need to be read for their items, objects for their keys too
+            if (schema.checksMembers or schema.objectChecks) if isObject else schema.checksItems:
+                pending = self._pendingResult(item, lazy, schema, isObject)
+                fetched = lazy.fetched
+                # The entries of an array come after the built children
+                shift = len(children) - fetched
+                for entry, pointer, message in pending.errors:
+                    if entry >= fetched:
+                        token = pending.keys[entry - pending.fetched] if isObject else entry + shift
+                        errors.append((None, "/" + _escape(token) + pointer, message))
+                matches += sum(1 for entry in pending.matches if entry >= fetched)
+                if isObject:
+                    keys.extend(pending.keys[fetched - pending.fetched:])
+
+        _checkOwn(schema, isObject, keys, count, matches, lambda: toPython(item), errors)
+
+    def _pendingResult(self, item, lazy, schema, isObject):
+        """_Pending of the lazy entries of `item`, read once per source"""
+        results = self._pending.setdefault(item, {})
+        pending = results.get(schema)
+        if pending is not None and pending.lazy is lazy and pending.fetched <= lazy.fetched:
+            return pending
+
+        pending = _Pending(lazy)
+        entry = lazy.fetched
+        row = item.childCount()
+        for key, value in item.pendingEntries():
+            self._count()
+            childErrors, matched = self._checkEntry(schema, isObject, key if isObject else row, value)
+            if childErrors:
+                pending.errors.extend((entry, pointer, message) for _, pointer, message in childErrors)
+            if matched:
+                pending.matches.append(entry)
+            if isObject:
+                pending.keys.append(key)
+            entry += 1
+            row += 1
+        # Only once complete, the worker may be cancelled on the way
+        results[schema] = pending
+        return pending
+
+    def _checkEntry(self, schema, isObject, token, child):
+        """Errors of a child at `token`, key or row, and whether it matches "contains"
+
+        Errors on a plain value have no item, those on an item have it.
+        """
+        matched = False
+        if isObject:
+            errors = _memberErrors(schema, token, child, self._check)
+        else:
+            errors = []
+            subschema = schema.itemSchema(token)
+            if subschema is not None:
+                errors.extend(self._check(child, subschema))
+            if schema.contains is not None:
+                matched = not self._check(child, schema.contains)
+
+        if errors and isinstance(child, QJsonTreeItem):
+            errors = [(child if owner is None else owner, pointer, message) for owner, pointer, message in errors]
+        return errors, matched
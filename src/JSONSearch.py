@@ -0,0 +1,734 @@
+"""
+Key and value search for JSON Wizard
+
+SearchIndex holds the text of every key and scalar value of a document,
+whether the tree has items for it or not, so that finding the next match
+does not mean walking the tree in Python. Values are matched as they are
+shown, case-insensitively and anywhere in the text.
+
+Nodes of the document are numbered in document order, the root is 0.
+Their text is kept lowercased in chunks of NODES_PER_CHUNK nodes, each a
+single string searched with str.find(). That is a scan at C speed, the
+price of a Python dict of tokens would be several times the size of the
+document in memory.
+
+The index is built on a worker thread, see JSONWorkers.SearchIndexWorker,
+after which QJsonModel keeps it up to date through itemChanged(),
+itemsInserted() and rowsRemoved().
+
+SearchFilter keeps the nodes whose subtree holds a match of a text, for
+JSONProxy to hide the others. It follows the changes of its index along
+the paths they touch rather than searching again.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from JSONTree import childEntries, isContainer, isItem
+import json
+import re
+
+# Nodes per chunk of text, a power of two
+NODES_PER_CHUNK = 1 << 16
+_CHUNK_SHIFT = NODES_PER_CHUNK.bit_length() - 1
+
+# A JSON string, as in JSONIndex
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+
+# Between the key and the value of a node, and after the value. Neither
+# can be searched for, so matches never span two nodes.
+_KEY_END = "\x1f"
+_NODE_END = "\x1e"
+_SEPARATORS = re.compile("[\x1e\x1f]")
+
+# Nodes processed between two progress reports
+_PROGRESS_NODES = 1 << 16
+# Results of the last texts a SearchFilter was set to, for backspace
+_FILTER_CACHE_SIZE = 8
+
+def valueText(value):
+    """`value` as it is searched, containers have no text"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return ""
+    return json.dumps(value)
+
+def _nodeText(key, value):
+    """Text of a node, before it is lowercased by its _Chunk"""
+    key = "" if key is None else key if isinstance(key, str) else str(key)
+    return _SEPARATORS.sub(" ", key) + _KEY_END + _SEPARATORS.sub(" ", value) + _NODE_END
+
+class _Chunk(object):
+    __slots__ = ("text", "starts")
+
+    def __init__(self, texts):
+        text = "".join(texts)
+        # Lowercasing may change the length of non-ASCII text only
+        if text.isascii():
+            text = text.lower()
+        else:
+            texts = [text.lower() for text in texts]
+            text = "".join(texts)
+        self.starts = array("i", accumulate(map(len, texts), initial=0))
+        self.text = text
+
+    def texts(self):
+        starts = self.starts
+        text = self.text
+        return [text[starts[n]:starts[n + 1]] for n in range(len(starts) - 1)]
+
+class SearchIndex(object):
+    """Text and structure of a document, for find next/previous
+
+    Build it with fromTree() or fromDocument().
+    """
+
+    def __init__(self):
+        # Parent of every node, -1 for the root
+        self._parents = array("i")
+        # Children of containers that did not change since the index was
+        # built: childIds[firstChild[n]:firstChild[n] + counts[n]]
+        self._firstChild = array("i")
+        self._counts = array("i")
+        self._childIds = array("i")
+        # Children of containers that changed or were added later, as
+        # lists of node numbers in row order
+        self._order = {}
+        # 0 once a node is removed
+        self._alive = bytearray()
+        self._chunks = []
+        # Texts of the last chunk while it is being filled
+        self._tail = []
+        # Bumped on every change
+        self.revision = 0
+        # SearchFilters and JSONDiff objects following the index, told
+        # about every change
+        self._listeners = []
+
+    def __len__(self):
+        return len(self._parents)
+
+    def memorySize(self):
+        """Approximate bytes held by the index"""
+        size = len(self._alive)
+        for values in (self._parents, self._firstChild, self._counts, self._childIds):
+            size += len(values) * values.itemsize
+        for chunk in self._chunks:
+            size += len(chunk.text) + len(chunk.starts) * chunk.starts.itemsize
+        return size
+
+    # Building
+
+    @classmethod
+    def fromTree(cls, rootItem, progress=None, checkCancelled=None):
+        """Index the document of `rootItem`, built or not
+
+        The tree is read as it is, it must not change until this returns.
+        """
+
+        index = cls()
+        # (parent node, key, item or plain value), next one last
+        stack = [(-1, None, rootItem)]
+        while stack:
+            parent, key, entry = stack.pop()
+            node = index._addNode(parent, key, entry)
+            if node % _PROGRESS_NODES == 0:
+                index._report(node, progress, checkCancelled)
+            for childKey, child in reversed(childEntries(entry)):
+                stack.append((node, childKey, child))
+
+        index._finish()
+        return index
+
+    @classmethod
+    def fromDocument(cls, document, progress=None, checkCancelled=None):
+        """Index a JSONIndex.IndexedDocument from its StructuralIndex
+
+        The items of the tree are not read, but the tree must not have
+        changed since the document was loaded.
+        """
+
+        structure = document.index
+        data = document.data
+        starts = structure.starts
+        ends = structure.ends
+        keys = structure.keys
+        counts = structure.counts
+
+        nexts = structure.nexts
+
+        index = cls()
+        parents = index._parents
+        chunks = index._chunks
+        texts = []
+        # Raw key -> text, keys repeat a lot
+        keyTexts = {b"": ""}
+        # (node, number of the node after its subtree) of open containers
+        stack = []
+        for node in range(len(structure)):
+            while stack and stack[-1][1] <= node:
+                stack.pop()
+            if node % _PROGRESS_NODES == 0:
+                index._report(node, progress, checkCancelled)
+            parents.append(stack[-1][0] if stack else -1)
+
+            rawKey = b""
+            if keys[node] >= 0:
+                rawKey = _STRING.match(data, keys[node]).group()
+            key = keyTexts.get(rawKey)
+            if key is None:
+                key = keyTexts[rawKey] = _decodeText(rawKey)
+
+            if counts[node] >= 0:
+                value = ""
+                stack.append((node, nexts[node]))
+            else:
+                value = _decodeText(data[starts[node]:ends[node]])
+
+            texts.append(key + _KEY_END + value + _NODE_END)
+            if len(texts) == NODES_PER_CHUNK:
+                chunks.append(_Chunk(texts))
+                texts = []
+
+        index._tail = texts
+        index._alive = bytearray(b"\x01") * len(parents)
+        index._finish(counts)
+        return index
+
+    def _addNode(self, parent, key, entry):
+        node = len(self._parents)
+        self._parents.append(parent)
+        if isItem(entry):
+            value = "" if isContainer(entry) else entry.value
+        else:
+            value = entry
+        self._addText(key, valueText(value))
+        return node
+
+    def _addText(self, key, value):
+        self._tail.append(_nodeText(key, value))
+        self._alive.append(1)
+        if len(self._tail) == NODES_PER_CHUNK:
+            self._chunks.append(_Chunk(self._tail))
+            self._tail = []
+
+    def _report(self, node, progress, checkCancelled):
+        if checkCancelled is not None:
+            checkCancelled()
+        if progress is not None:
+            progress(node)
+
+    def _finish(self, counts=None):
+        """Lay out the children of every node from the parents"""
+        parents = self._parents
+        size = len(parents)
+        if counts is None:
+            counts = array("i", bytes(4 * size))
+            for node in range(1, size):
+                counts[parents[node]] += 1
+        else:
+            counts = array("i", [count if count > 0 else 0 for count in counts])
+
+        firstChild = array("i", bytes(4 * size))
+        total = 0
+        for node in range(size):
+            firstChild[node] = total
+            total += counts[node]
+
+        # Children are met in document order, i.e. in row order
+        childIds = array("i", bytes(4 * total))
+        cursors = array("i", firstChild)
+        for node in range(1, size):
+            parent = parents[node]
+            childIds[cursors[parent]] = node
+            cursors[parent] += 1
+
+        self._firstChild = firstChild
+        self._counts = counts
+        self._childIds = childIds
+        self._flushTail()
+
+    def _flushTail(self):
+        if self._tail:
+            self._chunks.append(_Chunk(self._tail))
+            self._tail = []
+
+    # Structure
+
+    def _childAt(self, node, row):
+        order = self._order.get(node)
+        if order is not None:
+            return order[row]
+        if row >= self._counts[node]:
+            raise IndexError(row)
+        return self._childIds[self._firstChild[node] + row]
+
+    def _children(self, node):
+        order = self._order.get(node)
+        if order is not None:
+            return order
+        if node >= len(self._counts):
+            return []
+        first = self._firstChild[node]
+        return self._childIds[first:first + self._counts[node]]
+
+    def _editableChildren(self, node):
+        order = self._order.get(node)
+        if order is None:
+            order = self._order[node] = list(self._children(node))
+        return order
+
+    def _rowOf(self, node):
+        parent = self._parents[node]
+        order = self._order.get(parent)
+        if order is not None:
+            return order.index(node)
+        first = self._firstChild[parent]
+        return bisect_left(self._childIds, node, first, first + self._counts[parent]) - first
+
+    def nodeForItem(self, item):
+        """Number of the node of `item`, None if it is not indexed"""
+        rows = []
+        while item.parent() is not None:
+            rows.append(item.row())
+            item = item.parent()
+
+        node = 0
+        try:
+            for row in reversed(rows):
+                node = self._childAt(node, row)
+        except IndexError:
+            return None
+        return node
+
+    def childNodes(self, item):
+        """Nodes of the children of `item` in row order, built or not
+
+        Returns None if `item` is not indexed.
+        """
+        node = self.nodeForItem(item)
+        return None if node is None else self._children(node)
+
+    def rowPath(self, node):
+        """Rows from the root down to `node`, see QJsonModel.indexForRowPath()"""
+        rows = []
+        while self._parents[node] >= 0:
+            rows.append(self._rowOf(node))
+            node = self._parents[node]
+        rows.reverse()
+        return rows
+
+    # Searching
+
+    def findNext(self, text, after=None, keys=True, values=True):
+        """First node after node `after` whose key or value contains `text`
+
+        The search wraps around at the end of the document. Returns None
+        if nothing matches.
+        """
+        start = 0 if after is None else after + 1
+        for first, last in ((start, len(self)), (0, start)):
+            node = self._scan(text.lower(), first, last, keys, values, False)
+            if node is not None:
+                return node
+        return None
+
+    def findPrevious(self, text, before=None, keys=True, values=True):
+        """Like findNext(), backwards from node `before`"""
+        end = len(self) if before is None else before
+        for first, last in ((0, end), (end, len(self))):
+            node = self._scan(text.lower(), first, last, keys, values, True)
+            if node is not None:
+                return node
+        return None
+
+    def findAll(self, text, limit=None, keys=True, values=True):
+        """Numbers of the matching nodes in document order"""
+        return self._findAll(text.lower(), 0, len(self), limit, keys, values)
+
+    def _findAll(self, text, first, last, limit=None, keys=True, values=True):
+        found = []
+        if not (keys and values):
+            node = first - 1
+            while limit is None or len(found) < limit:
+                node = self._scan(text, node + 1, last, keys, values, False)
+                if node is None:
+                    break
+                found.append(node)
+            return found
+
+        # Any match will do, on to the next node after one
+        if not text or _SEPARATORS.search(text) or first >= last:
+            return found
+        self._flushTail()
+        aliveFlags = self._alive
+        for number in range(first >> _CHUNK_SHIFT, ((last - 1) >> _CHUNK_SHIFT) + 1):
+            chunk = self._chunks[number]
+            starts = chunk.starts
+            find = chunk.text.find
+            base = number << _CHUNK_SHIFT
+            high = starts[min(last - base, len(starts) - 1)]
+            pos = find(text, starts[max(first - base, 0)], high)
+            while pos >= 0:
+                local = bisect_right(starts, pos) - 1
+                if aliveFlags[base + local]:
+                    found.append(base + local)
+                    if len(found) == limit:
+                        return found
+                pos = find(text, starts[local + 1], high)
+        return found
+
+    def _containing(self, text, nodes):
+        """Those of `nodes` that are alive and whose text contains `text`"""
+        if _SEPARATORS.search(text):
+            return []
+        self._flushTail()
+        chunks = self._chunks
+        aliveFlags = self._alive
+        mask = NODES_PER_CHUNK - 1
+        found = []
+        for node in nodes:
+            if aliveFlags[node]:
+                chunk = chunks[node >> _CHUNK_SHIFT]
+                local = node & mask
+                if chunk.text.find(text, chunk.starts[local], chunk.starts[local + 1]) >= 0:
+                    found.append(node)
+        return found
+
+    def _scan(self, text, first, last, keys, values, backwards):
+        if not text or _SEPARATORS.search(text) or first >= last:
+            return None
+        self._flushTail()
+
+        chunks = range(first >> _CHUNK_SHIFT, ((last - 1) >> _CHUNK_SHIFT) + 1)
+        for number in (reversed(chunks) if backwards else chunks):
+            chunk = self._chunks[number]
+            base = number << _CHUNK_SHIFT
+            low = chunk.starts[max(first - base, 0)]
+            high = chunk.starts[min(last - base, len(chunk.starts) - 1)]
+            find = chunk.text.rfind if backwards else chunk.text.find
+            while low < high:
+                pos = find(text, low, high)
+                if pos < 0:
+                    break
+                local = bisect_right(chunk.starts, pos) - 1
+                node = base + local
+                keyEnd = chunk.text.find(_KEY_END, chunk.starts[local])
+                inKey = pos < keyEnd
+                if self._alive[node] and (keys if inKey else values):
+                    return node
+                # Go on after or before this match
+                if backwards:
+                    high = pos + len(text) - 1
+                else:
+                    low = pos + 1
+        return None
+
+    # Maintenance
+
+    def _setText(self, node, key, value):
+        self._flushTail()
+        number = node >> _CHUNK_SHIFT
+        texts = self._chunks[number].texts()
+        texts[node & (NODES_PER_CHUNK - 1)] = _nodeText(key, value)
+        self._chunks[number] = _Chunk(texts)
+
+    def itemChanged(self, item):
+        """Take over a new key or value of `item`"""
+        node = self.nodeForItem(item)
+        if node is None:
+            return
+        key = item.key if item.parent().type is dict else None
+        value = item.value if item.type is not dict and item.type is not list else ""
+        self._setText(node, key, valueText(value))
+        self.revision += 1
+        for listener in self._listeners:
+            listener._nodeChanged(node, item)
+
+    def itemsInserted(self, parentItem, row, items):
+        """Index `items`, inserted into `parentItem` before `row`"""
+        parent = self.nodeForItem(parentItem)
+        if parent is None:
+            return
+
+        # Last chunk is filled again, as a tail
+        if self._chunks and len(self._chunks[-1].starts) - 1 < NODES_PER_CHUNK:
+            self._tail = self._chunks.pop().texts()
+
+        isObject = parentItem.type is dict
+        first = len(self)
+        top = []
+        # As in fromTree(), with the list the node goes to in its parent
+        stack = [(parent, item.key if isObject else None, item, top) for item in reversed(items)]
+        while stack:
+            parentNode, key, entry, siblings = stack.pop()
+            node = self._addNode(parentNode, key, entry)
+            siblings.append(node)
+
+            if isContainer(entry):
+                children = self._order[node] = []
+                for childKey, child in reversed(childEntries(entry)):
+                    stack.append((node, childKey, child, children))
+
+        self._flushTail()
+        self._editableChildren(parent)[row:row] = top
+        self.revision += 1
+        for listener in self._listeners:
+            listener._nodesAdded(first, len(self), top, items)
+
+    def rowsRemoved(self, parentItem, rows):
+        """Drop the children of `parentItem` at `rows`, before they go
+
+        Returns:
+            the (row, node) pairs of the dropped children in row order,
+            for rowsRestored()
+
+        """
+        parent = self.nodeForItem(parentItem)
+        if parent is None:
+            return []
+
+        removed = []
+        children = self._editableChildren(parent)
+        for row in sorted(set(rows), reverse=True):
+            if row >= len(children):
+                continue
+            removed.append((row, children[row]))
+            self._setAlive(children[row], 0)
+            del children[row]
+        removed.reverse()
+        self.revision += 1
+        for listener in self._listeners:
+            listener._nodesRemoved(parent)
+        return removed
+
+    def rowsRestored(self, parentItem, removed):
+        """Bring back the children dropped by rowsRemoved(), e.g. on undo
+
+        Their nodes are still there, they only have to be linked and
+        marked alive again.
+        """
+        parent = self.nodeForItem(parentItem)
+        if parent is None:
+            return
+
+        children = self._editableChildren(parent)
+        for row, node in removed:
+            children.insert(row, node)
+            self._setAlive(node, 1)
+        self.revision += 1
+        for listener in self._listeners:
+            listener._nodesRestored([node for _, node in removed])
+
+    def _setAlive(self, node, alive):
+        """Mark `node` and its subtree alive or removed"""
+        aliveFlags = self._alive
+        end = self._subtreeEnd(node)
+        if end is not None:
+            aliveFlags[node:end] = bytes([alive]) * (end - node)
+            return
+
+        for node in self._subtree(node):
+            aliveFlags[node] = alive
+
+    def _subtree(self, node):
+        """Nodes of the subtree of `node`, itself included"""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(self._children(node))
+
+    def _subtreeEnd(self, node):
+        """End of the node numbers of a subtree that never changed
+
+        Such subtrees are numbered in one run from `node`. Returns None
+        if something in the subtree changed since the index was built.
+        """
+        last = node
+        while True:
+            if last in self._order:
+                return None
+            children = self._children(last)
+            if not len(children):
+                break
+            last = children[-1]
+
+        end = last + 1
+        for changed in self._order:
+            if node <= changed < end:
+                return None
+        return end
+
+class SearchFilter(object):
+    """Nodes whose subtree holds a match of a text, to filter rows with
+
+    A node is visible if its own key or value contains the text or if
+    one of its descendants does, so that the path to every match stays.
+    The text is matched as by SearchIndex.findAll().
+
+    Setting a text that contains the previous one only looks at the
+    previous matches. The results of the last few texts are kept until
+    the index changes, so that going back to them costs nothing. The
+    filter registers itself with its index, which tells it about every
+    change; only the path from a changed node up to the root is checked
+    again.
+    """
+
+    def __init__(self, searchIndex):
+        self.searchIndex = searchIndex
+        self.text = ""
+        # Nodes that match themselves
+        self._matches = set()
+        # Matches and their ancestors
+        self._visible = set()
+        # text: (matches, visible) of the last texts, oldest first
+        self._cache = {}
+        searchIndex._listeners.append(self)
+
+    def close(self):
+        """Stop following the changes of the index"""
+        if self in self.searchIndex._listeners:
+            self.searchIndex._listeners.remove(self)
+
+    def isActive(self):
+        return bool(self.text)
+
+    def visibleCount(self):
+        return len(self._visible)
+
+    def setText(self, text):
+        """Filter by `text`, an empty text shows every node"""
+        text = text.lower()
+        if text == self.text:
+            return
+
+        if self.text:
+            self._cache[self.text] = (self._matches, self._visible)
+            if len(self._cache) > _FILTER_CACHE_SIZE:
+                del self._cache[next(iter(self._cache))]
+
+        cached = self._cache.pop(text, None)
+        if cached is not None:
+            self._matches, self._visible = cached
+        elif not text or _SEPARATORS.search(text):
+            self._matches, self._visible = set(), set()
+        else:
+            index = self.searchIndex
+            if self.text and self.text in text:
+                # Only the previous matches can still match
+                matches = set(index._containing(text, self._matches))
+            else:
+                matches = set(index._findAll(text, 0, len(index)))
+            self._matches = matches
+            self._visible = set()
+            self._addPaths(matches)
+        self.text = text
+
+    def contains(self, node):
+        """Whether `node` is shown, always True without a text"""
+        return not self.text or node in self._visible
+
+    def containsEach(self, nodes):
+        """contains() of each of `nodes`, as a list"""
+        if not self.text:
+            return [True] * len(nodes)
+        return list(map(self._visible.__contains__, nodes))
+
+    def containsItem(self, item):
+        """Like contains() for the node of `item`, True if it has none"""
+        if not self.text:
+            return True
+        node = self.searchIndex.nodeForItem(item)
+        return node is None or node in self._visible
+
+    def containsChildren(self, node):
+        """Whether any child of `node` is shown"""
+        index = self.searchIndex
+        if self.text:
+            if node not in self._visible:
+                return False
+            if node not in self._matches:
+                # It is only shown for a match under it
+                return True
+        return any(map(self.contains, index._children(node)))
+
+    def _addPaths(self, nodes):
+        """Make `nodes` and their ancestors visible"""
+        parents = self.searchIndex._parents
+        visible = self._visible
+        # One level of ancestors at a time, those visible already have
+        # their own ancestors visible
+        added = set(nodes) - visible
+        while added:
+            visible |= added
+            added = set(map(parents.__getitem__, added)) - visible
+            added.discard(-1)
+
+    def _recheck(self, node):
+        """Hide `node` and its ancestors as far as nothing under them matches"""
+        index = self.searchIndex
+        visible = self._visible
+        while node >= 0 and node in visible:
+            if node in self._matches or any(child in visible for child in index._children(node)):
+                break
+            visible.discard(node)
+            node = index._parents[node]
+
+    # Changes of the index
+
+    def _nodeChanged(self, node, item):
+        self._cache.clear()
+        if not self.text:
+            return
+        if self.searchIndex._containing(self.text, [node]):
+            self._matches.add(node)
+            self._addPaths([node])
+        elif node in self._matches:
+            self._matches.discard(node)
+            self._recheck(node)
+
+    def _nodesAdded(self, first, last, nodes, items):
+        self._cache.clear()
+        if self.text:
+            matches = self.searchIndex._findAll(self.text, first, last)
+            self._matches.update(matches)
+            self._addPaths(matches)
+
+    def _nodesRemoved(self, parent):
+        # Nodes of the removed subtrees keep their state, they are found
+        # again by _nodesRestored()
+        self._cache.clear()
+        if self.text:
+            self._recheck(parent)
+
+    def _nodesRestored(self, nodes):
+        self._cache.clear()
+        if not self.text:
+            return
+        index = self.searchIndex
+        for node in nodes:
+            # The text may have changed while they were removed
+            end = index._subtreeEnd(node)
+            if end is not None:
+                matches = index._findAll(self.text, node, end)
+            else:
+                matches = index._containing(self.text, index._subtree(node))
+            self._matches.update(matches)
+            self._addPaths(matches)
+            if node in self._visible:
+                # It may have stayed visible while removed, its
+                # ancestors did not
+                self._addPaths([index._parents[node]])
+
+def _decodeText(raw):
+    """Text of the JSON scalar `raw`, as bytes from the file
+
+    Valid JSON has no control characters outside of escapes, so only
+    escaped strings may hold separators.
+    """
+    if raw[:1] != b'"':
+        return raw.decode("ascii")
+    if b"\\" in raw:
+        return _SEPARATORS.sub(" ", json.loads(raw))
+    return raw[1:-1].decode("utf-8")
@@ -0,0 +1,726 @@
+"""
+Incremental JSON parsing for JSON Wizard
+
+StreamParser tokenizes text as it is fed, in chunks of any size, and
+reports every token to a handler object as an event:
+
+    startObject(), startArray(), key(key), value(value), endContainer()
+
+TreeBuilder is such a handler, it builds QJsonTreeItem nodes straight
+from the events, so a document never exists as text and as Python
+dicts/lists at the same time. Finished children of the root item are
+queued rather than attached, so that the owner of the model can hand
+them over in batches while the rest of the file is still being read:
+
+    >>> builder = TreeBuilder()
+    >>> parser = StreamParser(builder)
+    >>> for chunk in chunks:
+    ...     parser.feed(chunk)
+    ...     model.appendItems(model.rootItem(), builder.takeItems())
+    >>> parser.close()
+
+The accepted syntax is the one of json.loads(), NaN and Infinity
+included.
+
+ItemWriter goes the other way and writes a tree out chunk by chunk,
+as JSON or as JSON Lines, saveTree() puts the result in place of a
+file safely.
+"""
+from array import array
+from json.decoder import scanstring
+from JSONIndex import LineSource, LinesDocument, MappedFile, RecordSource
+from JSONTree import QJsonTreeItem
+import io
+import json
+import os
+import re
+import shutil
+import stat
+import tempfile
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"(-?(?:0|[1-9]\d*))(\.\d+)?([eE][-+]?\d+)?")
+# What may follow a number that was cut off at the end of a chunk
+_NUMBER_TAIL = re.compile(r"\d*(?:\.\d*)?(?:[eE][-+]?\d*)?")
+# Text of a string up to its closing quote, escapes are taken in pairs
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*')
+_LITERALS = (
+    ("true", True),
+    ("false", False),
+    ("null", None),
+    ("NaN", float("nan")),
+    ("Infinity", float("inf")),
+    ("-Infinity", float("-inf")),
+)
+
+# Parser states, i.e. what the next token may be
+_VALUE = 0          # any value
+_FIRST_VALUE = 1    # any value or "]"
+_FIRST_KEY = 2      # an object key or "}"
+_KEY = 3            # an object key
+_COLON = 4          # ":"
+_NEXT = 5           # "," or the end of the current container
+_DONE = 6           # nothing but whitespace
+
+class StreamParser(object):
+    def __init__(self, handler):
+        self._handler = handler
+        self._state = _VALUE
+        # "{" or "[" for every open container
+        self._stack = []
+        # Text of a token that was cut off at the end of a chunk
+        self._buffer = ""
+        # Chunks of a string that was cut off, kept apart until its end
+        # comes so that long strings are not scanned once per chunk. The
+        # tail is a backslash the last chunk ended with, or ""
+        self._pending = None
+        self._pendingTail = ""
+        # Characters consumed so far, for error messages
+        self._offset = 0
+
+    def feed(self, text):
+        """Parse the next chunk of the document"""
+        if self._pending is not None:
+            scanned = self._pendingTail + text
+            end = _STRING_BODY.match(scanned).end()
+            if end == len(scanned) or scanned[end] != '"':
+                # Still no closing quote
+                self._pending.append(text)
+                self._pendingTail = scanned[end:]
+                return
+            text = "".join(self._pending) + text
+            self._pending = None
+        else:
+            text = self._buffer + text if self._buffer else text
+        pos = self._parse(text, False)
+        self._buffer = text[pos:]
+        self._offset += pos
+        if self._buffer[:1] == '"':
+            # The string goes on in the next chunks
+            self._pending = [self._buffer]
+            self._pendingTail = self._buffer[_STRING_BODY.match(self._buffer, 1).end():]
+            self._buffer = ""
+
+    def close(self):
+        """Finish parsing, raises ValueError on an incomplete document"""
+        if self._pending is not None:
+            self._buffer = "".join(self._pending)
+            self._pending = None
+        pos = self._parse(self._buffer, True)
+        self._offset += pos
+        self._buffer = ""
+        if self._state != _DONE:
+            self._error("Unexpected end of document", 0)
+
+    def _error(self, message, pos):
+        raise ValueError("%s: char %d" % (message, self._offset + pos))
+
+    def _parse(self, text, final):
+        """Consume all complete tokens of `text`
+
+        Returns:
+            position of the first character that was not consumed
+
+        """
+
+        handler = self._handler
+        stack = self._stack
+        state = self._state
+        end = len(text)
+        pos = 0
+
+        while True:
+            if pos < end and text[pos] in " \t\n\r":
+                pos = _WHITESPACE.match(text, pos).end()
+            if pos >= end:
+                break
+            char = text[pos]
+
+            if state == _NEXT:
+                if char == ",":
+                    state = _KEY if stack[-1] == "{" else _VALUE
+                    pos += 1
+                elif char == ("}" if stack[-1] == "{" else "]"):
+                    stack.pop()
+                    handler.endContainer()
+                    state = _NEXT if stack else _DONE
+                    pos += 1
+                else:
+                    self._error("Expecting ',' delimiter", pos)
+                continue
+
+            if state == _KEY or state == _FIRST_KEY:
+                if char == '"':
+                    try:
+                        key, pos = scanstring(text, pos + 1)
+                    except ValueError:
+                        if not final and _isCut(text, pos):
+                            break
+                        raise
+                    handler.key(key)
+                    state = _COLON
+                elif char == "}" and state == _FIRST_KEY:
+                    stack.pop()
+                    handler.endContainer()
+                    state = _NEXT if stack else _DONE
+                    pos += 1
+                else:
+                    self._error("Expecting property name enclosed in double quotes", pos)
+                continue
+
+            if state == _COLON:
+                if char != ":":
+                    self._error("Expecting ':' delimiter", pos)
+                state = _VALUE
+                pos += 1
+                continue
+
+            if state == _DONE:
+                self._error("Extra data", pos)
+
+            # _VALUE or _FIRST_VALUE
+            if char == "{":
+                handler.startObject()
+                stack.append("{")
+                state = _FIRST_KEY
+                pos += 1
+                continue
+            if char == "[":
+                handler.startArray()
+                stack.append("[")
+                state = _FIRST_VALUE
+                pos += 1
+                continue
+            if char == "]" and state == _FIRST_VALUE:
+                stack.pop()
+                handler.endContainer()
+                state = _NEXT if stack else _DONE
+                pos += 1
+                continue
+
+            if char == '"':
+                try:
+                    value, pos = scanstring(text, pos + 1)
+                except ValueError:
+                    if not final and _isCut(text, pos):
+                        break
+                    raise
+            else:
+                match = _NUMBER.match(text, pos)
+                if match is not None:
+                    if not final and _NUMBER_TAIL.fullmatch(text, match.end()):
+                        # The number may go on in the next chunk
+                        break
+                    integer, fraction, exponent = match.groups()
+                    if fraction or exponent:
+                        value = float(integer + (fraction or "") + (exponent or ""))
+                    else:
+                        value = int(integer)
+                    pos = match.end()
+                else:
+                    for name, value in _LITERALS:
+                        if text.startswith(name, pos):
+                            pos += len(name)
+                            break
+                    else:
+                        rest = text[pos:pos + 9]
+                        if not final and any(
+                            name.startswith(rest) for name, _ in _LITERALS
+                        ):
+                            break
+                        self._error("Expecting value", pos)
+
+            handler.value(value)
+            state = _NEXT if stack else _DONE
+
+        self._state = state
+        return pos
+
+def _isCut(text, start):
+    """Whether the string at `start` has no closing quote in `text` yet"""
+    end = _STRING_BODY.match(text, start + 1).end()
+    # Else it ends before a backslash that escapes what comes next
+    return end == len(text) or text[end] != '"'
+
+class TreeBuilder(object):
+    """StreamParser handler that builds a QJsonTreeItem tree
+
+    The root item is available from `root` as soon as its opening
+    bracket was parsed. Children of the root are not attached to it,
+    collect them in document order with takeItems() and attach them with
+    QJsonModel.appendItems().
+    """
+
+    def __init__(self):
+        self.root = None
+        # Open containers, the root first
+        self._stack = []
+        # Key for the next value of an object
+        self._key = None
+        # Finished children of the root, waiting for takeItems()
+        self._items = []
+
+    def takeItems(self):
+        items = self._items
+        self._items = []
+        return items
+
+    def _add(self, item):
+        stack = self._stack
+        if not stack:
+            if item.type is not dict and item.type is not list:
+                raise ValueError("The root of a JSON document must be an object or an array")
+            item.key = "root"
+            self.root = item
+            return
+
+        parent = stack[-1]
+        item.key = self._key if parent.type is dict else None
+        if parent is self.root:
+            item._parent = parent
+            if item.type is not dict and item.type is not list:
+                self._items.append(item)
+        else:
+            parent.appendChild(item)
+
+    def _open(self, typ):
+        parent = self._stack[-1] if self._stack else None
+        item = QJsonTreeItem(parent)
+        item.type = typ
+        self._add(item)
+        self._stack.append(item)
+
+    def startObject(self):
+        self._open(dict)
+
+    def startArray(self):
+        self._open(list)
+
+    def endContainer(self):
+        item = self._stack.pop()
+        if len(self._stack) == 1:
+            self._items.append(item)
+
+    def key(self, key):
+        self._key = key
+
+    def value(self, value):
+        item = QJsonTreeItem(self._stack[-1] if self._stack else None)
+        item.value = value
+        item.type = type(value)
+        self._add(item)
+
+# Bytes buffered by ItemWriter before they go to the file
+_WRITE_BUFFER_SIZE = 1 << 16
+# Bytes copied at once from a backing file
+_COPY_CHUNK_SIZE = 1 << 20
+# Largest gap between two records of a JSON Lines file that are copied
+# as one block, blank lines included
+_LINES_GAP = 64
+
+class ItemWriter(object):
+    """Serialise a QJsonTreeItem tree into a binary file
+
+    The output is the one of json.dump() with the same `indent`, or
+    without any whitespace if `compact` is set. The tree is written as
+    it is walked, there is no intermediate copy of the document.
+
+    With a `backing` file (a JSONIndex.MappedFile), the bytes of
+    containers that did not change since it was written are copied from
+    it rather than serialised again, see QJsonTreeItem.markDirty(). So
+    are the entries of lazy containers that were never built, when they
+    come from it (a JSONIndex.IndexedDocument). Copied bytes keep the
+    layout of the backing file. Changed containers are only reformatted
+    if the backing file has another `layout`.
+
+    The offset of every container in the new file is collected on the
+    way. Once the file is in place, commit() records them in the tree,
+    which then describes the new file.
+
+    With `lines`, the root array is written as JSON Lines, one compact
+    record per line. Unchanged records that follow each other in the
+    backing file are copied in one block.
+    """
+
+    def __init__(self, file, indent=None, backing=None, progress=None, compact=False, lines=False):
+        compact = compact or lines
+        self._file = file
+        self._lines = lines
+        self._indent = None if compact else indent
+        self._backing = backing
+        # Called with the number of bytes written so far
+        self._progress = progress
+        if compact:
+            self._itemSeparator, self._keySeparator = ",", ":"
+        else:
+            self._itemSeparator = ", " if indent is None else ","
+            self._keySeparator = ": "
+        self._encoder = json.JSONEncoder(
+            indent=self._indent,
+            separators=(self._itemSeparator, self._keySeparator),
+        )
+        # Identifies the output format, see MappedFile.layout
+        self.layout = (self._indent, self._itemSeparator)
+        self._copyClean = backing is not None and backing.layout in (None, self.layout)
+        if lines and not isinstance(backing, LinesDocument) and backing is not None:
+            # Containers of other files may span several lines
+            self._copyClean = backing.layout == self.layout
+
+        self._buffer = []
+        self._buffered = 0
+        self._reported = 0
+        # Bytes written so far
+        self.position = 0
+        # For commit(): the containers written, with their start and
+        # length in pairs, and (source, shift) pairs
+        self._spanItems = []
+        self._spans = array("q")
+        self._shifts = []
+
+    def write(self, rootItem):
+        if self._lines:
+            self._writeLines(rootItem)
+        elif not _isContainer(rootItem):
+            self._encode(rootItem.value, 0)
+        else:
+            # [item, depth, next row, start, start of the parent, separator]
+            stack = []
+            self._writeContainer(rootItem, 0, 0, stack)
+            self._writeFrames(stack)
+        self.flush()
+
+    def _writeFrames(self, stack):
+        """Write the containers on `stack` and their children"""
+        while stack:
+            frame = stack[-1]
+            item, depth, row = frame[0], frame[1], frame[2]
+
+            if row < item.childCount():
+                frame[2] = row + 1
+                child = item.child(row)
+                self._separate(frame, child.key)
+                if not _isContainer(child):
+                    self._encode(child.value, depth + 1)
+                elif child.hasChildren():
+                    self._writeContainer(child, depth + 1, frame[3], stack)
+                else:
+                    self._write("{}" if child.type is dict else "[]")
+                continue
+
+            self._writePending(frame)
+            self._close(frame)
+            stack.pop()
+
+    def _writeLines(self, rootItem):
+        if rootItem.type is not list:
+            raise ValueError("Only arrays can be saved as JSON Lines")
+
+        separator = ""
+        # [start, end] of unchanged records in the backing file, and
+        # their (item, start, length)
+        run = None
+        runItems = []
+        for row in range(rootItem.childCount()):
+            child = rootItem.child(row)
+            span = child.span() if self._copyClean else None
+            offset = child.fileOffset() if span is not None else None
+            if offset is not None:
+                if (
+                    run is not None
+                    and 0 < offset - run[1] <= _LINES_GAP
+                    and self._backing.read(run[1], offset).isspace()
+                ):
+                    run[1] = offset + span[1]
+                    runItems.append((child, offset, span[1]))
+                    continue
+                self._copyRecords(run, runItems)
+                self._write(separator)
+                separator = "\n"
+                run = [offset, offset + span[1]]
+                runItems = [(child, offset, span[1])]
+                continue
+
+            self._copyRecords(run, runItems)
+            run = None
+            self._write(separator)
+            separator = "\n"
+            if not _isContainer(child):
+                self._encode(child.value, 0)
+            elif child.hasChildren():
+                stack = []
+                self._writeContainer(child, 0, 0, stack)
+                self._writeFrames(stack)
+            else:
+                self._write("{}" if child.type is dict else "[]")
+        self._copyRecords(run, runItems)
+
+        lazy = rootItem.lazySource()
+        if lazy is not None and rootItem.pendingCount():
+            if isinstance(lazy, LineSource) and lazy.document is self._backing:
+                # Records that were never built, copied as one block
+                start, end = lazy.pendingRegion(rootItem)
+                self._write(separator)
+                self.flush()
+                self._shifts.append((lazy, lazy.regionShift(rootItem, self.position, 0)))
+                self._copy(start, end)
+                separator = "\n"
+            else:
+                for key, value in rootItem.pendingEntries():
+                    self._write(separator)
+                    separator = "\n"
+                    self._encode(value, 0)
+
+        if separator:
+            self._write("\n")
+        self._addSpan(rootItem, 0, self.position)
+
+    def _copyRecords(self, run, runItems):
+        if run is None:
+            return
+        self.flush()
+        start = self.position
+        for item, offset, length in runItems:
+            self._addSpan(item, start + offset - run[0], length)
+        self._copy(run[0], run[1])
+
+    def commit(self):
+        """Record the new offsets in the tree"""
+        spans = self._spans
+        for n, item in enumerate(self._spanItems):
+            item.setSpan(spans[2 * n], spans[2 * n + 1])
+        for source, shift in self._shifts:
+            source.shift = shift
+        self._spanItems = []
+        self._spans = array("q")
+        self._shifts = []
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def _write(self, text):
+        data = text.encode("utf-8")
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self.position += len(data)
+        if self._buffered >= _WRITE_BUFFER_SIZE:
+            self.flush()
+            self._report()
+
+    def _copy(self, start, end):
+        self.flush()
+        self._file.flush()
+        try:
+            # Let the kernel copy, the bytes do not have to come by
+            source = self._backing.fileno()
+            target = self._file.fileno()
+            while start < end:
+                copied = os.copy_file_range(source, target, min(end - start, _COPY_CHUNK_SIZE), start)
+                if not copied:
+                    break
+                self.position += copied
+                start += copied
+                self._report()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            # Not available here, copy what is left through the mapping
+            pass
+
+        while start < end:
+            data = self._backing.read(start, min(end, start + _COPY_CHUNK_SIZE))
+            self._file.write(data)
+            self.position += len(data)
+            start += len(data)
+            self._report()
+
+    def _report(self):
+        if self._progress is not None and self.position - self._reported >= _COPY_CHUNK_SIZE:
+            self._progress(self.position)
+            self._reported = self.position
+
+    def _newline(self, depth):
+        if self._indent is None:
+            return ""
+        return "\n" + " " * (self._indent * depth)
+
+    def _encode(self, value, depth):
+        if not isinstance(value, (dict, list)):
+            self._write(self._encoder.encode(value))
+            return
+
+        # Values of lazy containers may be whole subtrees
+        newline = self._newline(depth)
+        for chunk in self._encoder.iterencode(value):
+            if self._indent is not None and depth:
+                # Strings are escaped, so only line breaks of the layout
+                chunk = chunk.replace("\n", newline)
+            self._write(chunk)
+
+    def _writeContainer(self, item, depth, parentStart, stack):
+        span = item.span() if self._copyClean else None
+        offset = item.fileOffset() if span is not None else None
+        if offset is not None:
+            # Unchanged since the backing file was written
+            self.flush()
+            start = self.position
+            self._copy(offset, offset + span[1])
+            self._addSpan(item, start - parentStart, span[1])
+            return
+
+        stack.append([item, depth, 0, self.position, parentStart, ""])
+        self._write("{" if item.type is dict else "[")
+
+    def _addSpan(self, item, start, length):
+        self._spanItems.append(item)
+        self._spans.append(start)
+        self._spans.append(length)
+
+    def _separate(self, frame, key):
+        text = frame[5] + self._newline(frame[1] + 1)
+        frame[5] = self._itemSeparator
+        if frame[0].type is dict:
+            text += self._encoder.encode(key if isinstance(key, str) else str(key)) + self._keySeparator
+        self._write(text)
+
+    def _writePending(self, frame):
+        item, depth = frame[0], frame[1]
+        lazy = item.lazySource()
+        if lazy is None or not item.pendingCount():
+            return
+
+        if (
+            self._backing is not None
+            and getattr(lazy, "document", None) is self._backing
+            and not isinstance(lazy, (LineSource, RecordSource))
+            and item.fileOffset() is not None
+        ):
+            # Untouched entries of the backing file, copied as one block
+            start, end = lazy.pendingRegion(item)
+            self._write(frame[5] + self._newline(depth + 1))
+            frame[5] = self._itemSeparator
+            self.flush()
+            self._shifts.append((lazy, lazy.regionShift(item, self.position, frame[3])))
+            self._copy(start, end)
+            return
+
+        for key, value in item.pendingEntries():
+            self._separate(frame, key)
+            self._encode(value, depth + 1)
+
+    def _close(self, frame):
+        item, depth = frame[0], frame[1]
+        if frame[5]:
+            self._write(self._newline(depth))
+        self._write("}" if item.type is dict else "]")
+        start = frame[3]
+        self._addSpan(item, start - frame[4], self.position - start)
+
+def saveTree(fileName, rootItem, backing=None, indent=4, compact=False, backups=0, progress=None, checkCancelled=None, lines=False):
+    """Write an item tree into a file with an ItemWriter
+
+    The tree is written into a temporary file next to `fileName`, which
+    is flushed to disk and then renamed over `fileName` in one step. The
+    file on disk is always either the old or the new version, whether
+    the save fails, is cancelled or the machine goes down. With
+    `backups`, that many previous versions are kept as fileName.bak1
+    (the latest) to fileName.bakN.
+
+    Arguments:
+        backing (JSONIndex.MappedFile, optional): File the tree was
+            loaded from or last saved to, whatever did not change since
+            is copied from it
+        progress (callable, optional): Called with the number of bytes
+            written so far
+        checkCancelled (callable, optional): Called once the file is
+            written, raises to leave `fileName` as it was
+        lines (bool): Write the root array as JSON Lines
+
+    Returns:
+        the saved file as the new backing of the tree
+
+    """
+
+    directory = os.path.dirname(os.path.abspath(fileName))
+    handle, tempName = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        os.chmod(tempName, _fileMode(fileName))
+        with os.fdopen(handle, "wb") as file:
+            writer = ItemWriter(file, indent, backing, progress=progress, compact=compact, lines=lines)
+            writer.write(rootItem)
+            file.flush()
+            os.fsync(file.fileno())
+
+        if checkCancelled is not None:
+            checkCancelled()
+        if backups and os.path.exists(fileName):
+            _backUp(fileName, backups)
+        if backing is None:
+            os.replace(tempName, fileName)
+        else:
+            # The old file must not be mapped while it is replaced
+            oldName = backing.fileName
+            backing.close()
+            try:
+                os.replace(tempName, fileName)
+            except OSError:
+                backing.open(oldName)
+                raise
+    except BaseException:
+        if os.path.exists(tempName):
+            os.remove(tempName)
+        raise
+
+    _syncDirectory(directory)
+
+    if backing is None:
+        backing = MappedFile(fileName)
+    else:
+        backing.open(fileName)
+    backing.layout = writer.layout
+    writer.commit()
+    return backing
+
+def _backUp(fileName, backups):
+    """Shift the backups by one and make the current file the latest"""
+    for n in range(backups, 1, -1):
+        older = "%s.bak%d" % (fileName, n - 1)
+        if os.path.exists(older):
+            os.replace(older, "%s.bak%d" % (fileName, n))
+
+    latest = fileName + ".bak1"
+    if os.path.exists(latest):
+        os.remove(latest)
+    try:
+        # A second name for the current file, nothing is copied
+        os.link(fileName, latest)
+    except OSError:
+        shutil.copy2(fileName, latest)
+
+def _fileMode(fileName):
+    """Permissions for a new version of `fileName`"""
+    try:
+        return stat.S_IMODE(os.stat(fileName).st_mode)
+    except FileNotFoundError:
+        # What open() would have given a new file
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+def _syncDirectory(directory):
+    """Flush a rename in `directory` to disk, where the platform allows"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        handle = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(handle)
+    except OSError:
+        pass
+    finally:
+        os.close(handle)
+
+def _isContainer(item):
+    return item.type is dict or item.type is list
@@ -0,0 +1,555 @@
+"""
+Item tree of JSON Wizard, without Qt
+
+QJsonTreeItem nodes hold the keys and values of a document, containers
+build their children lazily from a LazySource. QJSONModel.QJsonModel
+presents such a tree to Qt views, the headless tools (see JSONBatch)
+work on it directly.
+
+parseValue() gives the typing rules of the values entered by users.
+childEntries() reads the children of items and plain values alike, for
+the code that walks partly built trees.
+"""
+import itertools
+
+# Number of child items built per fetchMore() on a lazy container
+FETCH_BATCH_SIZE = 1000
+
+# Shared by every item without children, replaced by a list on the
+# first appendChild()
+_NO_CHILDREN = ()
+
+class LazySource(object):
+    """Entries of a container that have no QJsonTreeItem yet
+
+    Subclasses provide the entries, `fetched` counts the ones that were
+    already turned into child items.
+    """
+    __slots__ = ("fetched",)
+
+    def __init__(self):
+        self.fetched = 0
+
+    def __len__(self):
+        """Total number of entries, fetched or not"""
+        raise NotImplementedError
+
+    def fetch(self, item, count):
+        """Append up to `count` child items to `item`, returns how many"""
+        raise NotImplementedError
+
+    def pendingEntries(self, item):
+        """Iterate over the (key, value) pairs of the remaining entries
+
+        Values are plain JSON-compatible Python objects. Array entries
+        are yielded with a key of None.
+        """
+        raise NotImplementedError
+
+class PythonSource(LazySource):
+    """Entries of a loaded dict or list, see QJsonTreeItem.load(lazy=True)
+
+    `pending` iterates over the rest of a dict source.
+    """
+    __slots__ = ("source", "pending")
+
+    def __init__(self, source):
+        super(PythonSource, self).__init__()
+        self.source = source
+        self.pending = None
+
+    def __len__(self):
+        return len(self.source)
+
+    def fetch(self, item, count):
+        source = self.source
+        if isinstance(source, dict):
+            if self.pending is None:
+                self.pending = iter(source.items())
+            entries = itertools.islice(self.pending, count)
+        else:
+            entries = ((None, value) for value in source[self.fetched:self.fetched + count])
+
+        built = 0
+        for key, value in entries:
+            child = QJsonTreeItem.load(value, item, lazy=True)
+            child.type = type(value)
+            child.key = key
+            item.appendChild(child)
+            built += 1
+        return built
+
+    def pendingEntries(self, item):
+        if isinstance(self.source, dict):
+            return itertools.islice(self.source.items(), self.fetched, None)
+        return ((None, value) for value in self.source[self.fetched:])
+
+class _ChildList(list):
+    """Child list of a container item
+
+    `lazy` is the LazySource of the entries that have no item yet.
+    `start` and `length` locate the container in the file backing its
+    document, if any (see JSONIndex). `start` is relative to the start
+    of the parent container, so that moving a container in the file only
+    changes its own offset, the root's is absolute. `length` is None
+    once the container changed, its bytes in the file are out of date.
+
+    `stale` is the first row from which the children's `_row` may be out
+    of date after an insertion or removal, None if they are all right.
+
+    `keys` maps the keys of the children of an object to the first child
+    with that key, and `duplicates` the keys of several children to the
+    number of children after the first. Both are built on the first
+    lookup and None until then, see QJsonTreeItem.childByKey(), then
+    kept up to date as children come and go.
+    """
+    __slots__ = ("lazy", "start", "length", "stale", "keys", "duplicates")
+
+    def __init__(self):
+        super(_ChildList, self).__init__()
+        self.lazy = None
+        self.start = None
+        self.length = None
+        self.stale = None
+        self.keys = None
+        self.duplicates = None
+
+    def buildKeys(self):
+        keys = {}
+        duplicates = {}
+        # Backwards, so that the first child of a key is kept
+        for child in reversed(self):
+            if child.key in keys:
+                duplicates[child.key] = duplicates.get(child.key, 0) + 1
+            keys[child.key] = child
+        self.keys = keys
+        self.duplicates = duplicates
+
+    def addKey(self, item):
+        """Map `item`, already in the list"""
+        key = item.key
+        first = self.keys.get(key)
+        if first is None:
+            self.keys[key] = item
+            return
+        self.duplicates[key] = self.duplicates.get(key, 0) + 1
+        if item.row() < first.row():
+            self.keys[key] = item
+
+    def removeKey(self, item, key):
+        """Unmap `item`, no longer in the list or no longer with `key`"""
+        count = self.duplicates.get(key)
+        if count is None:
+            del self.keys[key]
+            return
+        if count == 1:
+            del self.duplicates[key]
+        else:
+            self.duplicates[key] = count - 1
+        if self.keys[key] is item:
+            self.keys[key] = next(
+                child for child in self if child.key == key and child is not item
+            )
+
+class QJsonTreeItem(object):
+    # Most items are JSON scalars, so skip the per-instance __dict__
+    __slots__ = ("_parent", "_children", "_row", "key", "value", "type")
+
+    def __init__(self, parent=None):
+        self._parent = parent
+
+        # Array entries have no key, their key is their row
+        self.key = ""
+        self.value = ""
+        self.type = None
+        self._children = _NO_CHILDREN
+        # Position in the parent's children, so that row() does not have
+        # to search for it. Renumbered on demand after insertions and
+        # removals, see row().
+        self._row = 0
+
+    def _childList(self):
+        children = self._children
+        if children is _NO_CHILDREN:
+            children = self._children = _ChildList()
+        return children
+
+    def appendChild(self, item):
+        children = self._childList()
+        item._row = len(children)
+        children.append(item)
+        if children.keys is not None:
+            children.addKey(item)
+    
+    def insertChildren(self, row, items):
+        """Insert `items` before the child at `row` in one go"""
+        children = self._childList()
+        for offset, item in enumerate(items):
+            item._parent = self
+            item._row = row + offset
+        children[row:row] = items
+        self._markStale(row)
+        if children.keys is not None:
+            for item in items:
+                children.addKey(item)
+
+    def removeChild(self, item):
+        self.removeChildren(item.row(), 1)
+
+    def removeChildren(self, row, count):
+        children = self._children
+        removed = children[row:row + count]
+        del children[row:row + count]
+        self._markStale(row)
+        if children.keys is not None:
+            # Last first, the first child of a key is then removed after
+            # the others of the range
+            for item in reversed(removed):
+                children.removeKey(item, item.key)
+
+    def setKey(self, key):
+        """Rename this child of an object, keeping its parent's keys mapped"""
+        oldKey = self.key
+        self.key = key
+        children = self._parent._children if self._parent is not None else None
+        if children and children.keys is not None:
+            children.removeKey(self, oldKey)
+            children.addKey(self)
+
+    def childByKey(self, key):
+        """First child of an object with `key`, None if there is none
+
+        Only the children built so far are looked at. The keys are
+        mapped on the first call, later ones take O(1).
+        """
+        children = self._children
+        if self.type is not dict or children is _NO_CHILDREN:
+            return None
+        if children.keys is None:
+            children.buildKeys()
+        return children.keys.get(key)
+
+    def duplicateKeys(self):
+        """Keys of several children of an object, among those built so far
+
+        Only one of them is kept when the object is turned into a dict,
+        see QJsonModel.json().
+        """
+        children = self._children
+        if self.type is not dict or children is _NO_CHILDREN:
+            return []
+        if children.keys is not None:
+            return list(children.duplicates)
+        # Without mapping the keys for good
+        seen = set()
+        duplicates = {}
+        for child in children:
+            if child.key in seen:
+                duplicates[child.key] = None
+            seen.add(child.key)
+        return list(duplicates)
+
+    def _markStale(self, row):
+        children = self._children
+        if children.stale is None or row < children.stale:
+            children.stale = row
+
+    def _renumber(self):
+        children = self._children
+        for row in range(children.stale, len(children)):
+            children[row]._row = row
+        children.stale = None
+
+    def lazySource(self):
+        children = self._children
+        return children.lazy if children is not _NO_CHILDREN else None
+
+    def setLazySource(self, source):
+        """Build the children of this container on demand from `source`"""
+        # Sources may know they are not empty before they know their length
+        self._childList().lazy = source if source else None
+
+    def canFetchMore(self):
+        children = self._children
+        return children is not _NO_CHILDREN and children.lazy is not None
+
+    def pendingCount(self):
+        lazy = self.lazySource()
+        return len(lazy) - lazy.fetched if lazy is not None else 0
+
+    def fetchMore(self, count=FETCH_BATCH_SIZE):
+        """Build up to `count` more child items from the lazy source
+
+        Returns:
+            number of child items built
+
+        """
+
+        lazy = self.lazySource()
+        if lazy is None:
+            return 0
+
+        built = lazy.fetch(self, min(count, len(lazy) - lazy.fetched))
+        lazy.fetched += built
+        if lazy.fetched >= len(lazy):
+            # Everything is materialized, drop the source
+            self._children.lazy = None
+
+        return built
+
+    def pendingEntries(self):
+        """Iterate over the (key, value) pairs that have no item yet
+
+        Array entries are yielded with a key of None, their index is
+        given by their position after the already built children.
+
+        """
+
+        lazy = self.lazySource()
+        if lazy is None:
+            return iter(())
+        return lazy.pendingEntries(self)
+
+    def span(self):
+        """(start, length) of a container in the file backing its document
+
+        Returns None for scalars, containers that are not in the file and
+        containers that changed since it was written.
+        """
+        children = self._children
+        if children is _NO_CHILDREN or children.length is None:
+            return None
+        return children.start, children.length
+
+    def markDirty(self):
+        """Flag this container and its parents as changed
+
+        Call after changing the children of a container, or the key or
+        value of one of them. A save then serialises the containers on
+        the way to the change, rather than copying them from the backing
+        file, see JSONStream.ItemWriter.
+        """
+        item = self
+        while item is not None:
+            children = item._children
+            if children is not _NO_CHILDREN:
+                children.length = None
+            item = item._parent
+
+    def setSpan(self, start, length):
+        children = self._childList()
+        children.start = start
+        children.length = length
+
+    def fileOffset(self):
+        """Absolute start of a container in the file backing its document
+
+        Returns None if the container or one of its parents is not in
+        the file.
+        """
+        offset = 0
+        item = self
+        while item is not None:
+            children = item._children
+            if children is _NO_CHILDREN or children.start is None:
+                return None
+            offset += children.start
+            item = item._parent
+        return offset
+
+    def child(self, row):
+        return self._children[row]
+
+    def parent(self):
+        return self._parent
+
+    def childCount(self):
+        return len(self._children)
+
+    def hasChildren(self):
+        return bool(self._children) or self.canFetchMore()
+
+    def row(self):
+        parent = self._parent
+        if parent is None:
+            return 0
+
+        row = self._row
+        stale = parent._children.stale if parent._children else None
+        if stale is not None and row >= stale:
+            parent._renumber()
+            row = self._row
+        return row
+
+    @classmethod
+    def load(self, value, parent=None, sort=False, lazy=False):
+        rootItem = QJsonTreeItem(parent)
+        rootItem.key = "root"
+
+        if lazy and isinstance(value, (dict, list)):
+            if not value:
+                return rootItem
+            if isinstance(value, dict) and sort:
+                value = dict(sorted(value.items()))
+            rootItem.setLazySource(PythonSource(value))
+
+        elif isinstance(value, (dict, list)):
+            # Explicit stack of (item, container) pairs whose children
+            # are still to be built, deep documents would exceed the
+            # recursion limit otherwise
+            stack = [(rootItem, value)]
+            while stack:
+                item, value = stack.pop()
+                if isinstance(value, dict):
+                    # Only the top level is sorted
+                    entries = (
+                        sorted(value.items())
+                        if sort and item is rootItem else value.items()
+                    )
+                else:
+                    entries = ((None, value) for value in value)
+
+                for key, value in entries:
+                    child = QJsonTreeItem(item)
+                    child.type = type(value)
+                    child.key = key
+                    item.appendChild(child)
+                    if isinstance(value, (dict, list)):
+                        stack.append((child, value))
+                    else:
+                        child.value = value
+
+        else:
+            rootItem.value = value
+            rootItem.type = type(value)
+
+        return rootItem
+
+def parseValue(text):
+    """Value and type of a scalar entered as `text`
+
+    Digits make an integer, null makes None, true/True and false/False
+    make booleans and anything else is kept as a string, see
+    QJsonModel.setData().
+
+    Returns:
+        (value, type) pair
+
+    """
+
+    if text.isdigit():
+        return int(text), int
+    if text == "null":
+        return None, None
+    if text == "true" or text == "True":
+        return True, bool
+    if text == "false" or text == "False":
+        return False, bool
+    return text, str
+
+def countItems(rootItem):
+    """Number of items built so far under `rootItem`, itself included"""
+    count = 1
+    stack = [rootItem]
+    while stack:
+        children = stack.pop()._children
+        count += len(children)
+        stack.extend(child for child in children if child._children)
+    return count
+
+def findDuplicateKeys(rootItem):
+    """Objects with several children of the same key
+
+    Only containers that changed since the backing file was written,
+    or have none, are looked at. The others are copied as they are on
+    save.
+
+    Returns:
+        list of (QJsonTreeItem, key) pairs, in document order
+
+    """
+
+    found = []
+    stack = [rootItem]
+    while stack:
+        item = stack.pop()
+        if item.span() is not None:
+            continue
+        found.extend((item, key) for key in item.duplicateKeys())
+        stack.extend(
+            child for child in reversed(item._children)
+            if child.type is dict or child.type is list
+        )
+    return found
+
+def toPython(item):
+    """Plain JSON-compatible Python value of `item` and its subtree
+
+    Subtrees that were never built are returned as-is from the lazy
+    source, not copied.
+    """
+    if item.type is not dict and item.type is not list:
+        return item.value
+
+    root = {} if item.type is dict else []
+    # Explicit stack of (item, container) pairs still to be filled,
+    # deep documents would exceed the recursion limit otherwise
+    stack = [(item, root)]
+    while stack:
+        item, document = stack.pop()
+        isObject = item.type is dict
+
+        for ch in item._children:
+            if ch.type is dict:
+                value = {}
+                stack.append((ch, value))
+            elif ch.type is list:
+                value = []
+                stack.append((ch, value))
+            else:
+                value = ch.value
+
+            if isObject:
+                document[ch.key] = value
+            else:
+                document.append(value)
+
+        if isObject:
+            for key, value in item.pendingEntries():
+                document[key] = value
+        else:
+            for _, value in item.pendingEntries():
+                document.append(value)
+
+    return root
+
+def isItem(entry):
+    """Whether `entry` is a QJsonTreeItem rather than a plain value"""
+    return hasattr(entry, "pendingEntries")
+
+def isContainer(entry):
+    """Whether `entry`, an item or a plain value, is an object or an array"""
+    if isItem(entry):
+        return entry.type is dict or entry.type is list
+    return isinstance(entry, (dict, list))
+
+def childEntries(entry):
+    """(key, child) pairs of a QJsonTreeItem or a plain value
+
+    Children are items as far as they were built, plain values after
+    that. Array entries have a key of None.
+    """
+    if isItem(entry):
+        if entry.type is dict:
+            entries = [(child.key, child) for child in entry._children]
+        elif entry.type is list:
+            entries = [(None, child) for child in entry._children]
+        else:
+            return []
+        entries.extend(entry.pendingEntries())
+        return entries
+    if isinstance(entry, dict):
+        return list(entry.items())
+    if isinstance(entry, list):
+        return list(zip(itertools.repeat(None), entry))
+    return []
@@ -0,0 +1,106 @@
+"""
+Undo and redo for JSON Wizard
+
+QJsonModel records its edits as the commands below on the QUndoStack
+given to QJsonModel.setUndoStack(). The model makes the change first and
+pushes the command afterwards, so the first redo() that QUndoStack.push()
+calls does nothing.
+
+Commands hold on to the items they concern rather than copies: a
+removed subtree is kept detached as it is and put back in one step by
+undo, whatever its size. The memory they hold is bounded by the undo
+limit of the stack.
+"""
+from PySide2.QtWidgets import QUndoCommand
+import time
+
+# Edits of the same item closer than this (s) are undone together
+MERGE_INTERVAL = 1.0
+
+# QUndoCommand.id() of the commands that can be merged
+_EDIT_ID = 1
+
+class ModelCommand(QUndoCommand):
+    """A change already made to a QJsonModel"""
+
+    def __init__(self, model, text):
+        super(ModelCommand, self).__init__(text)
+        self.model = model
+        self._pushed = False
+
+    def redo(self):
+        if not self._pushed:
+            # Called by push(), the model made the change already
+            self._pushed = True
+            return
+        self.apply()
+
+    def apply(self):
+        raise NotImplementedError
+
+class EditCommand(ModelCommand):
+    """New key, value or type of an item
+
+    `old` and `new` are (key, value, type) tuples.
+    """
+
+    def __init__(self, model, item, old, new):
+        super(EditCommand, self).__init__(model, "Edit")
+        self.item = item
+        self.old = old
+        self.new = new
+        self.time = time.monotonic()
+
+    def id(self):
+        return _EDIT_ID
+
+    def mergeWith(self, other):
+        if other.item is not self.item or other.time - self.time > MERGE_INTERVAL:
+            return False
+        self.new = other.new
+        self.time = other.time
+        return True
+
+    def undo(self):
+        self.model._setItemData(self.item, *self.old)
+
+    def apply(self):
+        self.model._setItemData(self.item, *self.new)
+
+class RemoveCommand(ModelCommand):
+    """Children removed from a container
+
+    `ranges` are the (first row, items) ranges given by
+    QJsonModel._removeItems(), the items are kept as they are.
+    """
+
+    def __init__(self, model, parentItem, ranges, searchNodes=None):
+        count = sum(len(items) for _, items in ranges)
+        super(RemoveCommand, self).__init__(model, "Remove %d items" % count if count > 1 else "Remove item")
+        self.parentItem = parentItem
+        self.ranges = ranges
+        self.searchNodes = searchNodes
+
+    def undo(self):
+        self.model._restoreItems(self.parentItem, self.ranges, self.searchNodes)
+
+    def apply(self):
+        rows = [row for first, items in self.ranges for row in range(first + len(items) - 1, first - 1, -1)]
+        self.ranges, self.searchNodes = self.model._removeItems(self.parentItem, rows)
+
+class InsertCommand(ModelCommand):
+    """Children inserted into a container at `row`"""
+
+    def __init__(self, model, parentItem, row, items):
+        super(InsertCommand, self).__init__(model, "Insert %d items" % len(items) if len(items) > 1 else "Insert item")
+        self.parentItem = parentItem
+        self.row = row
+        self.items = items
+        self.searchNodes = None
+
+    def undo(self):
+        rows = range(self.row + len(self.items) - 1, self.row - 1, -1)
+        _, self.searchNodes = self.model._removeItems(self.parentItem, rows)
+
+    def apply(self):
+        self.model._restoreItems(self.parentItem, [(self.row, self.items)], self.searchNodes)
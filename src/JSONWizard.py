@@ -1,49 +1,126 @@
 # Import Statements
 from PySide2.QtGui import QIcon, QCloseEvent, QKeySequence
-from PySide2.QtCore import QSize, Qt, QFile, QTextStream, QModelIndex
-from PySide2.QtWidgets import QTreeView, QCheckBox, QShortcut, QMessageBox, QPushButton, QLabel, QHBoxLayout, QApplication, QAction, QWidget, QMainWindow, QToolBar, QFileDialog, QFormLayout, QLineEdit
-from pathvalidate import ValidationError, validate_filename
+from PySide2.QtCore import QSize, Qt, QFile, QTextStream, QModelIndex, QItemSelection, QItemSelectionModel, QTimer
+from PySide2.QtWidgets import QTreeView, QCheckBox, QShortcut, QMessageBox, QPushButton, QLabel, QHBoxLayout, QApplication, QAction, QWidget, QMainWindow, QToolBar, QFileDialog, QFormLayout, QLineEdit, QProgressBar, QAbstractItemView, QUndoStack, QUndoGroup, QTabWidget
+from JSONWorkers import DiffWorker, IndexLoadWorker, LoadWorker, SaveWorker, SearchIndexWorker, ValidationWorker, startWorker
+from JSONQuery import QueryError, isQuery, pointer
+from JSONDiff import Comparison
+from JSONCache import MEMORY_BUDGET, DocumentCache, documentSize, fileStamp, takeSnapshot
+from JSONIndex import IndexedDocument, LinesDocument, isLinesFile
+from JSONProxy import JsonProxyModel
+from JSONSchema import SchemaValidator, compileSchema
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
 import QJSONModel
+import argparse
 import json
 import os
+import sys
 
-# QApplication Instance
-app = QApplication([])
-app.setApplicationDisplayName("JSON Wizard")
+# How long status bar messages stay up (ms)
+STATUS_TIMEOUT = 5000
+# Files from this size on are memory-mapped and indexed rather than
+# parsed, see JSONIndex
+INDEX_BACKEND_SIZE = 64 << 20
+# Previous versions kept as <file>.bak1 to .bakN when backups are on
+BACKUP_COUNT = 3
+# Duplicate keys listed in the warning before a save
+DUPLICATES_SHOWN = 10
+# Edits that can be undone, removed subtrees are held until then
+UNDO_LIMIT = 100
+# Files shown by the open and save dialogs, JSON Lines included
+FILE_FILTER = "JSON Files (*.json *.jsonl *.ndjson)"
+# Schema errors listed in the warning before a save
+SCHEMA_ERRORS_SHOWN = 10
+# Filtered trees with at most this many rows shown are expanded in full
+FILTER_EXPANDED_ROWS = 500
 
-# Set up general Style Sheet
-styleSheetFile = QFile("./qss/stylesheet.qss")
-styleSheetFile.open(QFile.ReadOnly | QFile.Text)
-styleSheet = QTextStream(styleSheetFile)
-app.setStyleSheet(styleSheet.readAll())
+@lru_cache(maxsize=None)
+def icon(fileName):
+    """QIcon of icons/`fileName`, read once however often it is used"""
+    return QIcon("./icons/" + fileName)
+
+class DocumentTab(object):
+    """A file open in a tab of JSONWizard, with its own view, models and undo history
+
+    `size` is the memory it holds as estimated by JSONCache. Once
+    `evicted`, its tree was dropped to stay within the memory budget and
+    it is loaded again when the tab is shown, from `snapshot` if the file
+    changed since.
+    """
+
+    def __init__(self, treeView, model, proxy, undoStack):
+        self.treeView = treeView
+        self.model = model
+        # Shown by treeView in its sort order and filtered, see JSONProxy
+        self.proxy = proxy
+        self.undoStack = undoStack
+        self.fileName = "NO FILE OPEN"
+        self.rootIsObject = True
+        self.isOpen = False
+        self.modified = False
+        # A worker reads or writes its tree
+        self.busy = False
+        self.size = 0
+        # fileStamp() of the file when the tree was last read from or written to it
+        self.fileStamp = None
+        self.evicted = False
+        self.snapshot = None
+        # Shown while evicted, it is loaded once the current worker is done
+        self.reloadPending = False
+        # Search index to build, from indexDocument if the file was
+        # indexed on load
+        self.needsIndex = False
+        self.indexDocument = None
+        # JSONSchema.SchemaValidator of the schema chosen for the file, it
+        # is run again whenever the tree is loaded
+        self.validator = None
+        self.schemaFile = None
+        self.needsValidation = False
+        # File the tree is compared with, see JSONDiff. It is compared
+        # again whenever the tree is loaded
+        self.comparisonFile = None
+        self.needsComparison = False
+        self.closeAfterSave = False
+
+    def canEvict(self) -> bool:
+        return self.isOpen and not self.modified and not self.evicted and not self.busy
 
 class JSONWizard(QMainWindow):
-    fileCurrentlyOpen = False
-    def __init__(self):
+    def __init__(self, memoryBudget=MEMORY_BUDGET):
         super().__init__()
-        
-        # Model and View Setup
-        self.treeView = QTreeView(self)
-        self.model = QJSONModel.QJsonModel()
-        self.model.dataChanged.connect(self.activateUnsavedChanges)
-        self.treeView.setModel(self.model)
-        self.treeView.setColumnWidth(0, 350)
+
+        # One tab per open file, see newTab()
+        self.tabWidget = QTabWidget(self)
+        self.tabWidget.setDocumentMode(True)
+        self.tabWidget.setTabsClosable(True)
+        # No tab bar while a single file is open
+        self.tabWidget.setTabBarAutoHide(True)
+        self.tabWidget.currentChanged.connect(self.currentTabChanged)
+        self.tabWidget.tabCloseRequested.connect(self.closeTab)
+        # Add Tab Widget to the Window
+        self.setCentralWidget(self.tabWidget)
+        self.tabs = []
+        # The current tab, and its models, view and undo stack
+        self.tab = None
+        self.model = None
+        self.proxy = None
+        self.treeView = None
+        self.undoStack = None
+        # Trees of the least recently used tabs are dropped once the open
+        # files hold more than memoryBudget bytes
+        self.cache = DocumentCache(memoryBudget)
+        # Undo and Redo act on the undo stack of the current tab
+        self.undoGroup = QUndoGroup(self)
         # Clear Selection Hotkey
         self.clearSelectionHotkey = QShortcut(QKeySequence(Qt.Key_Escape), self)
-        self.clearSelectionHotkey.activated.connect(self.treeView.clearSelection)
+        self.clearSelectionHotkey.activated.connect(self.clearSelection)
         self.clearSelectionHotkey.setEnabled(False)
-        # Add Tree View to the Window
-        self.setCentralWidget(self.treeView)
-        # Stores file name and path as a string
-        self.openFile = "NO FILE OPEN"
-        self.fileRootIsObject = True
         # Set up popup create file window
         self.createFileWindow = None
 
-        # Window Title and Size
+        # Window Title and Size, the icon is the application's
         self.setMinimumSize(980, 640)
-        appIcon = QIcon("./icons/appIcon.png")
-        self.setWindowIcon(appIcon)
 
         # Create Menu Bar
         self.setUpMenuBar()
@@ -53,26 +130,236 @@ class JSONWizard(QMainWindow):
         self.toolBar.setMovable(False)
         self.toolBar.setMinimumHeight(25)
         self.setUpToolBar()
+        self.setUpFindBar()
+        self.setUpFilterBar()
         self.addToolBar(self.toolBar)
 
-    def activateUnsavedChanges(self):
-        if not self.isWindowModified():
-            self.setWindowModified(True)
+        # Create Status Bar for background loads and saves
+        self.setUpStatusBar()
+        self.worker = None
+        self.workerThread = None
+        self.workerTab = None
+        self.workerFile = None
+        self.workerVerb = ""
+        self.closeAfterSave = False
+        # Closing was confirmed, the window closes once the worker stopped
+        self.closeWhenIdle = False
+        # (file name, root is object) of the files to open once the
+        # current worker is done
+        self.pendingFiles = []
+
+        self.newTab()
+
+    def newTab(self):
+        # Model and View Setup
+        treeView = QTreeView(self)
+        model = QJSONModel.QJsonModel(lazy=True)
+        # Undo and Redo, back to the saved state clears the modified flag
+        undoStack = QUndoStack(self)
+        undoStack.setUndoLimit(UNDO_LIMIT)
+        model.setUndoStack(undoStack)
+        self.undoGroup.addStack(undoStack)
+        # Sorted on a click on the header and filtered by the filter
+        # field, without reordering the tree
+        proxy = JsonProxyModel(self)
+        proxy.setSourceModel(model)
+        treeView.setModel(proxy)
+        treeView.setColumnWidth(0, 350)
+        # Every row is one line high, so the view lays out the visible
+        # rows only rather than measuring the whole tree
+        treeView.setUniformRowHeights(True)
+        # Shift/Ctrl-click to select several rows, e.g. to delete them at once
+        treeView.setSelectionMode(QAbstractItemView.ExtendedSelection)
+
+        header = treeView.header()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+
+        tab = DocumentTab(treeView, model, proxy, undoStack)
+        model.dataChanged.connect(lambda topLeft, bottomRight, roles: self.tabDataChanged(tab, roles))
+        header.sortIndicatorChanged.connect(lambda column, order: self.sortTab(tab, column, order))
+        undoStack.cleanChanged.connect(lambda clean: self.setTabModified(tab, not clean))
+        self.tabs.append(tab)
+        self.cache.add(tab)
+        self.tabWidget.addTab(treeView, "")
+        self.updateTabTitle(tab)
+        self.tabWidget.setCurrentWidget(treeView)
+        return tab
+
+    def removeTab(self, tab):
+        index = self.tabs.index(tab)
+        # Gone before the tab widget switches to another one
+        self.tabs.pop(index)
+        self.cache.remove(tab)
+        self.undoGroup.removeStack(tab.undoStack)
+        tab.model.dataChanged.disconnect()
+        tab.undoStack.cleanChanged.disconnect()
+        if tab.model.backing() is not None:
+            tab.model.backing().close()
+        # The view is deleted later, its tree goes right away
+        tab.model.setRootItem(QJSONModel.QJsonTreeItem())
+        self.tabWidget.removeTab(index)
+        tab.treeView.deleteLater()
+        tab.undoStack.deleteLater()
+        if not self.tabs:
+            self.newTab()
+
+    def currentTabChanged(self, index):
+        if index < 0:
+            # The last tab was closed, removeTab() opens a new one
+            return
+        previous = self.tab
+        if previous in self.tabs and previous.isOpen and not previous.evicted and not previous.busy:
+            # Its rows expanded since were built
+            self.measureTab(previous)
+
+        tab = self.tabs[index]
+        self.tab = tab
+        self.model = tab.model
+        self.proxy = tab.proxy
+        self.treeView = tab.treeView
+        self.undoStack = tab.undoStack
+        self.undoGroup.setActiveStack(tab.undoStack)
+        self.cache.touch(tab)
+        self.highlightMatches(self.findField.text())
+        self.filterRows(self.filterField.text())
+        if not tab.busy:
+            # The tree it is compared with may have been edited since
+            tab.model.refreshComparison()
+        self.updateActions()
+        if tab.evicted:
+            self.reloadTab(tab)
+        self.evictTabs()
+
+    def updateTabTitle(self, tab):
+        index = self.tabWidget.indexOf(tab.treeView)
+        title = os.path.basename(tab.fileName) if tab.isOpen else "No file open"
+        self.tabWidget.setTabText(index, title + "*" if tab.modified else title)
+        self.tabWidget.setTabToolTip(index, tab.fileName if tab.isOpen else "")
+
+    def updateActions(self):
+        # Editing, saving and finding need the tree of the current tab
+        available = self.tab.isOpen and not self.tab.evicted
+        for action in self.toolBar.actions():
+            action.setEnabled(available)
+        self.clearSelectionHotkey.setEnabled(available)
+        self.saveFileAction.setEnabled(available)
+        self.saveAsFileAction.setEnabled(available)
+        self.closeFileAction.setEnabled(self.tab.isOpen)
+        self.validateAction.setEnabled(available)
+        self.stopValidatingAction.setEnabled(self.tab.validator is not None)
+        self.compareFileAction.setEnabled(available)
+        self.compareSavedAction.setEnabled(available)
+        comparing = self.model.comparison() is not None
+        self.nextDifferenceAction.setEnabled(comparing)
+        self.previousDifferenceAction.setEnabled(comparing)
+        self.stopComparingAction.setEnabled(self.tab.comparisonFile is not None)
+        self.setWindowFilePath(self.tab.fileName if self.tab.isOpen else "")
+        self.setWindowModified(self.tab.modified)
+
+    def tabDataChanged(self, tab, roles):
+        # The marks of a validation or comparison are no edit
+        if not roles or Qt.EditRole in roles:
+            self.setTabModified(tab, True)
+
+    def setTabModified(self, tab, modified):
+        if modified:
+            # Its tree no longer matches the index of the file
+            tab.indexDocument = None
+        if modified == tab.modified:
+            return
+        tab.modified = modified
+        self.updateTabTitle(tab)
+        if tab is self.tab:
+            self.setWindowModified(modified)
+
+    def measureTab(self, tab):
+        model = tab.model
+        tab.size = documentSize(model.rootItem(), model.backing(), model.searchIndex(), model.contentHashes())
+
+    def evictTabs(self):
+        # Drop the trees of the least recently used tabs over the memory budget
+        for tab in self.cache.evictions():
+            self.evictTab(tab)
+
+    def evictTab(self, tab):
+        model = tab.model
+        backing = model.backing()
+        for other in self.tabs:
+            comparison = other.model.comparison()
+            if comparison is not None and comparison.otherHashes is model.contentHashes():
+                # Its tree is compared with, see startComparison()
+                return
+        if fileStamp(tab.fileName) != tab.fileStamp:
+            if isinstance(backing, (IndexedDocument, LinesDocument)):
+                # Its rows that were never built are only in the old file
+                return
+            # The file changed since, keep the tree as it is shown
+            tab.snapshot = takeSnapshot(model.rootItem())
+        # Its undo history goes with the tree
+        model.setRootItem(QJSONModel.QJsonTreeItem())
+        if backing is not None:
+            backing.close()
+        tab.indexDocument = None
+        tab.needsIndex = False
+        tab.needsValidation = False
+        tab.needsComparison = False
+        if tab.validator is not None:
+            tab.validator.clear()
+        tab.evicted = True
+        tab.size = len(tab.snapshot) if tab.snapshot is not None else 0
+
+    def reloadTab(self, tab):
+        if self.isBusy():
+            tab.reloadPending = True
+            return
+        tab.reloadPending = False
+        self.loadTab(tab, tab.fileName, "Reloading")
+
+    def clearSelection(self):
+        self.treeView.clearSelection()
+
+    def sortTab(self, tab, column, order):
+        # Ascending, descending, then back to the order of the file
+        proxy = tab.proxy
+        if (
+            column >= 0
+            and column == proxy.sortColumn()
+            and order == Qt.AscendingOrder
+            and proxy.sortOrder() == Qt.DescendingOrder
+        ):
+            tab.treeView.header().setSortIndicator(-1, Qt.AscendingOrder)
+            return
+        proxy.sort(column, order)
+
+    def undo(self):
+        # Not while a worker reads the tree
+        if not self.model.isEditable():
+            self.statusBar().showMessage("Please wait for the current file operation to finish", STATUS_TIMEOUT)
+            return
+        self.undoStack.undo()
+
+    def redo(self):
+        if not self.model.isEditable():
+            self.statusBar().showMessage("Please wait for the current file operation to finish", STATUS_TIMEOUT)
+            return
+        self.undoStack.redo()
     
     def setUpToolBar(self):
-        addValueAction = QAction(QIcon("./icons/add.png"), "Add New Value", self)
+        addValueAction = QAction(icon("add.png"), "Add New Value", self)
         addValueAction.triggered.connect(self.addItem)
         addValueAction.setDisabled(True)
         
-        addArrayAction = QAction(QIcon("./icons/addArray.png"), "Add New Array", self)
+        addArrayAction = QAction(icon("addArray.png"), "Add New Array", self)
         addArrayAction.triggered.connect(self.addArray)
         addArrayAction.setDisabled(True)
 
-        addObjectAction = QAction(QIcon("./icons/addObject.png"), "Add New Object", self)
+        addObjectAction = QAction(icon("addObject.png"), "Add New Object", self)
         addObjectAction.triggered.connect(self.addObject)
         addObjectAction.setDisabled(True)
 
-        removeAction = QAction(QIcon("./icons/remove.png"), "Remove Selected Item", self)
+        removeAction = QAction(icon("remove.png"), "Remove Selected Item", self)
         removeAction.setShortcut(QKeySequence(Qt.Key_Delete))
         removeAction.triggered.connect(self.removeSelectedItem)
         removeAction.setDisabled(True)
@@ -82,106 +369,806 @@ class JSONWizard(QMainWindow):
         self.toolBar.addAction(addObjectAction)
         self.toolBar.addAction(removeAction)
 
+    def setUpFindBar(self):
+        self.toolBar.addSeparator()
+        self.findField = QLineEdit(self)
+        self.findField.setPlaceholderText("Find key or value, or $.json.path or /json/pointer")
+        self.findField.setMaximumWidth(300)
+        self.findField.setClearButtonEnabled(True)
+        self.findField.returnPressed.connect(self.findNext)
+        self.findField.textChanged.connect(self.highlightMatches)
+        findFieldAction = self.toolBar.addWidget(self.findField)
+        findFieldAction.setDisabled(True)
+
+        findPreviousAction = QAction("Previous", self)
+        findPreviousAction.setShortcut(QKeySequence(Qt.SHIFT + Qt.Key_F3))
+        findPreviousAction.triggered.connect(self.findPrevious)
+        findPreviousAction.setDisabled(True)
+
+        findNextAction = QAction("Next", self)
+        findNextAction.setShortcut(QKeySequence(Qt.Key_F3))
+        findNextAction.triggered.connect(self.findNext)
+        findNextAction.setDisabled(True)
+
+        self.toolBar.addAction(findPreviousAction)
+        self.toolBar.addAction(findNextAction)
+
+        # Ctrl-F to type, Enter and Shift-Enter to go through the matches
+        findHotkey = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_F), self)
+        findHotkey.activated.connect(self.focusFindField)
+        findPreviousHotkey = QShortcut(QKeySequence(Qt.SHIFT + Qt.Key_Return), self.findField)
+        findPreviousHotkey.setContext(Qt.WidgetShortcut)
+        findPreviousHotkey.activated.connect(self.findPrevious)
+
+    def setUpFilterBar(self):
+        # Rows whose key, value and children do not contain the text are hidden
+        self.toolBar.addSeparator()
+        self.filterField = QLineEdit(self)
+        self.filterField.setPlaceholderText("Filter rows by key or value")
+        self.filterField.setMaximumWidth(200)
+        self.filterField.setClearButtonEnabled(True)
+        self.filterField.textChanged.connect(self.filterRows)
+        filterFieldAction = self.toolBar.addWidget(self.filterField)
+        filterFieldAction.setDisabled(True)
+
+    def setUpStatusBar(self):
+        self.progressBar = QProgressBar(self)
+        self.progressBar.setMaximumWidth(250)
+        self.progressBar.setMaximumHeight(18)
+        self.progressBar.hide()
+        self.cancelWorkButton = QPushButton("Cancel", self)
+        self.cancelWorkButton.clicked.connect(self.cancelBackgroundWork)
+        self.cancelWorkButton.hide()
+        self.statusBar().addPermanentWidget(self.progressBar)
+        self.statusBar().addPermanentWidget(self.cancelWorkButton)
+
     def setUpMenuBar(self):
         menu = self.menuBar()
         # Set Up File Menu
         file_menu = menu.addMenu("File")
         file_menu.setToolTipsVisible(False)
+        # Icons of the menu items are only read once the menu opens
+        file_menu.aboutToShow.connect(self.loadMenuIcons)
         # Menu Item for creating new JSON files
-        createFileAction = QAction(QIcon("./icons/JSONFile.png"), "Create new JSON file...", self)
+        createFileAction = QAction("Create new JSON file...", self)
         createFileAction.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_N))
         createFileAction.setShortcutVisibleInContextMenu(True)
         createFileAction.triggered.connect(self.openCreateFileMenu)
-        # Menu Item for opening existing JSON files
-        openFileAction = QAction(QIcon("./icons/JSONFile.png"), "Open existing JSON file...", self)
+        # Menu Item for opening existing JSON files, one tab each
+        openFileAction = QAction("Open existing JSON files...", self)
         openFileAction.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_O))
         openFileAction.setShortcutVisibleInContextMenu(True)
         openFileAction.triggered.connect(self.openFileExplorer)
         # Menu Item for Saving the Current File (with hotkey Ctrl-S)
-        self.saveFileAction = QAction(QIcon("./icons/SaveFile.png"), "Save current file...", self)
+        self.saveFileAction = QAction("Save current file...", self)
         self.saveFileAction.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_S))
         self.saveFileAction.setShortcutVisibleInContextMenu(True)
         self.saveFileAction.triggered.connect(self.saveCurrentFile)
         self.saveFileAction.setDisabled(True)
         # Menu Item for Saving the current file as a new file (with hotkey Shift-Ctrl-S)
-        self.saveAsFileAction = QAction(QIcon("./icons/SaveFile.png"), "Save current file as...", self)
+        self.saveAsFileAction = QAction("Save current file as...", self)
         self.saveAsFileAction.setShortcut(QKeySequence(Qt.CTRL + Qt.SHIFT + Qt.Key_S))
         self.saveAsFileAction.setShortcutVisibleInContextMenu(True)
         self.saveAsFileAction.triggered.connect(self.saveAsCurrentFile)
         self.saveAsFileAction.setDisabled(True)
+        # Menu Item for closing the current tab (with hotkey Ctrl-W)
+        self.closeFileAction = QAction("Close current file", self)
+        self.closeFileAction.setShortcut(QKeySequence.Close)
+        self.closeFileAction.setShortcutVisibleInContextMenu(True)
+        self.closeFileAction.triggered.connect(self.closeCurrentFile)
+        self.closeFileAction.setDisabled(True)
+        # Menu Item for saving without indentation and whitespace
+        self.compactOutputAction = QAction("Save compact JSON", self)
+        self.compactOutputAction.setCheckable(True)
+        # Menu Item for keeping the previous versions of saved files
+        self.keepBackupsAction = QAction("Keep backups of saved files", self)
+        self.keepBackupsAction.setCheckable(True)
+
+        self.pendingMenuIcons = [
+            (createFileAction, "JSONFile.png"),
+            (openFileAction, "JSONFile.png"),
+            (self.saveFileAction, "SaveFile.png"),
+            (self.saveAsFileAction, "SaveFile.png"),
+        ]
 
         # Add all menu items
         file_menu.addAction(createFileAction)
         file_menu.addAction(openFileAction)
         file_menu.addAction(self.saveFileAction)
         file_menu.addAction(self.saveAsFileAction)
+        file_menu.addAction(self.closeFileAction)
+        file_menu.addSeparator()
+        file_menu.addAction(self.compactOutputAction)
+        file_menu.addAction(self.keepBackupsAction)
+
+        # Set Up Edit Menu
+        edit_menu = menu.addMenu("Edit")
+        self.undoAction = QAction("Undo", self)
+        self.undoAction.setShortcut(QKeySequence.Undo)
+        self.undoAction.setShortcutVisibleInContextMenu(True)
+        self.undoAction.triggered.connect(self.undo)
+        self.undoAction.setDisabled(True)
+        self.undoGroup.canUndoChanged.connect(self.undoAction.setEnabled)
+        self.redoAction = QAction("Redo", self)
+        self.redoAction.setShortcut(QKeySequence.Redo)
+        self.redoAction.setShortcutVisibleInContextMenu(True)
+        self.redoAction.triggered.connect(self.redo)
+        self.redoAction.setDisabled(True)
+        self.undoGroup.canRedoChanged.connect(self.redoAction.setEnabled)
+        # Menu Items for checking the current file against a JSON Schema
+        self.validateAction = QAction("Validate against JSON schema...", self)
+        self.validateAction.triggered.connect(self.chooseSchema)
+        self.validateAction.setDisabled(True)
+        self.stopValidatingAction = QAction("Stop validating", self)
+        self.stopValidatingAction.triggered.connect(self.stopValidating)
+        self.stopValidatingAction.setDisabled(True)
+        # Menu Items for comparing the current file with another one, or
+        # with its saved version, and going through the differences
+        self.compareFileAction = QAction("Compare with file...", self)
+        self.compareFileAction.triggered.connect(self.chooseComparisonFile)
+        self.compareFileAction.setDisabled(True)
+        self.compareSavedAction = QAction("Compare with saved file", self)
+        self.compareSavedAction.triggered.connect(self.compareWithSavedFile)
+        self.compareSavedAction.setDisabled(True)
+        self.nextDifferenceAction = QAction("Next difference", self)
+        self.nextDifferenceAction.setShortcut(QKeySequence(Qt.Key_F8))
+        self.nextDifferenceAction.setShortcutVisibleInContextMenu(True)
+        self.nextDifferenceAction.triggered.connect(self.nextDifference)
+        self.nextDifferenceAction.setDisabled(True)
+        self.previousDifferenceAction = QAction("Previous difference", self)
+        self.previousDifferenceAction.setShortcut(QKeySequence(Qt.SHIFT + Qt.Key_F8))
+        self.previousDifferenceAction.setShortcutVisibleInContextMenu(True)
+        self.previousDifferenceAction.triggered.connect(self.previousDifference)
+        self.previousDifferenceAction.setDisabled(True)
+        self.stopComparingAction = QAction("Stop comparing", self)
+        self.stopComparingAction.triggered.connect(self.stopComparing)
+        self.stopComparingAction.setDisabled(True)
+        edit_menu.addAction(self.undoAction)
+        edit_menu.addAction(self.redoAction)
+        edit_menu.addSeparator()
+        edit_menu.addAction(self.validateAction)
+        edit_menu.addAction(self.stopValidatingAction)
+        edit_menu.addSeparator()
+        edit_menu.addAction(self.compareFileAction)
+        edit_menu.addAction(self.compareSavedAction)
+        edit_menu.addAction(self.nextDifferenceAction)
+        edit_menu.addAction(self.previousDifferenceAction)
+        edit_menu.addAction(self.stopComparingAction)
+
+    def loadMenuIcons(self):
+        for action, fileName in self.pendingMenuIcons:
+            action.setIcon(icon(fileName))
+        self.pendingMenuIcons = []
 
     def isFileOpen(self) -> bool:
-        return self.fileCurrentlyOpen
+        return self.tab.isOpen
 
     def openCreateFileMenu(self):
         if self.createFileWindow is None:
-            self.createFileWindow = FileCreationWindow()
+            self.createFileWindow = FileCreationWindow(self)
         self.createFileWindow.show()
     
     def openFileExplorer(self):
-        fileTuple = QFileDialog.getOpenFileName(self, "Open JSON File", "./", "JSON Files (*.json)")
-        fileNameAndPath = fileTuple[0]
-        fileNameAndPath.replace('\\','/')
-        self.openFile = fileNameAndPath
-        self.openNewFile()
-
-    def openNewFile(self):
-        if self.openFile != '':
-            with open(self.openFile, "r+") as file:
-                if os.stat(self.openFile).st_size != 0:
-                    firstChar = file.read(1)
-                    self.fileRootIsObject = firstChar == '{'
-                    file.seek(0)
-                    document = json.load(file)
-                else:
-                    if self.fileRootIsObject:
-                        document = {}
-                    else:
-                        document = []
-                    json.dump(document, file)
-                self.model.load(document)
-
-            self.fileCurrentlyOpen = True
-            for action in self.toolBar.actions():
-                action.setDisabled(False)
-            self.clearSelectionHotkey.setEnabled(True)
-            self.saveFileAction.setDisabled(False)
-            self.saveAsFileAction.setDisabled(False)
-            self.setWindowFilePath(self.openFile)
+        fileNames, _ = QFileDialog.getOpenFileNames(self, "Open JSON Files", "./", FILE_FILTER)
+        self.openFiles(fileNames)
+
+    def openFiles(self, fileNames):
+        # One tab each, loaded one after the other
+        for fileName in fileNames:
+            self.openNewFile(fileName)
+
+    def isBusy(self) -> bool:
+        return self.worker is not None
+
+    def openNewFile(self, fileName, rootIsObject=True):
+        if fileName == '':
+            return
+        # A file that is open already is shown rather than loaded twice
+        for tab in self.tabs:
+            if tab.isOpen and os.path.abspath(tab.fileName) == os.path.abspath(fileName):
+                self.tabWidget.setCurrentWidget(tab.treeView)
+                return
+        if self.isBusy():
+            # Opened by startNextWork()
+            self.pendingFiles.append((fileName, rootIsObject))
+            return
+
+        # In the current tab if it is still empty
+        tab = self.newTab() if self.tab.isOpen else self.tab
+        tab.rootIsObject = rootIsObject
+        self.loadTab(tab, fileName, "Opening")
+
+    def loadTab(self, tab, fileName, verb):
+        # An evicted tab is loaded from its snapshot if it has one
+        snapshot = tab.snapshot if tab.evicted else None
+        try:
+            size = os.path.getsize(fileName)
+        except OSError:
+            # Reported by the worker
+            size = 0
+
+        lines = isLinesFile(fileName)
+        if snapshot is None and (lines or size >= INDEX_BACKEND_SIZE):
+            # Only index the file, rows are decoded as they are expanded.
+            # JSON Lines files always are, their records are the lines
+            worker = IndexLoadWorker(fileName, lines)
+            worker.finished.connect(self.indexedFileLoaded)
+        else:
+            # Parse and build the tree off the GUI thread, the top-level
+            # rows show up while the rest of the file is still being read
+            worker = LoadWorker(fileName, tab.rootIsObject, snapshot)
+            worker.rootReady.connect(self.fileRootReady)
+            worker.itemsReady.connect(self.fileItemsReady)
+            worker.finished.connect(self.fileLoaded)
+        # Rows can be browsed as they come in, but edits would be taken
+        # for the file's own content once it is loaded
+        tab.model.setEditable(False)
+        self.runWorker(worker, tab, fileName, verb, cancellable=True)
+
+    def fileRootReady(self, rootItem):
+        self.workerTab.model.setRootItem(rootItem)
+
+    def fileItemsReady(self, items):
+        model = self.workerTab.model
+        model.appendItems(model.rootItem(), items)
+
+    def indexedFileLoaded(self, document):
+        tab = self.workerTab
+        tab.model.setRootItem(document.rootItem(), document)
+        self.fileLoaded(tab.model.rootItem())
+        if isinstance(document, IndexedDocument):
+            # The search index is built from the file's own index
+            tab.indexDocument = document
+
+    def fileLoaded(self, rootItem):
+        tab = self.workerTab
+        if tab.snapshot is None:
+            tab.fileStamp = fileStamp(self.workerFile)
+        tab.snapshot = None
+        tab.evicted = False
+        tab.fileName = self.workerFile
+        tab.rootIsObject = rootItem.type is dict
+        tab.isOpen = True
+        tab.needsIndex = True
+        if tab.validator is not None:
+            # Its results were about the previous tree
+            tab.validator.clear()
+            tab.needsValidation = True
+        if tab.comparisonFile is not None:
+            tab.needsComparison = True
+        self.setTabModified(tab, False)
+        self.updateTabTitle(tab)
+        self.measureTab(tab)
+        if tab is self.tab:
+            self.updateActions()
+        self.statusBar().showMessage("Opened " + tab.fileName, STATUS_TIMEOUT)
+        self.evictTabs()
         
     def saveCurrentFile(self):
-        if self.fileCurrentlyOpen:
-            saveStateDict = self.model.json()
-            with open(self.openFile, "w") as file:
-                json.dump(saveStateDict, file, indent=4)
-            self.setWindowModified(False)
+        if self.tab.isOpen:
+            self.startSave(self.tab)
 
     def saveAsCurrentFile(self):
-        if self.fileCurrentlyOpen:
-            saveStateDict = self.model.json()
-            fileTuple = QFileDialog.getSaveFileName(self, "Save JSON File", "./", "JSON Files (*.json)")
+        if self.tab.isOpen:
+            fileTuple = QFileDialog.getSaveFileName(self, "Save JSON File", "./", FILE_FILTER)
             fileNameAndPath = fileTuple[0]
             fileNameAndPath.replace('\\','/')
-            self.openFile = fileNameAndPath
-            with open(self.openFile, "w") as file:
-                json.dump(saveStateDict, file, indent=4)
-            self.setWindowModified(False)
+            if fileNameAndPath == '':
+                return
+            # The tab is renamed once the file was written, see fileSaved()
+            self.startSave(self.tab, fileNameAndPath)
+
+    def startSave(self, tab, fileName=None) -> bool:
+        # To the tab's own file unless `fileName` is given
+        fileName = fileName or tab.fileName
+        if self.isBusy():
+            self.statusBar().showMessage("Please wait for the current file operation to finish", STATUS_TIMEOUT)
+            return False
+        if not self.confirmDuplicateKeys(tab):
+            return False
+        if not self.confirmSchemaErrors(tab):
+            return False
+
+        # The worker writes straight from the tree, which must not
+        # change until it is done
+        tab.model.setReadOnly(True)
+        worker = SaveWorker(
+            fileName,
+            tab.model.rootItem(),
+            tab.model.backing(),
+            compact=self.compactOutputAction.isChecked(),
+            backups=BACKUP_COUNT if self.keepBackupsAction.isChecked() else 0,
+            lines=isLinesFile(fileName),
+        )
+        worker.finished.connect(self.fileSaved)
+        self.setTabModified(tab, False)
+        # The file on disk stays as it was until the save completes
+        self.runWorker(worker, tab, fileName, "Saving", cancellable=True)
+        return True
+
+    def confirmDuplicateKeys(self, tab) -> bool:
+        # Readers of the file keep one value per key, usually the last
+        duplicates = tab.model.duplicateKeys()
+        if not duplicates:
+            return True
+        lines = ["%s: \"%s\"" % (pointer(item) or "/", key) for item, key in duplicates[:DUPLICATES_SHOWN]]
+        if len(duplicates) > DUPLICATES_SHOWN:
+            lines.append("and %d more" % (len(duplicates) - DUPLICATES_SHOWN))
+        messageBox = QMessageBox()
+        confirmation = messageBox.question(
+            self,
+            "Duplicate Keys",
+            "These objects of %s have several entries with the same key, only one of them will be kept when the file is read again:\n\n%s\n\nSave anyway?" % (os.path.basename(tab.fileName), "\n".join(lines)),
+            messageBox.Yes | messageBox.No,
+        )
+        return confirmation == messageBox.Yes
+
+    def confirmSchemaErrors(self, tab) -> bool:
+        errors = tab.model.schemaErrors()
+        if not errors:
+            return True
+        lines = ["%s: %s" % (pointer(item) + path or "/", message) for item, path, message in errors[:SCHEMA_ERRORS_SHOWN]]
+        if len(errors) > SCHEMA_ERRORS_SHOWN:
+            lines.append("and %d more" % (len(errors) - SCHEMA_ERRORS_SHOWN))
+        messageBox = QMessageBox()
+        confirmation = messageBox.question(
+            self,
+            "Schema Errors",
+            "%s is not valid against %s:\n\n%s\n\nSave anyway?" % (os.path.basename(tab.fileName), os.path.basename(tab.schemaFile), "\n".join(lines)),
+            messageBox.Yes | messageBox.No,
+        )
+        return confirmation == messageBox.Yes
+
+    def fileSaved(self, result):
+        tab = self.workerTab
+        fileName, backing = result
+        if fileName != tab.fileName:
+            # Saved as a new file
+            tab.fileName = fileName
+            self.updateTabTitle(tab)
+            if tab is self.tab:
+                self.setWindowFilePath(fileName)
+        # Unchanged parts are copied from the saved file next time
+        tab.model.setBacking(backing)
+        tab.undoStack.setClean()
+        tab.fileStamp = fileStamp(fileName)
+        self.statusBar().showMessage("Saved " + fileName, STATUS_TIMEOUT)
+
+    def startIndexing(self, tab) -> bool:
+        if self.isBusy():
+            return False
+
+        document = tab.indexDocument
+        tab.indexDocument = None
+        tab.needsIndex = False
+        if document is None:
+            # The worker reads the whole tree
+            tab.model.setReadOnly(True)
+        else:
+            # The worker only reads the file, rows can still be expanded
+            tab.model.setEditable(False)
+        worker = SearchIndexWorker(tab.model.rootItem(), document)
+        worker.finished.connect(self.searchIndexBuilt)
+        self.runWorker(worker, tab, tab.fileName, "Indexing", cancellable=True)
+        return True
+
+    def searchIndexBuilt(self, result):
+        tab = self.workerTab
+        searchIndex, contentHashes = result
+        tab.model.setSearchIndex(searchIndex, contentHashes)
+        # Its rows are filtered from now on
+        if tab.proxy.setFilterText(tab.proxy.filterText()) and tab is self.tab:
+            self.expandFiltered()
+        self.measureTab(tab)
+        self.evictTabs()
+
+    def chooseSchema(self):
+        fileTuple = QFileDialog.getOpenFileName(self, "Open JSON Schema", "./", "JSON Schema Files (*.json)")
+        if fileTuple[0] == '':
+            return
+        try:
+            with open(fileTuple[0], encoding="utf-8-sig") as file:
+                schema = compileSchema(json.load(file))
+        except (OSError, ValueError) as error:
+            QMessageBox.warning(self, "Error", "Reading the schema %s failed:\n\n%s" % (fileTuple[0], error))
+            return
+
+        tab = self.tab
+        tab.model.setValidator(None)
+        tab.validator = SchemaValidator(schema)
+        tab.schemaFile = fileTuple[0]
+        tab.needsValidation = True
+        self.updateActions()
+        if not self.startValidation(tab):
+            self.statusBar().showMessage("The file will be validated once the current file operation is done", STATUS_TIMEOUT)
+
+    def startValidation(self, tab) -> bool:
+        if self.isBusy():
+            return False
+
+        tab.needsValidation = False
+        # The worker reads the whole tree, edits are then checked as they are made
+        tab.model.setReadOnly(True)
+        worker = ValidationWorker(tab.validator, tab.model.rootItem())
+        worker.finished.connect(self.schemaValidated)
+        self.runWorker(worker, tab, tab.fileName, "Validating", cancellable=True)
+        return True
+
+    def schemaValidated(self, errors):
+        tab = self.workerTab
+        tab.model.setValidator(tab.validator, errors)
+        if errors:
+            self.statusBar().showMessage("%d schema errors in %s" % (len(errors), tab.fileName), STATUS_TIMEOUT)
+        else:
+            self.statusBar().showMessage("%s is valid against %s" % (tab.fileName, tab.schemaFile), STATUS_TIMEOUT)
+
+    def stopValidating(self):
+        self.tab.model.setValidator(None)
+        self.tab.validator = None
+        self.tab.schemaFile = None
+        self.tab.needsValidation = False
+        self.updateActions()
+
+    def chooseComparisonFile(self):
+        fileTuple = QFileDialog.getOpenFileName(self, "Compare With", "./", FILE_FILTER)
+        if fileTuple[0] == '':
+            return
+        self.compareWith(self.tab, fileTuple[0])
+
+    def compareWithSavedFile(self):
+        self.compareWith(self.tab, self.tab.fileName)
+
+    def compareWith(self, tab, fileName):
+        tab.model.setComparison(None)
+        tab.treeView.viewport().update()
+        tab.comparisonFile = fileName
+        tab.needsComparison = True
+        self.updateActions()
+        if not self.startComparison(tab):
+            self.statusBar().showMessage("The files will be compared once the current file operation is done", STATUS_TIMEOUT)
+
+    def startComparison(self, tab) -> bool:
+        if self.isBusy():
+            return False
+        contentHashes = tab.model.contentHashes()
+        if contentHashes is None:
+            # Compared by startNextWork() once the tree is hashed
+            return self.startIndexing(tab)
+
+        tab.needsComparison = False
+        for other in self.tabs:
+            if (
+                other is not tab
+                and other.isOpen
+                and not other.modified
+                and other.model.contentHashes() is not None
+                and os.path.abspath(other.fileName) == os.path.abspath(tab.comparisonFile)
+                and fileStamp(other.fileName) == other.fileStamp
+            ):
+                # Open and hashed already, its tree is compared with
+                # rather than the file, and followed as it is edited
+                comparison = Comparison(
+                    contentHashes, other.model.contentHashes(), other.model.rootItem(), os.path.basename(other.fileName)
+                )
+                comparison.compare()
+                self.showComparison(tab, comparison)
+                return True
+
+        try:
+            size = os.path.getsize(tab.comparisonFile)
+        except OSError:
+            # Reported by the worker
+            size = 0
+        lines = isLinesFile(tab.comparisonFile)
+        # The worker only reads the hashes of the tree, rows can still be
+        # expanded
+        tab.model.setEditable(False)
+        worker = DiffWorker(contentHashes, tab.comparisonFile, indexed=not lines and size >= INDEX_BACKEND_SIZE, lines=lines)
+        worker.finished.connect(self.comparisonDone)
+        self.runWorker(worker, tab, tab.comparisonFile, "Comparing with", cancellable=True)
+        return True
+
+    def comparisonDone(self, comparison):
+        tab = self.workerTab
+        if tab.model.contentHashes() is not comparison.hashes:
+            # The tree was loaded again meanwhile
+            comparison.close()
+            return
+        self.showComparison(tab, comparison)
+
+    def showComparison(self, tab, comparison):
+        tab.model.setComparison(comparison)
+        tab.treeView.viewport().update()
+        if tab is self.tab:
+            self.updateActions()
+        count = len(comparison)
+        if not count:
+            message = "No differences with %s" % comparison.otherName
+        elif comparison.truncated:
+            message = "More than %d differences with %s, only the first ones are shown" % (count, comparison.otherName)
+        else:
+            message = "%d difference%s with %s" % (count, "" if count == 1 else "s", comparison.otherName)
+        # The root has no row to show it on
+        rootDifference = comparison.describe(0)
+        if rootDifference:
+            message += " (root: %s)" % rootDifference
+        self.statusBar().showMessage(message, STATUS_TIMEOUT)
+
+    def stopComparing(self):
+        self.tab.model.setComparison(None)
+        self.tab.treeView.viewport().update()
+        self.tab.comparisonFile = None
+        self.tab.needsComparison = False
+        self.updateActions()
+
+    def nextDifference(self):
+        self.showDifference(backwards=False)
+
+    def previousDifference(self):
+        self.showDifference(backwards=True)
+
+    def showDifference(self, backwards):
+        comparison = self.model.comparison()
+        if comparison is None:
+            return
+        paths = comparison.rowPaths()
+        if not paths:
+            # Nothing to step to, a root difference is only described
+            if len(comparison):
+                message = comparison.describe(0)
+            else:
+                message = "No differences with %s" % comparison.otherName
+            self.statusBar().showMessage(message, STATUS_TIMEOUT)
+            return
+
+        # From the current row on, wrapping around at the end
+        current = self.model.rowPathForIndex(self.proxy.mapToSource(self.treeView.currentIndex()))
+        if backwards:
+            position = (bisect_left(paths, current) - 1) % len(paths)
+        else:
+            position = bisect_right(paths, current) % len(paths)
+        sourceIndex = self.model.indexForRowPath(paths[position])
+        index = self.proxy.mapFromSource(sourceIndex)
+        if not index.isValid():
+            self.statusBar().showMessage("Difference %d of %d is hidden by the filter" % (position + 1, len(paths)), STATUS_TIMEOUT)
+            return
+        self.revealIndex(index)
+        self.treeView.setCurrentIndex(index)
+        node = self.model.searchIndex().nodeForItem(sourceIndex.internalPointer())
+        self.statusBar().showMessage("Difference %d of %d: %s" % (position + 1, len(paths), comparison.describe(node)), STATUS_TIMEOUT)
+
+    def focusFindField(self):
+        if self.tab.isOpen:
+            self.findField.setFocus()
+            self.findField.selectAll()
+
+    def highlightMatches(self, text):
+        self.model.setHighlight("" if isQuery(text) else text)
+        self.treeView.viewport().update()
+
+    def filterRows(self, text):
+        if self.proxy.setFilterText(text):
+            self.expandFiltered()
+        elif text and self.tab.isOpen and not self.tab.evicted and self.model.searchIndex() is None:
+            # Filtered once the search index is built
+            if not self.tab.needsIndex and not self.startIndexing(self.tab):
+                self.tab.needsIndex = True
+
+    def expandFiltered(self):
+        # A few matches are shown right away, with their parents
+        count = self.proxy.visibleCount()
+        if count is not None and count <= FILTER_EXPANDED_ROWS:
+            self.treeView.expandAll()
+
+    def findNext(self):
+        self.find(backwards=False)
+
+    def findPrevious(self):
+        self.find(backwards=True)
+
+    def find(self, backwards):
+        text = self.findField.text()
+        if not text or not self.tab.isOpen:
+            return
+        if isQuery(text):
+            self.selectQuery(text)
+            return
+        searchIndex = self.model.searchIndex()
+        if searchIndex is None:
+            # Not built yet, or its build was cancelled
+            if not self.startIndexing(self.tab):
+                self.statusBar().showMessage("Please wait for the current file operation to finish", STATUS_TIMEOUT)
+            return
+
+        # Search from the current row on, wrapping around at the end
+        currentIndex = self.treeView.currentIndex()
+        node = None
+        if currentIndex.isValid():
+            node = searchIndex.nodeForItem(currentIndex.internalPointer())
+        if backwards:
+            node = searchIndex.findPrevious(text, node)
+        else:
+            node = searchIndex.findNext(text, node)
+        if node is None:
+            self.statusBar().showMessage("No match for '%s'" % text, STATUS_TIMEOUT)
+            return
+
+        index = self.proxy.mapFromSource(self.model.indexForRowPath(searchIndex.rowPath(node)))
+        if not index.isValid():
+            self.statusBar().showMessage("The next match for '%s' is hidden by the filter" % text, STATUS_TIMEOUT)
+            return
+        self.revealIndex(index)
+        self.treeView.setCurrentIndex(index)
+
+    def selectQuery(self, expression):
+        # Select every match of a JSONPath or JSON Pointer expression
+        if self.model.isReadOnly():
+            self.statusBar().showMessage("Please wait for the current file operation to finish", STATUS_TIMEOUT)
+            return
+        try:
+            indexes = [self.proxy.mapFromSource(index) for index in self.model.query(expression)]
+            # Those hidden by the filter are left out
+            indexes = [index for index in indexes if index.isValid()]
+        except QueryError as error:
+            self.statusBar().showMessage(str(error), STATUS_TIMEOUT)
+            return
+        if not indexes:
+            self.statusBar().showMessage("No match for %s" % expression, STATUS_TIMEOUT)
+            return
+
+        selection = QItemSelection()
+        for index in indexes:
+            self.revealIndex(index)
+            selection.select(index, index)
+        self.treeView.setCurrentIndex(indexes[0])
+        self.treeView.selectionModel().select(selection, QItemSelectionModel.ClearAndSelect | QItemSelectionModel.Rows)
+        self.statusBar().showMessage("%d matches for %s" % (len(indexes), expression), STATUS_TIMEOUT)
+
+    def revealIndex(self, index):
+        # Expand the parents of `index` and scroll to it
+        parent = index.parent()
+        while parent.isValid():
+            self.treeView.expand(parent)
+            parent = parent.parent()
+        self.treeView.scrollTo(index)
+
+    def runWorker(self, worker, tab, fileName, verb, cancellable):
+        self.worker = worker
+        self.workerTab = tab
+        tab.busy = True
+        self.workerFile = fileName
+        self.workerVerb = verb
+        worker.progress.connect(self.showProgress)
+        worker.failed.connect(self.workFailed)
+        worker.cancelled.connect(self.workCancelled)
+        worker.done.connect(self.workDone)
+
+        self.progressBar.setRange(0, 0)
+        self.progressBar.show()
+        self.cancelWorkButton.setVisible(cancellable)
+        self.statusBar().showMessage("%s %s..." % (verb, fileName))
+        self.workerThread = startWorker(worker, self)
+
+    def showProgress(self, done, total):
+        if isinstance(self.worker, (SearchIndexWorker, ValidationWorker, DiffWorker)):
+            # In values rather than bytes
+            if total:
+                self.progressBar.setRange(0, 100)
+                self.progressBar.setValue(int(done * 100 / total))
+                message = "%s %s: %d of %d values" % (self.workerVerb, self.workerFile, done, total)
+            else:
+                message = "%s %s: %d values" % (self.workerVerb, self.workerFile, done)
+            self.statusBar().showMessage(message)
+            return
+
+        megabytes = done / (1 << 20)
+        if total:
+            self.progressBar.setRange(0, 100)
+            self.progressBar.setValue(int(done * 100 / total))
+            message = "%s %s: %.1f of %.1f MB read" % (self.workerVerb, self.workerFile, megabytes, total / (1 << 20))
+        else:
+            message = "%s %s: %.1f MB written" % (self.workerVerb, self.workerFile, megabytes)
+        self.statusBar().showMessage(message)
+
+    def cancelBackgroundWork(self):
+        if self.worker is not None:
+            self.worker.cancel()
+
+    def abandonWork(self):
+        # Undo what a failed or cancelled worker leaves behind
+        tab = self.workerTab
+        if isinstance(self.worker, SaveWorker):
+            self.setTabModified(tab, True)
+            tab.closeAfterSave = False
+            self.closeAfterSave = False
+        elif isinstance(self.worker, (LoadWorker, IndexLoadWorker)):
+            if tab.evicted or len(self.tabs) == 1:
+                # Without the rows read so far, an evicted tab is loaded
+                # again when it is shown next
+                tab.model.setRootItem(QJSONModel.QJsonTreeItem())
+            else:
+                self.removeTab(tab)
+        elif isinstance(self.worker, SearchIndexWorker):
+            # Not compared until the tree is hashed again
+            tab.needsComparison = False
+        elif isinstance(self.worker, DiffWorker):
+            tab.comparisonFile = None
+            if tab is self.tab:
+                self.updateActions()
+
+    def workFailed(self, message):
+        self.abandonWork()
+        QMessageBox.warning(self, "Error", "%s %s failed:\n\n%s" % (self.workerVerb, self.workerFile, message))
+
+    def workCancelled(self):
+        self.abandonWork()
+        self.statusBar().showMessage("%s %s cancelled" % (self.workerVerb, self.workerFile), STATUS_TIMEOUT)
+
+    def workDone(self):
+        tab = self.workerTab
+        thread = self.workerThread
+        self.worker = None
+        self.workerThread = None
+        self.workerTab = None
+        tab.busy = False
+        tab.model.setReadOnly(False)
+        tab.model.setEditable(True)
+        self.progressBar.hide()
+        self.cancelWorkButton.hide()
+        if tab.closeAfterSave:
+            tab.closeAfterSave = False
+            self.removeTab(tab)
+        if self.closeWhenIdle:
+            # Its event loop quit already, the thread ends right away
+            thread.wait()
+            self.close()
+            return
+        if self.closeAfterSave:
+            # Save the files with changes one after the other, then close
+            modified = [other for other in self.tabs if other.modified]
+            if not modified:
+                self.closeAfterSave = False
+                self.close()
+                return
+            if self.startSave(modified[0]):
+                return
+            self.closeAfterSave = False
+        self.startNextWork()
+
+    def startNextWork(self):
+        # Files waiting to be opened first, then the current tab if it was
+        # evicted, then the validations and the search indexes, those of
+        # the current tab first
+        while self.pendingFiles and not self.isBusy():
+            self.openNewFile(*self.pendingFiles.pop(0))
+        if self.isBusy():
+            return
+        if self.tab.reloadPending:
+            self.reloadTab(self.tab)
+            return
+        for tab in [self.tab] + self.tabs:
+            if tab.needsValidation:
+                self.startValidation(tab)
+                return
+        for tab in [self.tab] + self.tabs:
+            if tab.needsIndex:
+                self.startIndexing(tab)
+                return
+        for tab in [self.tab] + self.tabs:
+            if tab.needsComparison:
+                self.startComparison(tab)
+                return
     
     def addItem(self):
         # Get the currently selected object
         if len(self.treeView.selectedIndexes()) > 0:
             currentIndex = self.treeView.selectedIndexes()[0]
+            sourceIndex = self.proxy.mapToSource(currentIndex)
             typ = currentIndex.internalPointer().type
             if typ is dict or typ is list:
-                self.model.insertRow(currentIndex, str, currentIndex)
+                self.model.insertRow(sourceIndex, str, sourceIndex)
             else:
-                self.model.insertRow(currentIndex, str, currentIndex.parent())
+                self.model.insertRow(sourceIndex, str, sourceIndex.parent())
         # If none selected, use root
         else:
             currentIndex = None
@@ -191,19 +1178,19 @@ class JSONWizard(QMainWindow):
         
         if currentIndex:
             self.treeView.expand(currentIndex)
-        if not self.isWindowModified():
-            self.setWindowModified(True)
+        self.setTabModified(self.tab, True)
         self.treeView.clearSelection()
 
     def addArray(self):
         # Get the currently selected object
         if len(self.treeView.selectedIndexes()) > 0:
             currentIndex = self.treeView.selectedIndexes()[0]
+            sourceIndex = self.proxy.mapToSource(currentIndex)
             typ = currentIndex.internalPointer().type
             if typ is dict or typ is list:
-                self.model.insertRow(currentIndex, list, currentIndex)
+                self.model.insertRow(sourceIndex, list, sourceIndex)
             else:
-                self.model.insertRow(currentIndex, list, currentIndex.parent())
+                self.model.insertRow(sourceIndex, list, sourceIndex.parent())
         # If none selected, use root
         else:
             currentIndex = None
@@ -212,19 +1199,19 @@ class JSONWizard(QMainWindow):
 
         if currentIndex:
             self.treeView.expand(currentIndex)
-        if not self.isWindowModified():
-            self.setWindowModified(True)
+        self.setTabModified(self.tab, True)
         self.treeView.clearSelection()
 
     def addObject(self):
                 # Get the currently selected object
         if len(self.treeView.selectedIndexes()) > 0:
             currentIndex = self.treeView.selectedIndexes()[0]
+            sourceIndex = self.proxy.mapToSource(currentIndex)
             typ = currentIndex.internalPointer().type
             if typ is dict or typ is list:
-                self.model.insertRow(currentIndex, dict, currentIndex)
+                self.model.insertRow(sourceIndex, dict, sourceIndex)
             else:
-                self.model.insertRow(currentIndex, dict, currentIndex.parent())
+                self.model.insertRow(sourceIndex, dict, sourceIndex.parent())
         # If none selected, use root
         else:
             currentIndex = None
@@ -233,53 +1220,103 @@ class JSONWizard(QMainWindow):
 
         if currentIndex:
             self.treeView.expand(currentIndex)
-        if not self.isWindowModified():
-            self.setWindowModified(True)
+        self.setTabModified(self.tab, True)
         self.treeView.clearSelection()
 
     def removeSelectedItem(self):
-        # Get the currently selected object
-        currentIndex = self.treeView.currentIndex()
-        currentItem = self.treeView.model().data(currentIndex, Qt.EditRole)
-        # If the object has children, do a confirm deletion pop-up
-        if currentItem.childCount() > 0:
+        # Get the selected objects, one index per row
+        indexes = [index for index in self.treeView.selectedIndexes() if index.column() == 0]
+        if not indexes:
+            currentIndex = self.treeView.currentIndex()
+            if not currentIndex.isValid():
+                return
+            indexes = [currentIndex]
+        # If an object has children, do a confirm deletion pop-up
+        if any(index.internalPointer().hasChildren() for index in indexes):
+            if len(indexes) == 1:
+                question = "Are you sure you want to delete this item and all of its children?"
+            else:
+                question = "Are you sure you want to delete these %d items and all of their children?" % len(indexes)
             messageBox = QMessageBox()
-            confirmation = messageBox.question(self, "Delete Confirmation", "Are you sure you want to delete this item and all of its children?", messageBox.Yes | messageBox.No)
+            confirmation = messageBox.question(self, "Delete Confirmation", question, messageBox.Yes | messageBox.No)
             if confirmation == messageBox.No:
                 return
-        
-        self.model.removeRow(currentIndex.row(), currentIndex.parent())
-        if not self.isWindowModified():
-            self.setWindowModified(True)
+
+        # One pass and one signal pair per range of rows
+        self.model.removeIndexes([self.proxy.mapToSource(index) for index in indexes])
+        self.setTabModified(self.tab, True)
         self.treeView.clearSelection()
 
+    def askToSave(self, text):
+        mBox = QMessageBox(self)
+        mBox.setWindowTitle("Warning")
+        mBox.setText(text)
+        mBox.setInformativeText("Would you like to save your changes?")
+        mBox.setStandardButtons(QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel)
+        mBox.setDefaultButton(QMessageBox.Save)
+        return mBox.exec_()
+
+    def closeCurrentFile(self):
+        self.closeTab(self.tabs.index(self.tab))
+
+    def closeTab(self, index):
+        tab = self.tabs[index]
+        if tab.busy:
+            self.statusBar().showMessage("Please wait for the current file operation to finish", STATUS_TIMEOUT)
+            return
+        if tab.modified:
+            answer = self.askToSave("\n%s has unsaved changes!\n" % os.path.basename(tab.fileName))
+            if answer == QMessageBox.Save:
+                # Close once the background save is done
+                if self.startSave(tab):
+                    tab.closeAfterSave = True
+                return
+            if answer == QMessageBox.Cancel:
+                return
+        self.removeTab(tab)
+
     def closeEvent(self, event: QCloseEvent) -> None:
-        if self.isWindowModified():
-            mBox = QMessageBox(self)
-            mBox.setWindowTitle("Warning")
-            mBox.setText("\nThe currently open JSON File has unsaved changes!\n")
-            mBox.setInformativeText("Would you like to save your changes?")
-            mBox.setStandardButtons(QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel)
-            mBox.setDefaultButton(QMessageBox.Save)
-            answer = mBox.exec_()
+        modified = [tab for tab in self.tabs if tab.modified]
+        if self.closeWhenIdle:
+            event.accept()
+        elif modified:
+            if len(modified) == 1:
+                answer = self.askToSave("\n%s has unsaved changes!\n" % os.path.basename(modified[0].fileName))
+            else:
+                answer = self.askToSave("\n%d open JSON files have unsaved changes!\n" % len(modified))
             
             if answer == QMessageBox.Save:
-                self.saveCurrentFile()
-                event.accept()
+                # Close once the background saves are done
+                event.ignore()
+                if self.startSave(modified[0]):
+                    self.closeAfterSave = True
             elif answer == QMessageBox.Cancel:
                 event.ignore()
-                mBox.close()
             else:
                 event.accept()
         else:
             event.accept()
 
-mainPage = JSONWizard()
-mainPage.show()
+        if event.isAccepted():
+            self.pendingFiles = []
+            for tab in self.tabs:
+                tab.needsIndex = False
+                tab.needsValidation = False
+                tab.needsComparison = False
+                tab.reloadPending = False
+        if event.isAccepted() and self.isBusy():
+            # Let a running save finish, drop a running load or indexing,
+            # workDone() closes the window once the worker stopped
+            event.ignore()
+            self.closeWhenIdle = True
+            if isinstance(self.worker, (LoadWorker, IndexLoadWorker, SearchIndexWorker, ValidationWorker, DiffWorker)):
+                self.cancelBackgroundWork()
 
 class FileCreationWindow(QWidget):
-    def __init__(self):
+    def __init__(self, mainWindow):
         super().__init__()
+        # JSONWizard window the new file is opened in
+        self.mainWindow = mainWindow
         # Local Variables
         minTextFieldHeight = 25
         buttonWidth = 150
@@ -288,8 +1325,6 @@ class FileCreationWindow(QWidget):
         self.setWindowTitle("Create New JSON File")
         self.setFixedSize(490, 360)
         self.setWindowModality(Qt.ApplicationModal)
-        appIcon = QIcon("./icons/appIcon.png")
-        self.setWindowIcon(appIcon)
 
         # Create UI Elements and add them to the Form Layout
         layout = QFormLayout()
@@ -374,6 +1409,9 @@ class FileCreationWindow(QWidget):
     
     # Function to validate entered file name and selected path
     def validateInput(self):
+        # Imported on first use rather than at startup
+        from pathvalidate import ValidationError, validate_filename
+
         fileName = self.fileNameField.text()
         path = self.filePathField.text()
         if len(fileName) == 0:
@@ -406,9 +1444,7 @@ class FileCreationWindow(QWidget):
             self.errorLabel.show()
         else:
             fileNameAndPath.replace('\\','/')
-            mainPage.openFile = fileNameAndPath
-            mainPage.fileRootIsObject = not self.rootSelectorToggle.isChecked()
-            mainPage.openNewFile()
+            self.mainWindow.openNewFile(fileNameAndPath, not self.rootSelectorToggle.isChecked())
             self.close()
             
     # Function to open screen where user can select the directory for their new file
@@ -426,6 +1462,42 @@ class FileCreationWindow(QWidget):
         self.fileNameField.clear()
         self.filePathField.clear()
         self.rootSelectorToggle.setChecked(False)
-    
-# Start App Loop, Code Below this will not execute until application is exited
-app.exec_()
+
+def createApplication(argv):
+    # QApplication Instance
+    app = QApplication(argv)
+    app.setApplicationDisplayName("JSON Wizard")
+    # Shared by every window
+    app.setWindowIcon(icon("appIcon.png"))
+
+    # Set up general Style Sheet
+    styleSheetFile = QFile("./qss/stylesheet.qss")
+    styleSheetFile.open(QFile.ReadOnly | QFile.Text)
+    styleSheet = QTextStream(styleSheetFile)
+    app.setStyleSheet(styleSheet.readAll())
+    return app
+
+def main():
+    app = createApplication(sys.argv)
+    parser = argparse.ArgumentParser(prog="JSONWizard", description="Browse and edit JSON files.")
+    parser.add_argument("files", nargs="*", metavar="FILE", help="JSON files to open, one tab each")
+    parser.add_argument(
+        "--memory-budget", type=int, default=MEMORY_BUDGET >> 20, metavar="MB",
+        help="memory for the trees of all open files, past it the least recently used ones are dropped until their tab is shown again (default: %(default)d)",
+    )
+    # Without the options Qt took for itself
+    options = parser.parse_args(app.arguments()[1:])
+
+    mainPage = JSONWizard(options.memory_budget << 20)
+    mainPage.show()
+    # Files given on the command line, e.g. by the file manager, are
+    # opened once the window is up, they then load in the background
+    if options.files:
+        fileNames = [os.path.abspath(fileName) for fileName in options.files]
+        QTimer.singleShot(0, lambda: mainPage.openFiles(fileNames))
+
+    # Start App Loop, returns once the application is exited
+    return app.exec_()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+Background workers for JSON Wizard
+
+File loading and saving can take a long time on large documents, so they
+run on a QThread and report back through signals. Workers are created on
+the GUI thread and started with startWorker(), which moves them to a new
+thread and tears that thread down once they are done.
+"""
+from PySide2.QtCore import QObject, QThread, Qt, Signal
+from JSONTree import QJsonTreeItem
+from JSONStream import StreamParser, TreeBuilder, saveTree
+from JSONIndex import IndexedDocument, LinesDocument
+from JSONSearch import SearchIndex
+from JSONDiff import Comparison, ContentHashes
+import codecs
+import io
+import json
+import os
+import time
+import zlib
+
+# Bytes read and parsed at once while loading a file, kept small so the
+# first rows show up right away
+READ_CHUNK_SIZE = 1 << 16
+# The first chunk is smaller still, it holds about a screen of rows
+FIRST_CHUNK_SIZE = 1 << 14
+# Minimum time between two batches of loaded items (s)
+ITEMS_INTERVAL = 0.1
+
+class WorkerCancelled(Exception):
+    pass
+
+class Worker(QObject):
+    # Bytes processed so far, total bytes (0 if unknown)
+    progress = Signal(object, object)
+    # Result of the work
+    finished = Signal(object)
+    # Error message
+    failed = Signal(str)
+    cancelled = Signal()
+    # Emitted last, whatever the outcome
+    done = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self._cancelRequested = False
+
+    def cancel(self):
+        # Plain attribute write, safe to call from the GUI thread
+        self._cancelRequested = True
+
+    def checkCancelled(self):
+        if self._cancelRequested:
+            raise WorkerCancelled()
+
+    def run(self):
+        try:
+            result = self.work()
+        except WorkerCancelled:
+            self.cancelled.emit()
+        except Exception as error:
+            # Whatever went wrong, the window must not stay busy
+            self.failed.emit(str(error) or type(error).__name__)
+        else:
+            self.finished.emit(result)
+        finally:
+            self.done.emit()
+
+    def work(self):
+        raise NotImplementedError
+
+class LoadWorker(Worker):
+    """Stream a JSON file into an item tree
+
+    The file is parsed chunk by chunk with a StreamParser. The root item
+    is sent through `rootReady` as soon as its type is known, then the
+    finished children of the root follow in batches through
+    `itemsReady`, for QJsonModel.appendItems(). The root item is also
+    the result of the worker. Empty files are initialised with an empty
+    object or array, depending on `rootIsObject`. With a `snapshot`,
+    see JSONCache.takeSnapshot(), the tree is read from it instead of
+    the file.
+    """
+    # Root QJsonTreeItem, without children
+    rootReady = Signal(object)
+    # List of finished QJsonTreeItem children of the root
+    itemsReady = Signal(object)
+
+    def __init__(self, fileName, rootIsObject=True, snapshot=None):
+        super().__init__()
+        self.fileName = fileName
+        self.rootIsObject = rootIsObject
+        self.snapshot = snapshot
+
+    def work(self):
+        if self.snapshot is not None:
+            data = zlib.decompress(self.snapshot)
+            return self.parse(io.BytesIO(data), len(data))
+
+        total = os.stat(self.fileName).st_size
+        if total == 0:
+            document = {} if self.rootIsObject else []
+            with open(self.fileName, "w") as file:
+                json.dump(document, file)
+            rootItem = QJsonTreeItem.load(document)
+            rootItem.type = type(document)
+            self.rootReady.emit(rootItem)
+            return rootItem
+
+        with open(self.fileName, "rb") as file:
+            return self.parse(file, total)
+
+    def parse(self, file, total):
+        """Build the tree from the `total` bytes of a binary file object"""
+        builder = TreeBuilder()
+        parser = StreamParser(builder)
+        decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        rootItem = None
+        lastBatch = 0
+        done = 0
+        while True:
+            self.checkCancelled()
+            chunk = file.read(READ_CHUNK_SIZE if done else FIRST_CHUNK_SIZE)
+            parser.feed(decoder.decode(chunk, not chunk))
+            if not chunk:
+                break
+            done += len(chunk)
+
+            if rootItem is None and builder.root is not None:
+                rootItem = builder.root
+                self.rootReady.emit(rootItem)
+            now = time.monotonic()
+            if rootItem is not None and now - lastBatch >= ITEMS_INTERVAL:
+                self.itemsReady.emit(builder.takeItems())
+                self.progress.emit(done, total)
+                lastBatch = now
+        parser.close()
+
+        if rootItem is None:
+            rootItem = builder.root
+            self.rootReady.emit(rootItem)
+        self.itemsReady.emit(builder.takeItems())
+        self.progress.emit(done, total)
+        return rootItem
+
+class IndexLoadWorker(Worker):
+    """Map a JSON file into memory and index it, see JSONIndex
+
+    The result is the IndexedDocument, or the LinesDocument of a JSON
+    Lines file if `lines` is set, build the tree from its rootItem() on
+    the GUI thread.
+    """
+
+    def __init__(self, fileName, lines=False):
+        super().__init__()
+        self.fileName = fileName
+        self.lines = lines
+
+    def work(self):
+        total = os.stat(self.fileName).st_size
+        documentType = LinesDocument if self.lines else IndexedDocument
+        return documentType(
+            self.fileName,
+            progress=lambda done: self.progress.emit(done, total),
+            checkCancelled=self.checkCancelled,
+        )
+
+class SaveWorker(Worker):
+    """Write an item tree into a file, see JSONStream.saveTree()
+
+    The tree is read on the worker thread, so the model must stay
+    read-only until the worker is done, see QJsonModel.setReadOnly().
+
+    Whatever did not change since the `backing` file (see JSONIndex) was
+    written is copied from it. The saved file becomes the new backing,
+    the result of the worker is the file name and the backing, for
+    QJsonModel.setBacking(). With `lines`, the root array is written as
+    JSON Lines.
+    """
+
+    def __init__(self, fileName, rootItem, backing=None, indent=4, compact=False, backups=0, lines=False):
+        super().__init__()
+        self.fileName = fileName
+        self.rootItem = rootItem
+        self.backing = backing
+        self.indent = indent
+        self.compact = compact
+        self.backups = backups
+        self.lines = lines
+
+    def work(self):
+        self.backing = saveTree(
+            self.fileName,
+            self.rootItem,
+            self.backing,
+            self.indent,
+            self.compact,
+            self.backups,
+            progress=self.written,
+            checkCancelled=self.checkCancelled,
+            lines=self.lines,
+        )
+        return self.fileName, self.backing
+
+    def written(self, done):
+        self.checkCancelled()
+        self.progress.emit(done, 0)
+
+class SearchIndexWorker(Worker):
+    """Build the JSONSearch.SearchIndex of a tree, and its JSONDiff.ContentHashes
+
+    With the IndexedDocument the tree was just built from, both are
+    built from the document's StructuralIndex and the tree is not read:
+    it may be browsed meanwhile, but not edited, see
+    QJsonModel.setEditable(). Otherwise the whole tree is read and the
+    model must stay read-only until the worker is done. The result is
+    the (index, hashes) pair, for QJsonModel.setSearchIndex(). Progress
+    is in values rather than bytes, each value is counted twice.
+    """
+
+    def __init__(self, rootItem, document=None):
+        super().__init__()
+        self.rootItem = rootItem
+        self.document = document
+
+    def work(self):
+        if self.document is not None:
+            size = len(self.document.index)
+            searchIndex = SearchIndex.fromDocument(
+                self.document,
+                progress=lambda done: self.progress.emit(done, 2 * size),
+                checkCancelled=self.checkCancelled,
+            )
+            contentHashes = ContentHashes.fromDocument(
+                searchIndex,
+                self.document,
+                progress=lambda done: self.progress.emit(size + done, 2 * size),
+                checkCancelled=self.checkCancelled,
+            )
+            return searchIndex, contentHashes
+
+        searchIndex = SearchIndex.fromTree(
+            self.rootItem,
+            progress=lambda done: self.progress.emit(done, 0),
+            checkCancelled=self.checkCancelled,
+        )
+        contentHashes = ContentHashes.fromTree(
+            searchIndex,
+            self.rootItem,
+            progress=lambda done: self.progress.emit(len(searchIndex) + done, 0),
+            checkCancelled=self.checkCancelled,
+        )
+        return searchIndex, contentHashes
+
+class DiffWorker(Worker):
+    """Compare a tree with a file, see JSONDiff.Comparison
+
+    The tree is only read through its `contentHashes`, it may be browsed
+    meanwhile, but not edited. The file is hashed first: memory-mapped
+    and indexed with `indexed`, as a tab does with large files, parsed
+    otherwise, line by line with `lines`. The result is the Comparison.
+    Progress is in values rather than bytes.
+    """
+
+    def __init__(self, contentHashes, fileName, indexed=False, lines=False):
+        super().__init__()
+        self.contentHashes = contentHashes
+        self.fileName = fileName
+        self.indexed = indexed
+        self.lines = lines
+
+    def work(self):
+        progress = lambda done: self.progress.emit(done, 0)
+        if self.indexed:
+            other = IndexedDocument(self.fileName, checkCancelled=self.checkCancelled)
+            try:
+                searchIndex = SearchIndex.fromDocument(other, progress, self.checkCancelled)
+                otherHashes = ContentHashes.fromDocument(searchIndex, other, progress, self.checkCancelled)
+            except BaseException:
+                other.close()
+                raise
+        else:
+            with open(self.fileName, "rb") as file:
+                if self.lines:
+                    other = [json.loads(line) for line in file if line.strip()]
+                else:
+                    other = json.load(file)
+            searchIndex = SearchIndex.fromTree(other, progress, self.checkCancelled)
+            otherHashes = ContentHashes.fromTree(searchIndex, other, progress, self.checkCancelled)
+
+        comparison = Comparison(self.contentHashes, otherHashes, other, os.path.basename(self.fileName))
+        try:
+            comparison.compare(self.checkCancelled)
+        except BaseException:
+            comparison.close()
+            raise
+        return comparison
+
+class ValidationWorker(Worker):
+    """Validate a tree with a JSONSchema.SchemaValidator
+
+    The whole document is read, built or not, so the model must stay
+    read-only until the worker is done. The result is the list of
+    errors, the validator keeps what it needs to check edits later.
+    Progress is in values rather than bytes.
+    """
+
+    def __init__(self, validator, rootItem):
+        super().__init__()
+        self.validator = validator
+        self.rootItem = rootItem
+
+    def work(self):
+        return self.validator.validate(
+            self.rootItem,
+            progress=lambda done: self.progress.emit(done, 0),
+            checkCancelled=self.checkCancelled,
+        )
+
+def startWorker(worker, parent=None):
+    """Run `worker` on a new thread
+
+    Connect to the worker's signals before calling this. Returns the
+    thread, which quits once the worker is done.
+    """
+    thread = QThread(parent)
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    # Straight from the worker's thread, the GUI thread may be waiting
+    worker.done.connect(thread.quit, Qt.DirectConnection)
+    worker.done.connect(worker.deleteLater)
+    thread.finished.connect(thread.deleteLater)
+    thread.start()
+    return thread
@@ -9,10 +9,13 @@ Requires https://github.com/mottosso/Qt.py
 Changes:
     This module differs from the C++ version in the following ways.
 
-    1. Setters and getters are replaced by Python properties
+    1. Setters and getters are replaced by plain, slotted attributes
     2. Objects are sorted by default, disabled via load(sort=False)
     3. load() takes a Python dictionary as opposed to
        a string or file handle.
+    4. Containers can be materialized lazily, via load(lazy=True),
+       in which case child items are only built once a view asks
+       for them (see QJsonModel.canFetchMore/fetchMore).
 
         - To load from a string, use built-in `json.loads()`
             >>> import json
@@ -25,98 +28,81 @@ Changes:
               ...    document = json.load(f)
               ...    model.load(document)
 """
-from PySide2 import QtCore
-
-class QJsonTreeItem(object):
-    def __init__(self, parent=None):
-        self._parent = parent
-
-        self._key = ""
-        self._value = ""
-        self._type = None
-        self._children = list()
-
-    def appendChild(self, item):
-        self._children.append(item)
-    
-    def removeChild(self, item):
-        self._children.remove(item)
-
-    def child(self, row):
-        return self._children[row]
-
-    def parent(self):
-        return self._parent
-
-    def childCount(self):
-        return len(self._children)
-
-    def row(self):
-        return (
-            self._parent._children.index(self)
-            if self._parent else 0
-        )
-    
-    @property
-    def key(self):
-        return self._key
-
-    @key.setter
-    def key(self, key):
-        self._key = key
-
-    @property
-    def value(self):
-        return self._value
-
-    @value.setter
-    def value(self, value):
-        self._value = value
-
-    @property
-    def type(self):
-        return self._type
-
-    @type.setter
-    def type(self, typ):
-        self._type = typ
-
-    @classmethod
-    def load(self, value, parent=None, sort=False):
-        rootItem = QJsonTreeItem(parent)
-        rootItem.key = "root"
-
-        if isinstance(value, dict):
-            items = (
-                sorted(value.items())
-                if sort else value.items()
-            )
-
-            for key, value in items:
-                child = self.load(value, rootItem)
-                child.key = key
-                child.type = type(value)
-                rootItem.appendChild(child)
-
-        elif isinstance(value, list):
-            for index, value in enumerate(value):
-                child = self.load(value, rootItem)
-                child.key = index
-                child.type = type(value)
-                rootItem.appendChild(child)
-
-        else:
-            rootItem.value = value
-            rootItem.type = type(value)
-
-        return rootItem
+from PySide2 import QtCore, QtGui
+from JSONDiff import ADDED, CHANGED, REMOVED
+from JSONQuery import compileQuery
+from JSONSchema import errorText
+from JSONSearch import valueText
+from JSONTree import FETCH_BATCH_SIZE, QJsonTreeItem, findDuplicateKeys, parseValue, toPython
+from JSONUndo import EditCommand, InsertCommand, RemoveCommand
+
+# Background of the cells matching the highlighted text
+HIGHLIGHT_COLOR = QtGui.QColor(255, 236, 139)
+# Decoration of the rows with schema errors, and of the rows holding them
+ERROR_COLOR = QtGui.QColor(220, 50, 47)
+NESTED_ERROR_COLOR = QtGui.QColor(240, 170, 160)
+# Schema errors listed in the tooltip of a row
+ERRORS_SHOWN = 10
+# Background of the rows that differ from the compared document, by
+# JSONDiff kind, and decoration of the rows holding them
+DIFFERENCE_COLORS = {
+    CHANGED: QtGui.QColor(255, 214, 153),
+    ADDED: QtGui.QColor(198, 239, 206),
+    REMOVED: QtGui.QColor(255, 199, 206),
+}
+NESTED_DIFFERENCE_COLOR = QtGui.QColor(110, 150, 220)
+
+# Longer keys and strings are cut to this many characters for display,
+# the editor still gets the whole text
+DISPLAY_LENGTH = 256
+# Cut display strings kept per column before the cache is emptied
+DISPLAY_CACHE_SIZE = 1 << 12
+
+# Looked up once, data() and flags() are called for every cell painted
+_DISPLAY_ROLE = QtCore.Qt.DisplayRole
+_EDIT_ROLE = QtCore.Qt.EditRole
+_BACKGROUND_ROLE = QtCore.Qt.BackgroundRole
+_DECORATION_ROLE = QtCore.Qt.DecorationRole
+_TOOLTIP_ROLE = QtCore.Qt.ToolTipRole
+_READ_ONLY_FLAGS = QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEnabled
+_EDITABLE_FLAGS = _READ_ONLY_FLAGS | QtCore.Qt.ItemIsEditable
 
 class QJsonModel(QtCore.QAbstractItemModel):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, lazy=False):
         super(QJsonModel, self).__init__(parent)
 
         self._rootItem = QJsonTreeItem()
         self._headers = ("Key", "Value")
+        self._lazy = lazy
+        # File the document was loaded from and is spliced from on
+        # save, see JSONIndex.IndexedDocument
+        self._backing = None
+        # Set while a background worker reads the tree
+        self._readOnly = False
+        # Set while rows are being fetched, see rowCount()
+        self._fetching = False
+        # Cleared while a background worker reads the backing file, the
+        # tree may still be browsed but not edited
+        self._editable = True
+        # JSONSearch.SearchIndex of the document and the
+        # JSONDiff.ContentHashes following it, kept up to date
+        self._searchIndex = None
+        self._contentHashes = None
+        # JSONDiff.Comparison with another document, refreshed after edits
+        self._comparison = None
+        # Lowercased text whose cells are highlighted
+        self._highlight = ""
+        # JSONSchema.SchemaValidator of the document, kept up to date
+        self._validator = None
+        # Its errors, the error texts by item and the items holding them
+        self._schemaErrors = []
+        self._errorTexts = {}
+        self._errorParents = set()
+        # Cut display strings of long keys and values, by item
+        self._displayKeys = {}
+        self._displayValues = {}
+        # QUndoStack the edits are recorded on, see JSONUndo
+        self._undoStack = None
 
     def clear(self):
         self.load({})
@@ -130,20 +116,22 @@ class QJsonModel(QtCore.QAbstractItemModel):
         if currentIndex:
             row = currentIndex.row()
 
-        if count <= 0 or row < 0:
+        if count <= 0 or row < 0 or not self.isEditable():
             return False
 
-        self.beginInsertRows(parent, row, row + count - 1)
-
         parentItem = self.data(parent, QtCore.Qt.EditRole)
         
+        # New items go at `row` next to a value, after the last entry of a
+        # container they are added to
         if not currentIndex:
             parentItem = self._rootItem
+            row = None
         elif not parentItem:
             currentItem = self.data(currentIndex, QtCore.Qt.EditRole)
             if currentItem:
                 if currentItem.type is list or currentItem.type is dict:
                     parentItem = currentItem
+                    row = None
                 else:
                     parentItem = self._rootItem                
         else:
@@ -152,49 +140,35 @@ class QJsonModel(QtCore.QAbstractItemModel):
             if currentItem:
                 if currentItem.type is list or currentItem.type is dict:
                     parentItem = currentItem
+                    row = None
+
+        items = []
+        for _ in range(count):
+            newItem = QJsonTreeItem(parentItem)
+            newItem.type = itemType
+
+            if parentItem.type is dict:
+                if itemType is list:
+                    newItem.key = "**UNNAMED ARRAY**"
+                elif itemType is dict:
+                    newItem.key = "**UNNAMED OBJECT**"
+                else:
+                    newItem.key = "**KEY**"
+            if itemType is str:
+                newItem.value = "**VALUE**"
+            items.append(newItem)
 
-        newItem = QJsonTreeItem(parentItem)
-        newItem.type = itemType
-
-        if parentItem.type is list:
-            newItem.key = parentItem.childCount()
-        elif parentItem.type is dict:
-            if itemType is list:
-                newItem.key = "**UNNAMED ARRAY**"
-            elif itemType is dict:
-                newItem.key = "**UNNAMED OBJECT**"
-            else:
-                newItem.key = "**KEY**"
-        if itemType is str:
-            newItem.value = "**VALUE**"
-
-        parentItem.appendChild(newItem)
-
-        self.endInsertRows()
-
-        return True
+        return self.insertItems(parentItem, row, items)
 
     def removeRows(self, row: int, count: int, parent: QtCore.QModelIndex = ...) -> bool:
-        if count <= 0 or row < 0 or (row + count) > self.rowCount(parent):
+        if count <= 0 or row < 0 or (row + count) > self.rowCount(parent) or not self.isEditable():
             return False
         
-        self.beginRemoveRows(parent, row, row + count - 1)
-        
         parentItem = self.data(parent, QtCore.Qt.EditRole)
         if not parentItem:
             parentItem = self._rootItem
 
-        for n in range(row, row + count):
-            parentItem.removeChild(parentItem.child(n))
-        if parentItem.type is list:
-            for n in range(row + count - 1, parentItem.childCount()):
-                currentKey = parentItem.child(n).key
-                parentItem.child(n).key = currentKey - count
-
-
-        self.endRemoveRows()
-
-        return True
+        return self.removeItems(parentItem, range(row, row + count)) > 0
 
     def load(self, document):
         """Load from dictionary
@@ -209,14 +183,301 @@ class QJsonModel(QtCore.QAbstractItemModel):
             "not %s" % type(document)
         )
 
-        self.beginResetModel()
+        rootItem = QJsonTreeItem.load(document, lazy=self._lazy)
+        rootItem.type = type(document)
+        self.setRootItem(rootItem)
 
-        self._rootItem = QJsonTreeItem.load(document)
-        self._rootItem.type = type(document)
+        return True
 
+    def rootItem(self):
+        return self._rootItem
+
+    def setRootItem(self, rootItem, backing=None):
+        """Replace the whole tree in a single model reset
+
+        Arguments:
+            rootItem (QJsonTreeItem): Root of a tree built elsewhere,
+                e.g. by QJsonTreeItem.load() on a worker thread
+            backing (JSONIndex.IndexedDocument, optional): File the
+                tree's lazy containers are read from
+
+        """
+
+        self.beginResetModel()
+        self._rootItem = rootItem
+        self._backing = backing
+        self._searchIndex = None
+        self._contentHashes = None
+        self.setComparison(None)
+        self._validator = None
+        self._showSchemaErrors([])
+        self._displayKeys.clear()
+        self._displayValues.clear()
+        if self._undoStack is not None:
+            # Its commands refer to the items of the old tree
+            self._undoStack.clear()
         self.endResetModel()
 
-        return True
+    def backing(self):
+        return self._backing
+
+    def setBacking(self, backing):
+        """Replace the backing file, e.g. with the file the tree was saved to"""
+        self._backing = backing
+
+    def isReadOnly(self):
+        return self._readOnly
+
+    def setReadOnly(self, readOnly):
+        """Freeze the tree, e.g. while a worker thread serialises it
+
+        A read-only model refuses edits and does not build any more
+        child items.
+        """
+        self._readOnly = readOnly
+
+    def isEditable(self):
+        return self._editable and not self._readOnly
+
+    def setEditable(self, editable):
+        """Refuse edits but go on building child items when needed
+
+        For background workers that read the backing file rather than
+        the tree.
+        """
+        self._editable = editable
+
+    def undoStack(self):
+        return self._undoStack
+
+    def setUndoStack(self, undoStack):
+        """Record the edits made from now on as commands on `undoStack`
+
+        setData(), insertItems() and removeItems(), and the methods
+        built on them, push a JSONUndo command once they are done. The
+        stack is cleared whenever the tree is replaced.
+
+        Arguments:
+            undoStack (QUndoStack): None to stop recording
+
+        """
+        self._undoStack = undoStack
+
+    def _record(self, command):
+        if self._undoStack is not None:
+            self._undoStack.push(command)
+
+    def searchIndex(self):
+        return self._searchIndex
+
+    def contentHashes(self):
+        return self._contentHashes
+
+    def setSearchIndex(self, searchIndex, contentHashes=None):
+        """Keep `searchIndex` up to date with the edits from now on
+
+        Arguments:
+            searchIndex (JSONSearch.SearchIndex): Index of the current
+                tree, e.g. built by a JSONWorkers.SearchIndexWorker
+            contentHashes (JSONDiff.ContentHashes, optional): Hashes
+                built with it, they follow its changes
+
+        """
+        self._searchIndex = searchIndex
+        self._contentHashes = contentHashes
+        if self._comparison is not None and self._comparison.hashes is not contentHashes:
+            self.setComparison(None)
+
+    def comparison(self):
+        return self._comparison
+
+    def setComparison(self, comparison):
+        """Mark the rows that differ from another document
+
+        Differing rows get a background by kind of difference, and tell
+        how they differ in their tooltip. The rows holding differences
+        are decorated. The comparison is refreshed after every edit.
+        Views are not notified, update their viewport.
+
+        Arguments:
+            comparison (JSONDiff.Comparison): Comparison of the current
+                tree, from its contentHashes(), e.g. run by a
+                JSONWorkers.DiffWorker. None to stop comparing, the
+                previous one is closed
+
+        """
+        if self._comparison is not None and self._comparison is not comparison:
+            self._comparison.close()
+        self._comparison = comparison
+
+    def refreshComparison(self):
+        """Compare again if either document changed, done after every edit"""
+        if self._comparison is None:
+            return
+        # Rows whose background, decoration or tooltip changed
+        for node in self._comparison.refresh():
+            item = self._builtItem(self._searchIndex.rowPath(node))
+            if item is not None and item is not self._rootItem:
+                self.dataChanged.emit(
+                    self.indexForItem(item, 0),
+                    self.indexForItem(item, 1),
+                    [_BACKGROUND_ROLE, _DECORATION_ROLE, _TOOLTIP_ROLE],
+                )
+
+    def _builtItem(self, rows):
+        """Item at `rows` from the root, None if it was not built"""
+        item = self._rootItem
+        for row in rows:
+            if row >= len(item._children):
+                return None
+            item = item._children[row]
+        return item
+
+    def _differenceNode(self, item):
+        # Node of `item` in the compared tree, None if it has none
+        if self._searchIndex is None:
+            return None
+        return self._searchIndex.nodeForItem(item)
+
+    def validator(self):
+        return self._validator
+
+    def setValidator(self, validator, errors=()):
+        """Validate the edits against a schema from now on
+
+        Rows with errors are decorated, and list them in their tooltip.
+        Only what changed is checked again after each edit, see
+        JSONSchema.SchemaValidator.
+
+        Arguments:
+            validator (JSONSchema.SchemaValidator): Validator of the
+                current tree, e.g. run by a JSONWorkers.ValidationWorker,
+                None to stop validating
+            errors (list): Its errors on the current tree
+
+        """
+        self._validator = validator
+        self._showSchemaErrors(list(errors) if validator is not None else [])
+
+    def schemaErrors(self):
+        """(item, pointer, message) triples of the current tree, see JSONSchema"""
+        return self._schemaErrors
+
+    def _revalidate(self):
+        if self._validator is not None:
+            self._showSchemaErrors(self._validator.validate(self._rootItem))
+
+    def _showSchemaErrors(self, errors):
+        texts = {}
+        for item, pointer, message in errors:
+            texts.setdefault(item, []).append(errorText(pointer, message))
+        parents = set()
+        for item in texts:
+            item = item._parent
+            while item is not None and item not in parents:
+                parents.add(item)
+                item = item._parent
+
+        # Rows whose decoration changed, among those still in the tree
+        changed = [item for item in texts if texts[item] != self._errorTexts.get(item)]
+        changed.extend(item for item in self._errorTexts if item not in texts)
+        changed.extend(parents.symmetric_difference(self._errorParents))
+        self._schemaErrors = errors
+        self._errorTexts = texts
+        self._errorParents = parents
+        for item in changed:
+            if item is not self._rootItem and self._isInTree(item):
+                self.dataChanged.emit(
+                    self.indexForItem(item, 0), self.indexForItem(item, 1), [_DECORATION_ROLE, _TOOLTIP_ROLE]
+                )
+
+    def _isInTree(self, item):
+        # Removed items keep their parent, not their place in it
+        while item._parent is not None:
+            row = item.row()
+            children = item._parent._children
+            if row >= len(children) or children[row] is not item:
+                return False
+            item = item._parent
+        return item is self._rootItem
+
+    def highlight(self):
+        return self._highlight
+
+    def setHighlight(self, text):
+        """Highlight the keys and values containing `text`, any case
+
+        Views are not notified, update their viewport.
+        """
+        self._highlight = text.lower()
+
+    def duplicateKeys(self):
+        """Objects with several children of the same key, before a save
+
+        Only containers that changed since the backing file was written,
+        or have none, are looked at. The others are copied as they are.
+
+        Returns:
+            list of (QJsonTreeItem, key) pairs
+
+        """
+
+        return findDuplicateKeys(self._rootItem)
+
+    def query(self, expression):
+        """Indexes of the items matching a JSONPath or JSON Pointer
+
+        Lazy containers are built as far as the query needs, see
+        JSONQuery for the syntax.
+
+        Arguments:
+            expression (str): e.g. "$.services[*].env.PORT" or
+                "/services/3/name"
+
+        Returns:
+            list of QModelIndex, in column 0
+
+        Raises JSONQuery.QueryError if `expression` is not valid.
+
+        """
+
+        query = compileQuery(expression)
+        items = query.evaluate(
+            self._rootItem,
+            lambda item, count: self._fetchItems(self.indexForItem(item), item, count),
+        )
+        return [self.indexForItem(item) for item in items if item is not self._rootItem]
+
+    def indexForRowPath(self, rows):
+        """Index of the item at `rows` from the root, building it if needed
+
+        Arguments:
+            rows (list): Row of the item in its parent, of the parent in
+                its own parent and so on, from the root down, as given by
+                JSONSearch.SearchIndex.rowPath()
+
+        Returns:
+            QModelIndex, invalid if there is no such item
+
+        """
+
+        item = self._rootItem
+        for row in rows:
+            if row >= item.childCount():
+                self._fetchItems(self.indexForItem(item), item, row + 1 - item.childCount())
+                if row >= item.childCount():
+                    return QtCore.QModelIndex()
+            item = item.child(row)
+        return self.indexForItem(item)
+
+    def rowPathForIndex(self, index):
+        """Rows from the root down to `index`, see indexForRowPath()"""
+        rows = []
+        while index.isValid():
+            rows.append(index.row())
+            index = index.parent()
+        rows.reverse()
+        return rows
 
     def json(self, root=None):
         """Serialise model as JSON-compliant dictionary
@@ -228,61 +489,139 @@ class QJsonModel(QtCore.QAbstractItemModel):
         Returns:
             model as dict
 
+        Subtrees that were never expanded in a lazy model are
+        returned as-is from the loaded document, not copied.
+
         """
 
         root = root or self._rootItem
         return self.genJson(root)
 
     def data(self, index, role):
+        # Most roles a delegate asks for have no data, answer them first
+        if (
+            role != _DISPLAY_ROLE
+            and role != _EDIT_ROLE
+            and (role != _BACKGROUND_ROLE or not self._highlight and self._comparison is None)
+            and (
+                role != _DECORATION_ROLE and role != _TOOLTIP_ROLE
+                or not self._errorTexts and self._comparison is None
+            )
+        ):
+            return None
         if not index.isValid():
             return None
 
         item = index.internalPointer()
 
-        if role == QtCore.Qt.DisplayRole:
+        if role == _DISPLAY_ROLE:
             if index.column() == 0:
-                return item.key
+                if item._parent is not None and item._parent.type is list:
+                    # Array entries are keyed by their position
+                    return index.row()
+                text = item.key
+                cache = self._displayKeys
+            else:
+                text = item.value
+                cache = self._displayValues
+            # Other values are shown as they are, Qt converts them cheaply
+            if text.__class__ is not str or len(text) <= DISPLAY_LENGTH:
+                return text
+            return self._cutText(item, text, cache)
+
+        elif role == _EDIT_ROLE:
+            return item
 
-            if index.column() == 1:
-                return item.value
+        elif role == _BACKGROUND_ROLE:
+            if self._highlight and self._isHighlighted(item, index.column()):
+                return HIGHLIGHT_COLOR
+            if self._comparison is not None:
+                return DIFFERENCE_COLORS.get(self._comparison.kind(self._differenceNode(item)))
 
-        elif role == QtCore.Qt.EditRole:
-            return item
+        elif role == _DECORATION_ROLE:
+            if index.column() == 0:
+                if item in self._errorTexts:
+                    return ERROR_COLOR
+                if item in self._errorParents:
+                    return NESTED_ERROR_COLOR
+                if self._comparison is not None and self._comparison.holdsDifferences(self._differenceNode(item)):
+                    return NESTED_DIFFERENCE_COLOR
+
+        elif role == _TOOLTIP_ROLE:
+            texts = self._errorTexts.get(item, [])
+            if len(texts) > ERRORS_SHOWN:
+                texts = texts[:ERRORS_SHOWN] + ["and %d more" % (len(texts) - ERRORS_SHOWN)]
+            if self._comparison is not None:
+                difference = self._comparison.describe(self._differenceNode(item))
+                if difference:
+                    texts = texts + [difference]
+            if texts:
+                return "\n".join(texts)
+
+    def _isHighlighted(self, item, column):
+        if column == 0:
+            if item._parent is None or item._parent.type is not dict:
+                return False
+            text = item.key
+        elif item.type is dict or item.type is list:
+            return False
+        else:
+            text = valueText(item.value)
+        return self._highlight in text.lower()
+
+    def _cutText(self, item, text, cache):
+        display = cache.get(item)
+        if display is None:
+            if len(cache) >= DISPLAY_CACHE_SIZE:
+                cache.clear()
+            display = cache[item] = text[:DISPLAY_LENGTH] + "\u2026"
+        return display
 
     def setData(self, index, value, role):
         valueString = str(value)
-        if valueString == "":
+        if valueString == "" or not self.isEditable():
             return False
 
         if role == QtCore.Qt.EditRole:
             item = index.internalPointer()
+            old = (item.key, item.value, item.type)
+            key, value, itemType = old
             if index.column() == 1:
                 if item.type != list and item.type != dict:
-                    if valueString.isdigit():
-                        item.value = int(valueString)
-                        item.type = int
-                    elif valueString == "null":
-                        item.value = None
-                        item.type = None
-                    elif (valueString == "true") | (valueString == "True"):
-                        item.value = True
-                        item.type = bool
-                    elif (valueString == "false") | (valueString == "False"):
-                        item.value = False
-                        item.type = bool
-                    else:
-                        item.value = valueString
-                        item.type = str
+                    value, itemType = parseValue(valueString)
             else:
                 if item.parent().type != list:
-                    item.key = valueString
-            
-            self.dataChanged.emit(index, index, [QtCore.Qt.EditRole])
+                    key = valueString
+
+            new = (key, value, itemType)
+            self._setItemData(item, *new)
+            if new != old:
+                self._record(EditCommand(self, item, old, new))
 
             return True
 
         return False
 
+    def _setItemData(self, item, key, value, itemType):
+        """Set the key, value and type of `item`, without recording it"""
+        if key != item.key:
+            item.setKey(key)
+        item.value = value
+        item.type = itemType
+        item.parent().markDirty()
+        self._displayKeys.pop(item, None)
+        self._displayValues.pop(item, None)
+        if self._searchIndex is not None:
+            self._searchIndex.itemChanged(item)
+
+        self.dataChanged.emit(
+            self.indexForItem(item, 0), self.indexForItem(item, 1), [QtCore.Qt.EditRole]
+        )
+        if self._validator is not None:
+            self._validator.itemChanged(item)
+            self._revalidate()
+        self.refreshComparison()
+
     def headerData(self, section, orientation, role):
         if role != QtCore.Qt.DisplayRole:
             return None
@@ -291,20 +630,24 @@ class QJsonModel(QtCore.QAbstractItemModel):
             return self._headers[section]
 
     def index(self, row, column, parent=QtCore.QModelIndex()):
-        if not self.hasIndex(row, column, parent):
-            return QtCore.QModelIndex()
-
+        # Checked here rather than with hasIndex(), which goes through
+        # rowCount() and columnCount() on every call
         if not parent.isValid():
             parentItem = self._rootItem
+        elif parent.column() > 0:
+            return QtCore.QModelIndex()
         else:
             parentItem = parent.internalPointer()
 
-        childItem = parentItem.child(row)
-        if childItem:
-            return self.createIndex(row, column, childItem)
-        else:
+        children = parentItem._children
+        if row >= len(children):
+            # Builds the first batch of a lazy container
+            self.rowCount(parent)
+        if row < 0 or row >= len(children) or column < 0 or column > 1:
             return QtCore.QModelIndex()
 
+        return self.createIndex(row, column, children[row])
+
     def parent(self, index):
         if not index.isValid():
             return QtCore.QModelIndex()
@@ -312,7 +655,7 @@ class QJsonModel(QtCore.QAbstractItemModel):
         childItem = index.internalPointer()
         parentItem = childItem.parent()
 
-        if parentItem == self._rootItem:
+        if parentItem is self._rootItem:
             return QtCore.QModelIndex()
 
         return self.createIndex(parentItem.row(), 0, parentItem)
@@ -326,33 +669,292 @@ class QJsonModel(QtCore.QAbstractItemModel):
         else:
             parentItem = parent.internalPointer()
 
+        # First look at a lazy container, no rows were reported yet so
+        # the first batch can be built without notifying the views. Not
+        # while rows are being fetched, Qt asks for the row count then.
+        if (
+            parentItem.canFetchMore()
+            and parentItem.lazySource().fetched == 0
+            and not self._readOnly
+            and not self._fetching
+        ):
+            parentItem.fetchMore()
+
         return parentItem.childCount()
 
-    def columnCount(self, parent=QtCore.QModelIndex()):
-        return 2
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return False
 
-    def flags(self, index):
-        flags = super(QJsonModel, self).flags(index)
+        if not parent.isValid():
+            return self._rootItem.hasChildren()
 
-        return QtCore.Qt.ItemIsEditable | flags
+        return parent.internalPointer().hasChildren()
 
-    def genJson(self, item):
-        nchild = item.childCount()
-
-        if item.type is dict:
-            document = {}
-            for i in range(nchild):
-                ch = item.child(i)
-                document[ch.key] = self.genJson(ch)
-            return document
-
-        elif item.type == list:
-            document = []
-            for i in range(nchild):
-                ch = item.child(i)
-                document.append(self.genJson(ch))
-            return document
+    def canFetchMore(self, parent):
+        if parent.column() > 0 or self._readOnly:
+            return False
+
+        if not parent.isValid():
+            return self._rootItem.canFetchMore()
 
+        return parent.internalPointer().canFetchMore()
+
+    def fetchMore(self, parent):
+        if not parent.isValid():
+            parentItem = self._rootItem
         else:
-            return item.value
+            parentItem = parent.internalPointer()
+
+        self._fetchItems(parent, parentItem, FETCH_BATCH_SIZE)
+
+    def fetchAll(self, item):
+        """Build every remaining child item of a lazy container
+
+        Arguments:
+            item (QJsonTreeItem): Container to materialize
+
+        """
+
+        if item.canFetchMore():
+            parent = self.indexForItem(item)
+            self._fetchItems(parent, item, item.pendingCount())
+
+    def fetchItems(self, item, count):
+        """Build the next `count` child items of a lazy container
+
+        Arguments:
+            item (QJsonTreeItem): Container to build more of
+            count (int): Number of items, at most those not built yet
+
+        """
+
+        if item.canFetchMore():
+            self._fetchItems(self.indexForItem(item), item, count)
+
+    def _fetchItems(self, parent, parentItem, count):
+        if self._readOnly:
+            return
+
+        count = min(count, parentItem.pendingCount())
+        if count <= 0:
+            return
+
+        first = parentItem.childCount()
+        self._fetching = True
+        try:
+            self.beginInsertRows(parent, first, first + count - 1)
+            parentItem.fetchMore(count)
+            self.endInsertRows()
+        finally:
+            self._fetching = False
+        if self._validator is not None:
+            # Errors found in the new rows move onto them
+            self._validator.itemsInserted(parentItem)
+            self._revalidate()
+
+    def appendItems(self, parentItem, items):
+        """Append already built items after the last entry of `parentItem`
+
+        Meant for the items of a document being loaded, they are not
+        recorded on the undo stack. They are appended while edits are
+        refused with setEditable(False), not on a read-only model.
+
+        Arguments:
+            parentItem (QJsonTreeItem): Container to append to
+            items (list): QJsonTreeItem children, e.g. from a
+                JSONStream.TreeBuilder
+
+        """
+
+        if not items or self._readOnly:
+            return
 
+        self.fetchAll(parentItem)
+        self._insertItems(parentItem, parentItem.childCount(), items)
+
+    def insertItems(self, parentItem, row, items):
+        """Insert already built items into `parentItem` in one go
+
+        Arguments:
+            parentItem (QJsonTreeItem): Container to insert into
+            row (int): Position of the first new item, None to append
+                after the last entry, the rest of a lazy container is
+                built first then
+            items (list): QJsonTreeItem children
+
+        Returns:
+            True if the items were inserted
+
+        """
+
+        if not items or not self.isEditable():
+            return False
+
+        if row is None or row >= parentItem.childCount():
+            self.fetchAll(parentItem)
+            row = parentItem.childCount()
+
+        self._insertItems(parentItem, row, items)
+        self._record(InsertCommand(self, parentItem, row, items))
+        return True
+
+    def _insertItems(self, parentItem, row, items):
+        if self._searchIndex is not None:
+            self._searchIndex.itemsInserted(parentItem, row, items)
+        self.beginInsertRows(self.indexForItem(parentItem), row, row + len(items) - 1)
+        parentItem.insertChildren(row, items)
+        parentItem.markDirty()
+        self.endInsertRows()
+        if self._validator is not None:
+            self._validator.itemsInserted(parentItem)
+            self._revalidate()
+        self.refreshComparison()
+
+    def removeItems(self, parentItem, rows):
+        """Remove the children of `parentItem` at `rows` in one go
+
+        Rows need not be sorted nor contiguous, every contiguous range is
+        removed with a single pair of remove signals. The following
+        children are only renumbered once a view asks for their row.
+
+        Arguments:
+            parentItem (QJsonTreeItem): Container to remove from
+            rows (iterable): Rows of the children to remove
+
+        Returns:
+            number of removed children
+
+        """
+
+        rows = sorted(set(rows), reverse=True)
+        if not rows or not self.isEditable():
+            return 0
+
+        ranges, searchNodes = self._removeItems(parentItem, rows)
+        self._record(RemoveCommand(self, parentItem, ranges, searchNodes))
+        return len(rows)
+
+    def _removeItems(self, parentItem, rows):
+        """Remove children without recording it, `rows` in reverse order
+
+        Returns:
+            the removed (first row, items) ranges, last range first, and
+            what _restoreItems() needs to put them back in the search
+            index
+
+        """
+
+        searchNodes = None
+        if self._searchIndex is not None:
+            searchNodes = (self._searchIndex, self._searchIndex.rowsRemoved(parentItem, rows))
+
+        parentIndex = self.indexForItem(parentItem)
+        ranges = []
+        # Last range first, so that the rows before it stay valid
+        n = 0
+        while n < len(rows):
+            last = first = rows[n]
+            n += 1
+            while n < len(rows) and rows[n] == first - 1:
+                first = rows[n]
+                n += 1
+
+            self.beginRemoveRows(parentIndex, first, last)
+            ranges.append((first, parentItem._children[first:last + 1]))
+            parentItem.removeChildren(first, last - first + 1)
+            self.endRemoveRows()
+
+        parentItem.markDirty()
+        if self._validator is not None:
+            self._validator.itemsRemoved(parentItem, [item for _, items in ranges for item in items])
+            self._revalidate()
+        self.refreshComparison()
+        return ranges, searchNodes
+
+    def _restoreItems(self, parentItem, ranges, searchNodes):
+        """Put back the items removed by _removeItems(), as they were
+
+        The items are reinserted as they are, whatever their size, and
+        their nodes in the search index are revived rather than indexed
+        again if it is still the same index.
+        """
+
+        # The search index first, as for any other insertion, a filter
+        # on it tells which of the rows are shown
+        if self._searchIndex is not None:
+            if searchNodes is not None and searchNodes[0] is self._searchIndex:
+                self._searchIndex.rowsRestored(parentItem, searchNodes[1])
+            else:
+                for first, items in reversed(ranges):
+                    self._searchIndex.itemsInserted(parentItem, first, items)
+
+        parentIndex = self.indexForItem(parentItem)
+        for first, items in reversed(ranges):
+            self.beginInsertRows(parentIndex, first, first + len(items) - 1)
+            parentItem.insertChildren(first, items)
+            self.endInsertRows()
+        parentItem.markDirty()
+        if self._validator is not None:
+            self._validator.itemsInserted(parentItem)
+            self._revalidate()
+        self.refreshComparison()
+
+    def removeIndexes(self, indexes):
+        """Remove the items at `indexes`, e.g. the selection of a view
+
+        Items inside another removed item go with it, the others are
+        removed per parent with removeItems().
+
+        Returns:
+            number of removed items
+
+        """
+
+        if not self.isEditable():
+            return 0
+
+        items = {}
+        for index in indexes:
+            if index.isValid():
+                item = index.internalPointer()
+                items[id(item)] = item
+
+        byParent = {}
+        for item in items.values():
+            ancestor = item.parent()
+            while ancestor is not None and id(ancestor) not in items:
+                ancestor = ancestor.parent()
+            if ancestor is None:
+                parent = item.parent()
+                byParent.setdefault(id(parent), (parent, []))[1].append(item)
+
+        if len(byParent) > 1 and self._undoStack is not None:
+            # Undone in one step
+            count = sum(len(children) for _, children in byParent.values())
+            self._undoStack.beginMacro("Remove %d items" % count)
+        removed = 0
+        for parent, children in byParent.values():
+            removed += self.removeItems(parent, [child.row() for child in children])
+        if len(byParent) > 1 and self._undoStack is not None:
+            self._undoStack.endMacro()
+        return removed
+
+    def indexForItem(self, item, column=0):
+        if item is None or item is self._rootItem:
+            return QtCore.QModelIndex()
+
+        return self.createIndex(item.row(), column, item)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 2
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        if self._editable and not self._readOnly:
+            return _EDITABLE_FLAGS
+        return _READ_ONLY_FLAGS
+
+    def genJson(self, item):
+        return toPython(item)
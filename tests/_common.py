@@ -0,0 +1,22 @@
+"""Shared helpers for the JSON Wizard tests
+
+The tests are plain unittest modules, run them from the repository root:
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+def temporaryFile(test, text, suffix=".json"):
+    """Write `text` to a new file, removed once `test` is done, return its name"""
+    descriptor, fileName = tempfile.mkstemp(suffix)
+    with os.fdopen(descriptor, "w", encoding="utf-8", newline="") as file:
+        file.write(text)
+    test.addCleanup(os.remove, fileName)
+    return fileName
@@ -0,0 +1,61 @@
+"""Tests of JSONDiff: content hashes and comparisons of documents"""
+import _common
+from JSONDiff import CHANGED, Comparison, ContentHashes
+from JSONIndex import IndexedDocument
+from JSONSearch import SearchIndex
+import json
+import unittest
+
+
+def contentHashes(value):
+    return ContentHashes.fromTree(SearchIndex.fromTree(value), value)
+
+
+def compare(value, other):
+    comparison = Comparison(contentHashes(value), contentHashes(other), other, "other.json")
+    comparison.compare()
+    return comparison
+
+
+class ContentHashesTest(unittest.TestCase):
+    def testNumbersPythonHashesAlike(self):
+        # hash(-1) == hash(-2) and hash(2**61 - 1) == hash(0) in CPython
+        for value, other in ((-1, -2), (2 ** 61 - 1, 0)):
+            self.assertNotEqual(contentHashes([value]).hashOf(0), contentHashes([other]).hashOf(0))
+
+    def testTypes(self):
+        values = [{}, [], False, True, 0, 1, None, "", "1", "true", "null"]
+        hashes = {contentHashes([value]).hashOf(0) for value in values}
+        self.assertEqual(len(hashes), len(values))
+
+    def testEqualContent(self):
+        self.assertEqual(contentHashes({"a": 1, "b": [2]}).hashOf(0), contentHashes({"b": [2], "a": 1}).hashOf(0))
+        self.assertEqual(contentHashes([1]).hashOf(0), contentHashes([1.0]).hashOf(0))
+        self.assertEqual(contentHashes([float("nan")]).hashOf(0), contentHashes([float("nan")]).hashOf(0))
+        self.assertNotEqual(contentHashes([1, 2]).hashOf(0), contentHashes([2, 1]).hashOf(0))
+
+    def testFromDocument(self):
+        value = {"a": [1, -2, 2.5, "é\\n", None, True], "b": {"c": {}, "d": []}, "é": "x"}
+        document = IndexedDocument(_common.temporaryFile(self, json.dumps(value, ensure_ascii=False)))
+        self.addCleanup(document.close)
+        hashes = ContentHashes.fromDocument(SearchIndex.fromDocument(document), document)
+        self.assertEqual(hashes.hashOf(0), contentHashes(value).hashOf(0))
+
+
+class ComparisonTest(unittest.TestCase):
+    def testNegativeNumbers(self):
+        for value, other in (({"x": -1}, {"x": -2}), ([-1], [-2])):
+            comparison = compare(value, other)
+            self.assertEqual(len(comparison), 1)
+            self.assertEqual(comparison.kind(1), CHANGED)
+
+    def testNoDifferences(self):
+        self.assertEqual(len(compare({"a": [1, {"b": None}]}, {"a": [1, {"b": None}]})), 0)
+
+    def testDifferences(self):
+        comparison = compare({"a": 1, "b": [1, 2, 3]}, {"a": 2, "b": [1, 3]})
+        self.assertEqual(comparison.rowPaths(), [[0], [1, 1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
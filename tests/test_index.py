@@ -0,0 +1,110 @@
+"""Tests of JSONIndex: the structural index and the trees built from it"""
+import _common
+from JSONIndex import IndexedDocument, buildIndex
+from JSONTree import toPython
+import json
+import random
+import unittest
+
+DOCUMENTS = [
+    {"a": [1, 2.5, -3e-2, 1e300, -0.0, 12345678901234567890], "b": {"c": None, "d": True, "e": False}},
+    [[], {}, [[]], [{}], {"a": {"b": {"c": [[[{"d": "deep"}]]]}}}],
+    {"escapes": "\" \\ / \b \f \n \r \t", "quote \" in key": 1, "\\": "backslash key"},
+    {"unicode": "é ሴ 😀", "é": ["ü", {"ß": "ö", "😀": "🙂"}]},
+    [{"id": n, "name": "user-%d" % n, "tags": ["t%d" % (n % 7)] * (n % 3)} for n in range(2500)],
+]
+
+INVALID = [
+    b'{"a" 1}', b'[1 2]', b'{"a":1,}', b'[1,,2]', b'[:1]', b'{"a"::1}', b'{"a"}',
+    b'{"a":1 "b":2}', b'{1:2}', b'[1,]', b'[,1]', b'{,}', b'{"a",1}', b'[1:2]',
+    b'{"a":1}}', b'[]]', b'{"a":[}', b'[1] 2', b'[1]"', b'["a]', b'["\\x"]',
+    b'["\\u12"]', b'["a\nb"]', b'[tru]', b'[01]', b'1', b'', b'   ',
+]
+
+
+def buildAll(item):
+    """Build every item of the subtree of `item`"""
+    stack = [item]
+    while stack:
+        item = stack.pop()
+        while item.canFetchMore():
+            item.fetchMore()
+        stack.extend(item.child(row) for row in range(item.childCount()))
+
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True)
+
+
+class BuildIndexTest(unittest.TestCase):
+    def testStructure(self):
+        data = b' {"a": [1, {"b": "x"}], "c": null}'
+        index = buildIndex(data)
+        self.assertEqual(len(index), 6)
+        # Root, "a", 1, {"b"}, "x", null
+        self.assertEqual(list(index.counts), [2, 2, -1, 1, -1, -1])
+        self.assertEqual(list(index.nexts), [6, 5, 3, 5, 5, 6])
+        self.assertEqual([data[start:end] for start, end in zip(index.starts, index.ends)][2:], [b"1", b'{"b": "x"}', b'"x"', b"null"])
+        self.assertEqual([data[key:key + 3] if key >= 0 else None for key in index.keys], [None, b'"a"', None, None, b'"b"', b'"c"'])
+
+    def testByteOrderMark(self):
+        self.assertEqual(list(buildIndex(b'\xef\xbb\xbf[1]').counts), [1, -1])
+
+    def testInvalid(self):
+        for data in INVALID:
+            with self.assertRaises(ValueError, msg=data):
+                buildIndex(data)
+
+    def testLikeJsonLoads(self):
+        # Documents with one character changed, rejected exactly when
+        # json.loads() rejects them
+        generator = random.Random(1)
+        replacements = list('{}[]:,"1 \\') + ["", "tru", "\\u12"]
+        for _ in range(3000):
+            text = json.dumps(generator.choice(DOCUMENTS[:4]), ensure_ascii=generator.random() < 0.5)
+            position = generator.randrange(len(text) + 1)
+            text = text[:position] + generator.choice(replacements) + text[position + generator.randint(0, 1):]
+            try:
+                json.loads(text)
+            except ValueError:
+                accepted = False
+            else:
+                accepted = text.strip()[:1] in ("[", "{")
+            try:
+                buildIndex(text.encode("utf-8"))
+            except ValueError:
+                self.assertFalse(accepted, text)
+            else:
+                self.assertTrue(accepted, text)
+
+
+class IndexedDocumentTest(unittest.TestCase):
+    def openDocument(self, value, **options):
+        document = IndexedDocument(_common.temporaryFile(self, json.dumps(value, **options)))
+        self.addCleanup(document.close)
+        return document
+
+    def testUnbuiltTree(self):
+        for value in DOCUMENTS:
+            for asciiOnly in (True, False):
+                rootItem = self.openDocument(value, ensure_ascii=asciiOnly).rootItem()
+                self.assertEqual(canonical(toPython(rootItem)), canonical(value))
+
+    def testBuiltTree(self):
+        for value in DOCUMENTS:
+            rootItem = self.openDocument(value, ensure_ascii=False, indent=2).rootItem()
+            buildAll(rootItem)
+            self.assertFalse(rootItem.canFetchMore())
+            self.assertEqual(canonical(toPython(rootItem)), canonical(value))
+
+    def testPartlyBuiltTree(self):
+        value = DOCUMENTS[-1]
+        rootItem = self.openDocument(value).rootItem()
+        rootItem.fetchMore(10)
+        buildAll(rootItem.child(3))
+        self.assertEqual(rootItem.childCount(), 10)
+        self.assertEqual(toPython(rootItem), value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Tests of saving trees with JSONStream.ItemWriter and saveTree()"""
+import _common
+from JSONIndex import IndexedDocument
+from JSONStream import saveTree
+from JSONTree import QJsonTreeItem, toPython
+import copy
+import json
+import unittest
+
+DOCUMENTS = [
+    {"a": [1, 2.5, -3e-2, 12345678901234567890, True, False, None], "b": {"c": {}, "d": []}},
+    [{"id": n, "name": "user-%d" % n, "tags": ["t%d" % (n % 7)] * (n % 3)} for n in range(500)],
+    {"escapes": "\" \\ / \b \f \n \r \t", "unicode": "é ሴ 😀", "é": ["ü", {"ß": "ö"}]},
+    [[], {}, [[]], [{}], {"a": {"b": {"c": [[[{"d": "deep"}]]]}}}],
+]
+
+# Odd layout, so that copied bytes can be told from rewritten ones
+LAYOUT = b"""{"edited" :{ "value":1,  "kept" : [ 1,2 ,3 ],"other":"x" },
+  "clean"  :  { "b" :[true ,  false] } ,
+ "list":[  {"x" :1}  ,{"y":  2} ]
+}"""
+
+
+class SaveTest(unittest.TestCase):
+    def read(self, fileName):
+        with open(fileName, "rb") as file:
+            return file.read()
+
+    def load(self, value):
+        # As the load worker does, load() leaves the type of the root to the caller
+        rootItem = QJsonTreeItem.load(value)
+        rootItem.type = type(value)
+        return rootItem
+
+    def save(self, rootItem, backing=None, **options):
+        fileName = _common.temporaryFile(self, "")
+        backing = saveTree(fileName, rootItem, backing, **options)
+        self.addCleanup(backing.close)
+        return fileName, backing
+
+    def openDocument(self, data):
+        document = IndexedDocument(_common.temporaryFile(self, data.decode("utf-8")))
+        self.addCleanup(document.close)
+        return document
+
+    def testLoadedTree(self):
+        # As json.dump() writes it
+        for value in DOCUMENTS:
+            for options, dumpOptions in (
+                ({"indent": 4}, {"indent": 4}),
+                ({"indent": None}, {}),
+                ({"compact": True}, {"separators": (",", ":")}),
+            ):
+                fileName, _ = self.save(self.load(value), **options)
+                self.assertEqual(self.read(fileName).decode("utf-8"), json.dumps(value, **dumpOptions))
+
+    def testEditedTree(self):
+        value = copy.deepcopy(DOCUMENTS[0])
+        rootItem = self.load(DOCUMENTS[0])
+        item = rootItem.childByKey("a").child(1)
+        item.value = "changed"
+        item.type = str
+        item.parent().markDirty()
+        value["a"][1] = "changed"
+        rootItem.childByKey("b").setKey("renamed")
+        rootItem.markDirty()
+        value["renamed"] = value.pop("b")
+        fileName, _ = self.save(rootItem)
+        self.assertEqual(json.loads(self.read(fileName)), value)
+
+    def testUnbuiltDocument(self):
+        # Nothing built, nothing changed: the file is copied as it is
+        document = self.openDocument(LAYOUT)
+        fileName, _ = self.save(document.rootItem(), document)
+        self.assertEqual(self.read(fileName), LAYOUT)
+
+    def testCleanSpans(self):
+        document = self.openDocument(LAYOUT)
+        value = json.loads(LAYOUT)
+        rootItem = document.rootItem()
+        rootItem.fetchMore(rootItem.pendingCount())
+        edited = rootItem.childByKey("edited")
+        edited.fetchMore(edited.pendingCount())
+        item = edited.childByKey("value")
+        item.value = 2
+        edited.markDirty()
+        value["edited"]["value"] = 2
+
+        fileName, backing = self.save(rootItem, document)
+        data = self.read(fileName)
+        self.assertEqual(json.loads(data), value)
+        # A clean container next to the edit, one inside the edited
+        # container and the entries that were never built are copied
+        self.assertIn(b'{ "b" :[true ,  false] }', data)
+        self.assertIn(b'[ 1,2 ,3 ]', data)
+        self.assertIn(b'[  {"x" :1}  ,{"y":  2} ]', data)
+        self.assertNotIn(b'"value":1', data)
+
+        # The tree now describes the new file, spans and all
+        kept = edited.childByKey("kept")
+        kept.fetchMore(kept.pendingCount())
+        kept.child(0).value = 10
+        kept.markDirty()
+        value["edited"]["kept"][0] = 10
+        fileName, _ = self.save(rootItem, backing)
+        data = self.read(fileName)
+        self.assertEqual(json.loads(data), value)
+        self.assertIn(b'{ "b" :[true ,  false] }', data)
+
+    def testEditedDocument(self):
+        for value in DOCUMENTS:
+            document = self.openDocument(json.dumps(value, indent=2).encode("utf-8"))
+            rootItem = document.rootItem()
+            rootItem.fetchMore(1)
+            first = rootItem.child(0)
+            first.fetchMore(first.pendingCount())
+            if first.childCount():
+                first.removeChildren(0, 1)
+                first.markDirty()
+            elif first.type is dict or first.type is list:
+                item = self.load("added")
+                item.key = None if first.type is list else "added"
+                first.insertChildren(0, [item])
+                first.markDirty()
+            else:
+                first.value = None
+                first.type = type(None)
+                rootItem.markDirty()
+            expected = toPython(rootItem)
+            fileName, _ = self.save(rootItem, document, indent=2)
+            self.assertEqual(json.loads(self.read(fileName)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""Tests of JSONStream.StreamParser and TreeBuilder against json.loads()"""
+import _common  # noqa: F401  (adds src/ to sys.path)
+from JSONStream import StreamParser, TreeBuilder
+from JSONTree import toPython
+import json
+import unittest
+
+DOCUMENTS = [
+    '{"a": [1, 2.5, -3e-2, 1E+10, -0, 0.0, 12345678901234567890], "b": {"c": null}}',
+    '[true, false, null, NaN, Infinity, -Infinity, [], {}, [[]], [{}]]',
+    '{"escapes": "\\" \\\\ \\/ \\b \\f \\n \\r \\t \\u00e9 \\ud83d\\ude00", "\\u0041": "A"}',
+    '{"unicode": "é ሴ 😀", "é": ["ü", {"ß": "ö"}]}',
+    ' \n\t{ "spaces" : [ 1 , "x" , { } ] } \r\n',
+    '"a string root"',
+    '-12.75e-3',
+    '[{"id": 1, "name": "' + "x" * 100 + '", "tags": ["t1", "t2"]}, {"id": 2, "nested": [[[{"deep": true}]]]}]',
+]
+
+INVALID = [
+    '[1,]', '[,1]', '[1 2]', '{"a" 1}', '{"a":1,}', '{"a"}', '{1: 2}', '{"a"::1}',
+    '[01]', '[1.]', '[.5]', '[+1]', '[tru]', '[nul]', '[Nan]',
+    '["\\x"]', '["\\u12"]', '["\\u12G4"]', '["a\nb"]', '["abc',
+    '[1] x', '{} {}', '[1]]', '}', '',
+]
+
+
+class _ValueBuilder(object):
+    """StreamParser handler building plain Python values, scalar roots too"""
+
+    def __init__(self):
+        self.stack = []
+        self.keys = []
+        self.result = None
+
+    def startObject(self):
+        self.stack.append({})
+
+    def startArray(self):
+        self.stack.append([])
+
+    def key(self, key):
+        self.keys.append(key)
+
+    def value(self, value):
+        if not self.stack:
+            self.result = value
+        elif isinstance(self.stack[-1], dict):
+            self.stack[-1][self.keys.pop()] = value
+        else:
+            self.stack[-1].append(value)
+
+    def endContainer(self):
+        self.value(self.stack.pop())
+
+
+def parse(chunks, handler=None):
+    handler = handler or _ValueBuilder()
+    parser = StreamParser(handler)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return handler
+
+
+def canonical(value):
+    # NaN is not equal to itself, its JSON text is
+    return json.dumps(value, sort_keys=True)
+
+
+class StreamParserTest(unittest.TestCase):
+    def testWhole(self):
+        for text in DOCUMENTS:
+            self.assertEqual(canonical(parse([text]).result), canonical(json.loads(text)), text)
+
+    def testSplitAtEveryOffset(self):
+        # Inside strings, escapes, numbers and literals alike
+        for text in DOCUMENTS:
+            expected = canonical(json.loads(text))
+            for offset in range(len(text) + 1):
+                result = parse([text[:offset], text[offset:]]).result
+                self.assertEqual(canonical(result), expected, (text, offset))
+
+    def testCharacterByCharacter(self):
+        for text in DOCUMENTS:
+            self.assertEqual(canonical(parse(text).result), canonical(json.loads(text)), text)
+
+    def testTruncated(self):
+        for text in DOCUMENTS:
+            for end in range(len(text)):
+                try:
+                    json.loads(text[:end])
+                except ValueError:
+                    with self.assertRaises(ValueError, msg=(text, end)):
+                        parse([text[:end]])
+
+    def testInvalid(self):
+        for text in INVALID:
+            self.assertRaises(ValueError, json.loads, text)
+            for size in (1, 2, 3, len(text) or 1):
+                chunks = [text[start:start + size] for start in range(0, len(text), size)]
+                with self.assertRaises(ValueError, msg=(text, size)):
+                    parse(chunks)
+
+    def testLongStringInChunks(self):
+        text = json.dumps({"blob": "QUJD\\" * 20000, "after": ["x\\y", 1]})
+        chunks = [text[start:start + 1000] for start in range(0, len(text), 1000)]
+        self.assertEqual(parse(chunks).result, json.loads(text))
+
+
+class TreeBuilderTest(unittest.TestCase):
+    def testTree(self):
+        for text in DOCUMENTS:
+            if text.strip()[0] not in "[{":
+                continue
+            builder = TreeBuilder()
+            parser = StreamParser(builder)
+            items = []
+            for offset in range(0, len(text), 5):
+                parser.feed(text[offset:offset + 5])
+                items.extend(builder.takeItems())
+            parser.close()
+            items.extend(builder.takeItems())
+            for item in items:
+                builder.root.appendChild(item)
+            self.assertEqual(canonical(toPython(builder.root)), canonical(json.loads(text)), text)
+
+    def testScalarRoot(self):
+        self.assertRaises(ValueError, parse, ["1"], TreeBuilder())
+
+
+if __name__ == "__main__":
+    unittest.main()